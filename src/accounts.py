@@ -0,0 +1,135 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Audit-Inspector-Toolkit
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+科目层级：按科目编码前缀推导上下级关系（如 1122 -> 112201 -> 11220101），
+导入时建立 account_tree 表并预先汇总每个科目（含全部下级科目）的发生额；
+查询某科目及其下级科目的明细时，使用科目编码索引上的范围扫描（>= '1122' AND < '1123'）
+"""
+
+from indexes import table_exists
+from summary import account_totals, period_summary_ready
+
+ACCOUNT_TREE_TABLE = "account_tree"
+
+CREATE_ACCOUNT_TREE_SQL = f"""
+    CREATE TABLE {ACCOUNT_TREE_TABLE} (
+        科目编码 TEXT PRIMARY KEY,
+        科目名称 TEXT,
+        上级科目编码 TEXT,
+        级次 INTEGER,
+        是否末级 INTEGER,
+        借方合计 REAL,
+        贷方合计 REAL,
+        分录数 INTEGER
+    )
+"""
+
+# 科目层级中的全部科目为余额表与序时账科目编码的并集，科目名称优先取余额表
+BALANCE_NAMES_SQL = "SELECT 科目编码, MAX(科目名称) FROM balance GROUP BY 科目编码"
+# 序时账按科目汇总（汇总表不存在时直接汇总序时账，使用科目编码索引）
+JOURNAL_TOTALS_SQL = (
+    "SELECT 科目编码, MAX(科目名称), TOTAL(借方), TOTAL(贷方), COUNT(*) FROM journal GROUP BY 科目编码"
+)
+
+
+def prefix_range(code):
+    """
+    计算科目编码前缀对应的范围，用于在索引上查询某科目及其全部下级科目
+    :param code: 科目编码（如 "1122"）
+    :return: (下界, 上界)，如 ("1122", "1123")；满足 下界 <= 科目编码 < 上界
+    """
+    return code, code[:-1] + chr(ord(code[-1]) + 1)
+
+
+def derive_parents(codes):
+    """
+    按编码前缀推导上级科目：上级科目为集合中是该编码真前缀的最长编码
+    :param codes: 科目编码集合
+    :return: {科目编码: 上级科目编码或 None}
+    """
+    code_set = set(codes)
+    parents = {}
+    for code in code_set:
+        parent = None
+        for length in range(len(code) - 1, 0, -1):
+            if code[:length] in code_set:
+                parent = code[:length]
+                break
+        parents[code] = parent
+    return parents
+
+
+def build_account_tree(conn):
+    """
+    重建科目层级表，并汇总每个科目（含全部下级科目）的借方、贷方发生额及分录数
+    :param conn: sqlite3 连接（需可写）
+    :return: 科目数
+    """
+    conn.execute(f"DROP TABLE IF EXISTS {ACCOUNT_TREE_TABLE}")
+    conn.execute(CREATE_ACCOUNT_TREE_SQL)
+    if not (table_exists(conn, "journal") and table_exists(conn, "balance")):
+        conn.commit()
+        return 0
+
+    # 各科目自身的发生额优先读取科目 × 月份汇总表
+    rows = account_totals(conn) if period_summary_ready(conn) else conn.execute(JOURNAL_TOTALS_SQL)
+    journal_totals = [
+        (str(code), name, debit, credit, count)
+        for code, name, debit, credit, count in rows
+        if code is not None and str(code) != ""
+    ]
+    names = {code: name for code, name, _, _, _ in journal_totals}
+    for code, name in conn.execute(BALANCE_NAMES_SQL):  # 余额表中的科目名称优先
+        if code is not None and str(code) != "" and (name is not None or str(code) not in names):
+            names[str(code)] = name
+
+    parents = derive_parents(names)
+    levels = {}
+
+    def level(code):
+        if code not in levels:
+            parent = parents[code]
+            levels[code] = 1 if parent is None else level(parent) + 1
+        return levels[code]
+
+    # 将各科目的发生额累加到自身及全部上级科目
+    totals = {code: [0.0, 0.0, 0] for code in names}
+    for code, _, debit, credit, count in journal_totals:
+        while code is not None:
+            total = totals[code]
+            total[0] += debit
+            total[1] += credit
+            total[2] += count
+            code = parents[code]
+
+    has_children = {parent for parent in parents.values() if parent is not None}
+    conn.executemany(
+        f"INSERT INTO {ACCOUNT_TREE_TABLE} VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (
+            (code, names[code], parents[code], level(code), int(code not in has_children), *totals[code])
+            for code in sorted(names)
+        ),
+    )
+    conn.commit()
+    return len(names)
+
+
+def account_tree_ready(conn):
+    """
+    科目层级表是否已建立
+    """
+    return table_exists(conn, ACCOUNT_TREE_TABLE)
+
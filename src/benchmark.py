@@ -0,0 +1,297 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Audit-Inspector-Toolkit
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+性能测试：在模拟账套（synthetic.py）上无界面地依次执行上传、筛选、明细账、凭证、校验和保存等操作，
+记录每项操作的耗时和峰值内存（RSS），结果写入 JSON 文件；指定基准结果时同时输出与基准的耗时比
+
+    python src/benchmark.py --rows 100k --rows 1m --out bench.json
+    python src/benchmark.py --rows 1m --out new.json --baseline bench.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import closing
+
+import numpy as np
+import pandas as pd
+
+from db import ConnectionManager, connect
+from engine import account_lines, filter_rows, find_voucher, import_ledger, validate
+from export import export_table
+from filters import FilterState, encode_categories
+from fulltext import drop_fts, fts_ready
+from synthetic import DEFAULT_SEED, generate_ledger, parse_rows
+from tracing import current_rss
+
+# 默认的测试规模
+DEFAULT_SIZES = ["100k", "1m"]
+# 查询凭证的次数（取平均值和 95 分位数）
+VOUCHER_SAMPLES = 200
+# 内存采样间隔（秒）
+RSS_SAMPLE_INTERVAL = 0.005
+# 筛选条件：第一次筛选摘要，第二次在结果中筛选科目名称；明细账查询的科目编码
+# 第一次筛选的文本不少于 fulltext.MIN_PATTERN_CHARS 个字符，建立全文索引时走索引；
+# 之后删除全文索引再执行一次同样的筛选，记录退回 LIKE 全表扫描时的耗时
+FIRST_FILTER = ("摘要", "差旅费")
+NTH_FILTER = ("科目名称", "管理费用")
+DRILLDOWN_CODE = "6602"
+
+
+class RssSampler:
+    """
+    在 with 块执行期间于后台线程中采样常驻内存，记录峰值
+    """
+
+    def __init__(self, interval=RSS_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.start = self.peak = current_rss()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        if self.start is not None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._sample()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def _sample(self):
+        rss = current_rss()
+        if rss is not None and self.start is not None:
+            self.peak = max(self.peak, rss)
+
+
+def measure(results, size, operation, func, rows=None, **extra):
+    """
+    执行一项操作并记录耗时和内存
+    :param results: 结果列表
+    :param size: 测试规模（序时账行数）
+    :param operation: 操作名称
+    :param func: 无参数的函数，返回值作为 measure 的返回值
+    :param rows: 处理的行数（用于计算每秒行数），可为函数，参数为 func 的返回值
+    :param extra: 其他记录项，值可为函数，参数为 func 的返回值
+    """
+    with RssSampler() as sampler:
+        start_time = time.perf_counter()
+        value = func()
+        seconds = time.perf_counter() - start_time
+
+    record = {"size": size, "operation": operation, "seconds": round(seconds, 4)}
+    if callable(rows):
+        rows = rows(value)
+    if rows is not None:
+        record["rows"] = rows
+        record["rows_per_sec"] = round(rows / seconds) if seconds > 0 else None
+    if sampler.peak is not None:
+        record["peak_rss_mb"] = round(sampler.peak / 2 ** 20, 1)
+        record["rss_delta_mb"] = round((sampler.peak - sampler.start) / 2 ** 20, 1)
+    record.update({key: item(value) if callable(item) else item for key, item in extra.items()})
+    results.append(record)
+    print(
+        f"[{size}] {operation}: {seconds:.3f} 秒" + (f"，峰值内存 {record['peak_rss_mb']} MB" if sampler.peak else ""),
+        file=sys.stderr, flush=True,
+    )
+    return value
+
+
+def run_size(size, data_dir, seed, file_format, results, fulltext=True):
+    """
+    在一个规模的模拟账套上执行全部操作
+    :param size: 序时账行数
+    :param data_dir: 模拟账套和测试数据库所在目录（已生成的账套文件直接复用）
+    :param seed: 随机种子
+    :param file_format: 模拟账套的文件格式
+    :param results: 结果列表
+    :param fulltext: 是否建立序时账全文索引
+    """
+    journal_path = os.path.join(data_dir, f"journal_{size}_{seed}.{file_format}")
+    balance_path = os.path.join(data_dir, f"balance_{size}_{seed}.{file_format}")
+    if not (os.path.exists(journal_path) and os.path.exists(balance_path)):
+        measure(results, size, "generate", lambda: generate_ledger(data_dir, size, seed, file_format),
+                rows=lambda info: info["rows"])
+
+    db_path = os.path.join(data_dir, f"bench_{size}.db")
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+
+    # 上传序时账、科目余额表（upload_file）
+    db = ConnectionManager(db_path, wal=True)  # 与界面中的工作区数据库相同
+    try:
+        with db.bulk_load() as conn:
+            measure(results, size, "upload_journal",
+                    lambda: import_ledger(conn, "journal", [journal_path], fulltext=fulltext),
+                    rows=lambda stats: stats.rows)
+            measure(results, size, "upload_balance", lambda: import_ledger(conn, "balance", [balance_path]),
+                    rows=lambda stats: stats.rows)
+    finally:
+        db.close_all()
+    results[-1]["db_mb"] = round(os.path.getsize(db_path) / 2 ** 20, 1)
+
+    with closing(connect(db_path, wal=True)) as conn:
+        # 第一次筛选（apply_first_filter）：SQL 查询，结果按字典编码保存
+        first = measure(
+            results, size, "first_filter",
+            lambda: encode_categories(filter_rows(conn, "journal", *FIRST_FILTER)), rows=len,
+            fulltext=fts_ready(conn),
+        )
+        if fts_ready(conn):
+            # 同一条件不使用全文索引（之后的操作都不使用全文索引，可直接删除）
+            drop_fts(conn)
+            measure(
+                results, size, "first_filter_like",
+                lambda: encode_categories(filter_rows(conn, "journal", *FIRST_FILTER)), rows=len,
+                fulltext=False,
+            )
+        # 第 N 次筛选（apply_nth_filter）：在缓存的结果中按列筛选
+        state = FilterState()
+        state.reset(first)
+        measure(results, size, "nth_filter", lambda: state.narrow(*NTH_FILTER), rows=len)
+
+        # 明细账（show_detail_journal）：科目及其全部下级科目的分录
+        measure(results, size, "drilldown_account", lambda: account_lines(conn, DRILLDOWN_CODE), rows=len)
+
+        # 凭证（show_voucher_details）：随机抽取的凭证逐张查询，记录平均值和 95 分位数
+        rng = np.random.default_rng(seed)
+        total = conn.execute("SELECT MAX(rowid) FROM journal").fetchone()[0]
+        keys = [
+            conn.execute("SELECT 凭证字号, 日期 FROM journal WHERE rowid = ?", (int(rowid),)).fetchone()
+            for rowid in rng.integers(1, total + 1, size=VOUCHER_SAMPLES)
+        ]
+        timings = []
+
+        def open_vouchers():
+            for key in keys:
+                start_time = time.perf_counter()
+                find_voucher(conn, tuple(key))
+                timings.append(time.perf_counter() - start_time)
+
+        measure(
+            results, size, "voucher", open_vouchers,
+            samples=len(keys),
+            mean_ms=lambda _: round(float(np.mean(timings)) * 1000, 3),
+            p95_ms=lambda _: round(float(np.percentile(timings, 95)) * 1000, 3),
+        )
+
+        # 数据校验（data_validation）
+        measure(results, size, "validation", lambda: validate(conn),
+                balanced=lambda discrepancies: bool(discrepancies is not None and discrepancies.empty))
+
+        # 保存序时账（save_sheet）
+        for extension in (".parquet", ".csv"):
+            out_path = os.path.join(data_dir, f"bench_{size}_export{extension}")
+            measure(results, size, f"save_journal{extension}",
+                    lambda: export_table(conn, "journal", out_path), rows=lambda stats: stats.rows)
+            os.remove(out_path)
+
+
+def machine_info():
+    """
+    测试环境信息
+    """
+    return {
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "sqlite": sqlite3.sqlite_version,
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+    }
+
+
+def compare(results, baseline):
+    """
+    与基准结果对比：为每项结果添加基准耗时和耗时比（大于 1 表示变慢）
+    :param results: 结果列表
+    :param baseline: 基准结果（run_benchmark 的返回值）
+    """
+    previous = {(item["size"], item["operation"]): item for item in baseline.get("results", [])}
+    for record in results:
+        old = previous.get((record["size"], record["operation"]))
+        if old is None or not old.get("seconds"):
+            continue
+        record["baseline_seconds"] = old["seconds"]
+        record["ratio"] = round(record["seconds"] / old["seconds"], 3)
+        print(
+            f"[{record['size']}] {record['operation']}: {old['seconds']:.3f} -> {record['seconds']:.3f} 秒"
+            f"（×{record['ratio']}）",
+            file=sys.stderr,
+        )
+
+
+def run_benchmark(sizes, data_dir, seed=DEFAULT_SEED, file_format="parquet", fulltext=True):
+    """
+    执行性能测试
+    :param sizes: 序时账行数列表
+    :param data_dir: 模拟账套和测试数据库所在目录
+    :param seed: 随机种子
+    :param file_format: 模拟账套的文件格式
+    :param fulltext: 是否建立序时账全文索引
+    :return: 结果字典
+    """
+    os.makedirs(data_dir, exist_ok=True)
+    results = []
+    for size in sizes:
+        run_size(size, data_dir, seed, file_format, results, fulltext)
+    return {
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "seed": seed,
+        "file_format": file_format,
+        "fulltext": fulltext,
+        "machine": machine_info(),
+        "results": results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Audit Inspector Toolkit 性能测试")
+    parser.add_argument("--rows", action="append", dest="sizes", help="序时账行数，可多次指定（默认 100k、1m）")
+    parser.add_argument("--data", default="bench_data", help="模拟账套和测试数据库所在目录")
+    parser.add_argument("--out", default="benchmark.json", help="结果文件（JSON）")
+    parser.add_argument("--baseline", help="用于对比的基准结果文件")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--format", choices=["csv", "parquet"], default="parquet", dest="file_format")
+    parser.add_argument("--no-fulltext", action="store_true", help="不建立序时账全文索引")
+    args = parser.parse_args(argv)
+
+    sizes = [parse_rows(size) for size in (args.sizes or DEFAULT_SIZES)]
+    report = run_benchmark(sizes, args.data, args.seed, args.file_format, fulltext=not args.no_fulltext)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            compare(report["results"], json.load(f))
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已写入 {args.out}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Audit-Inspector-Toolkit
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+命令行入口（无需图形界面）：导入、校验、明细账 / 凭证查询、筛选和导出，结果以 JSON 输出到标准输出。
+batch 命令按清单文件在多个子进程中并行处理多个客户的数据库（导入 → 校验 → 导出）
+
+    python src/cli.py import client.db 序时账1.csv 序时账2.csv --table journal
+    python src/cli.py validate client.db
+    python src/cli.py batch clients.json --workers 8
+
+退出码：0 成功；1 出错；2 校验发现差异（batch 命令为任一客户出错或有差异）
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+
+from db import ConnectionManager, connect
+from engine import TABLE_LABELS, account_lines, compound_filter, filter_rows, find_voucher, import_ledger, validate
+from export import export_table
+from ingest import ALL_SHEETS
+from progress import ProgressReporter
+
+# 退出码
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_DISCREPANCY = 2
+# 查询结果默认输出的最大行数（total_rows 为实际行数）
+DEFAULT_LIMIT = 1000
+
+# 中文表名也可作为命令行参数
+TABLE_NAMES = {**{name: name for name in TABLE_LABELS}, **{label: name for name, label in TABLE_LABELS.items()}}
+
+
+def frame_json(df, limit=DEFAULT_LIMIT):
+    """
+    将 DataFrame 转换为可 JSON 序列化的字典
+    :param df: DataFrame
+    :param limit: 最多输出的行数（None 为全部）
+    :return: {"columns": 列名, "total_rows": 行数, "rows": 行列表}；缺失值为 null
+    """
+    total_rows = len(df)
+    if limit is not None:
+        df = df.head(limit)
+    values = df.astype(object).where(df.notna(), None)
+    return {"columns": list(df.columns), "total_rows": total_rows, "rows": values.values.tolist()}
+
+
+def stats_json(stats):
+    """
+    导入 / 导出统计信息
+    """
+    result = {"table": stats.table_name, "rows": stats.rows, "seconds": round(stats.seconds, 3)}
+    for name in ("skipped", "sheets"):
+        if hasattr(stats, name):
+            result[name] = getattr(stats, name)
+    return result
+
+
+def stderr_progress():
+    """
+    将进度说明输出到标准错误（标准输出只输出 JSON 结果）
+    """
+    return ProgressReporter(lambda progress: print(progress.describe(), file=sys.stderr), min_interval=1.0)
+
+
+def require_db(db_path):
+    """
+    检查数据库文件是否存在（sqlite3 打开不存在的路径时会新建空数据库，路径写错时不会报错）
+    :raises FileNotFoundError: 文件不存在
+    """
+    if not os.path.exists(db_path):
+        raise FileNotFoundError(f"数据库文件不存在：{db_path}")
+
+
+def run_import(db_path, table_name, file_paths, append=False, sheets=None, fulltext=True,
+               progress=None, max_workers=None):
+    """
+    导入文件到指定数据库
+    :return: 导入统计信息（字典）
+    """
+    db = ConnectionManager(db_path)
+    try:
+        with db.bulk_load() as conn:
+            stats = import_ledger(
+                conn, table_name, file_paths, progress=progress, sheets=sheets, append=append,
+                fulltext=fulltext, max_workers=max_workers,
+            )
+    finally:
+        db.close_all()
+    return {**stats_json(stats), "files": len(file_paths), "append": append}
+
+
+def run_validate(db_path, limit=DEFAULT_LIMIT):
+    """
+    校验指定数据库的科目余额表与序时账
+    :return: (校验结果字典, 是否一致)
+    """
+    require_db(db_path)
+    with closing(connect(db_path)) as conn:
+        discrepancies = validate(conn)
+    if discrepancies is None:
+        raise ValueError("数据库中没有找到序时账或科目余额表！")
+    return {"balanced": discrepancies.empty, "discrepancies": frame_json(discrepancies, limit)}, discrepancies.empty
+
+
+def run_export(db_path, table_name, file_path, progress=None):
+    """
+    将指定数据库中的数据表导出为文件
+    :return: 导出统计信息（字典）
+    """
+    require_db(db_path)
+    if progress is not None:
+        progress.stage(f"导出{TABLE_LABELS[table_name]}")
+    with closing(connect(db_path, read_only=True)) as conn:
+        stats = export_table(conn, table_name, file_path, progress=progress, sheet_name=TABLE_LABELS[table_name])
+    return {**stats_json(stats), "path": file_path}
+
+
+def run_client(task):
+    """
+    处理清单中的一个客户（在子进程中执行）：依次导入序时账、科目余额表，校验，导出
+    :param task: 清单中的一项，如
+        {"db": "a.db", "journal": ["a1.csv", "a2.csv"], "balance": ["a_余额表.xlsx"], "append": false,
+         "sheets": null, "validate": true, "export": {"journal": "a_序时账.parquet"}}
+        sheets 可为工作表名称列表或 "*"（全部工作表）
+    :return: 结果字典，出错时 ok 为 false 并包含 error
+    """
+    start_time = time.perf_counter()
+    result = {"db": task.get("db"), "ok": True}
+    try:
+        db_path = task["db"]
+        sheets = task.get("sheets")
+        for table_name in ("journal", "balance"):
+            if task.get(table_name):
+                # 各客户已在独立的子进程中处理，多个文件依次解析，避免进程数成倍增加
+                result[f"import_{table_name}"] = run_import(
+                    db_path, table_name, task[table_name], append=task.get("append", False), sheets=sheets,
+                    fulltext=task.get("fulltext", True), max_workers=1,
+                )
+        if task.get("validate", True):
+            result["validation"], result["balanced"] = run_validate(db_path, task.get("limit", DEFAULT_LIMIT))
+        result["exports"] = [
+            run_export(db_path, TABLE_NAMES[table], file_path) for table, file_path in task.get("export", {}).items()
+        ]
+    except Exception as e:
+        result.update(ok=False, error=f"{type(e).__name__}: {e}")
+    result["seconds"] = round(time.perf_counter() - start_time, 3)
+    return result
+
+
+def run_batch(manifest_path, workers=None):
+    """
+    按清单文件并行处理多个客户的数据库，每个客户一个子进程任务
+    :param manifest_path: 清单文件（JSON 数组，每项的格式见 run_client）；相对路径相对于清单文件所在目录
+    :param workers: 子进程数，默认不超过 CPU 核数
+    :return: (结果字典, 退出码)
+    """
+    with open(manifest_path, encoding="utf-8") as f:
+        tasks = json.load(f)
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+
+    def resolve(path):
+        return os.path.join(base_dir, path)
+
+    for task in tasks:
+        task["db"] = resolve(task["db"])
+        for table_name in ("journal", "balance"):
+            task[table_name] = [resolve(path) for path in task.get(table_name, [])]
+        task["export"] = {table: resolve(path) for table, path in task.get("export", {}).items()}
+
+    start_time = time.perf_counter()
+    workers = max(1, min(len(tasks), workers or os.cpu_count() or 1))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(run_client, tasks))
+
+    failed = sum(not result["ok"] for result in results)
+    unbalanced = sum(result.get("balanced") is False for result in results)
+    summary = {
+        "clients": len(results), "failed": failed, "unbalanced": unbalanced, "workers": workers,
+        "seconds": round(time.perf_counter() - start_time, 3), "results": results,
+    }
+    if failed:
+        return summary, EXIT_ERROR
+    return summary, EXIT_DISCREPANCY if unbalanced else EXIT_OK
+
+
+def table_arg(value):
+    """
+    表名参数：journal / balance 或 序时账 / 科目余额表
+    """
+    if value not in TABLE_NAMES:
+        raise argparse.ArgumentTypeError(f"不支持的表名：{value}（可选 {', '.join(TABLE_NAMES)}）")
+    return TABLE_NAMES[value]
+
+
+def condition_arg(value):
+    """
+    组合筛选的条件参数：列名=条件（按第一个等号拆分，“科目编码==6602”即等于 6602）
+    """
+    col, sep, text = value.partition("=")
+    if not sep or not col.strip():
+        raise argparse.ArgumentTypeError(f"条件应写作 列名=条件：{value}")
+    return col.strip(), text
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="cli.py", description="Audit Inspector Toolkit 命令行（输出 JSON）")
+    parser.add_argument("--progress", action="store_true", help="在标准错误中输出进度")
+    parser.add_argument("--indent", type=int, default=None, help="JSON 缩进空格数")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("import", help="导入一个或多个文件")
+    command.add_argument("db", help="数据库文件（不存在时新建）")
+    command.add_argument("files", nargs="+", help="CSV / Parquet / Excel 文件，多个文件按给出的顺序写入")
+    command.add_argument("--table", type=table_arg, default="journal", help="journal（默认）或 balance")
+    command.add_argument("--append", action="store_true", help="追加到已有的数据，跳过已导入的行")
+    command.add_argument("--sheet", action="append", dest="sheets", help="Excel 工作表名称，可多次指定")
+    command.add_argument("--all-sheets", action="store_true", help="读取 Excel 文件中的全部工作表")
+    command.add_argument("--no-fulltext", action="store_true", help="不建立序时账全文索引")
+    command.add_argument("--workers", type=int, default=None, help="解析多个文件的子进程数")
+
+    command = commands.add_parser("validate", help="核对科目余额表与序时账")
+    command.add_argument("db")
+    command.add_argument("--limit", type=int, default=DEFAULT_LIMIT, help="最多输出的差异行数")
+
+    command = commands.add_parser("account", help="明细账：科目及其全部下级科目的分录")
+    command.add_argument("db")
+    command.add_argument("code", help="科目编码")
+    command.add_argument("--limit", type=int, default=DEFAULT_LIMIT)
+
+    command = commands.add_parser("voucher", help="凭证：按凭证字号和日期查询")
+    command.add_argument("db")
+    command.add_argument("voucher", help="凭证字号")
+    command.add_argument("date", help="日期（与序时账中的格式一致）")
+
+    command = commands.add_parser("filter", help="筛选包含指定文本的行")
+    command.add_argument("db")
+    command.add_argument("table", type=table_arg)
+    command.add_argument("column", help="列名")
+    command.add_argument("text", help="筛选条件")
+    command.add_argument("--limit", type=int, default=DEFAULT_LIMIT)
+
+    command = commands.add_parser("query", help="组合筛选：多列条件一次查询（写法见用户手册）")
+    command.add_argument("db")
+    command.add_argument("table", type=table_arg)
+    command.add_argument("conditions", nargs="+", type=condition_arg, help="列名=条件，如 科目编码=6602* 日期=2023-03..")
+    command.add_argument("--limit", type=int, default=DEFAULT_LIMIT)
+
+    command = commands.add_parser("export", help="导出数据表（.parquet / .csv / .xlsx）")
+    command.add_argument("db")
+    command.add_argument("table", type=table_arg)
+    command.add_argument("output", help="目标文件")
+
+    command = commands.add_parser("batch", help="按清单文件并行处理多个客户的数据库")
+    command.add_argument("manifest", help="清单文件（JSON 数组）")
+    command.add_argument("--workers", type=int, default=None, help="子进程数，默认不超过 CPU 核数")
+    return parser
+
+
+def run_command(args):
+    """
+    执行命令
+    :return: (结果字典, 退出码)
+    """
+    progress = stderr_progress() if args.progress else None
+    if args.command == "import":
+        sheets = ALL_SHEETS if args.all_sheets else args.sheets
+        return run_import(
+            args.db, args.table, args.files, append=args.append, sheets=sheets, fulltext=not args.no_fulltext,
+            progress=progress, max_workers=args.workers,
+        ), EXIT_OK
+    if args.command == "validate":
+        result, balanced = run_validate(args.db, args.limit)
+        return result, EXIT_OK if balanced else EXIT_DISCREPANCY
+    if args.command == "export":
+        return run_export(args.db, args.table, args.output, progress), EXIT_OK
+    if args.command == "batch":
+        return run_batch(args.manifest, args.workers)
+
+    # 查询命令只读取数据库
+    require_db(args.db)
+    with closing(connect(args.db, read_only=True)) as conn:
+        if args.command == "account":
+            return frame_json(account_lines(conn, args.code), args.limit), EXIT_OK
+        if args.command == "filter":
+            return frame_json(filter_rows(conn, args.table, args.column, args.text), args.limit), EXIT_OK
+        if args.command == "query":
+            return frame_json(compound_filter(conn, args.table, dict(args.conditions)), args.limit), EXIT_OK
+        voucher = find_voucher(conn, (args.voucher, args.date))
+    if voucher is None:
+        raise LookupError("未找到符合条件的凭证记录！")
+    return {
+        "key": list(voucher.key),
+        "total_debit": float(voucher.total_debit),
+        "total_credit": float(voucher.total_credit),
+        "balanced": bool(voucher.balanced),
+        "prev_key": list(voucher.prev_key) if voucher.prev_key else None,
+        "next_key": list(voucher.next_key) if voucher.next_key else None,
+        "lines": frame_json(voucher.table, None),
+    }, EXIT_OK
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    start_time = time.perf_counter()
+    try:
+        result, code = run_command(args)
+        result = {"ok": code != EXIT_ERROR, "command": args.command, **result}
+    except Exception as e:
+        result, code = {"ok": False, "command": args.command, "error": f"{type(e).__name__}: {e}"}, EXIT_ERROR
+    result.setdefault("seconds", round(time.perf_counter() - start_time, 3))
+    json.dump(result, sys.stdout, ensure_ascii=False, indent=args.indent, default=str)
+    sys.stdout.write("\n")
+    return code
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
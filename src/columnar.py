@@ -0,0 +1,407 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Audit-Inspector-Toolkit
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+列式序时账引擎（可选）：序时账另存为 saved_data 中的 Arrow IPC 文件，以内存映射方式打开（零拷贝），
+筛选、明细账和凭证查询通过 pyarrow.compute 在列上完成，只有可见行才转换为 Python 对象。
+数据常驻在操作系统的页缓存中，而不是 Python 对象中
+"""
+
+import os
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from progress import report
+from schema import TABLE_SCHEMAS
+
+# 列式序时账文件名（位于 saved_data 目录）
+JOURNAL_ARROW_FILE = "journal.arrow"
+# 指针文件的后缀（文件内容为当前版本文件的文件名）
+POINTER_SUFFIX = ".current"
+# 从数据库导出时每批读取的行数
+EXPORT_BATCH_ROWS = 100_000
+# 行号数组的类型（与 filters.POSITION_DTYPE 一致）
+POSITION_DTYPE = np.int32
+
+ARROW_TYPES = {"TEXT": pa.string(), "REAL": pa.float64()}
+
+
+def arrow_schema(table_name):
+    """
+    生成数据表对应的 Arrow 表结构
+    :param table_name: 数据库表名
+    :return: pyarrow.Schema
+    """
+    return pa.schema([(col, ARROW_TYPES[col_type]) for col, col_type in TABLE_SCHEMAS[table_name]])
+
+
+def rows_to_batch(rows, schema):
+    """
+    将数据库行转换为 Arrow RecordBatch
+    :param rows: 数据库行（元组列表，非空）
+    :param schema: pyarrow.Schema
+    :return: pyarrow.RecordBatch
+    """
+    arrays = []
+    for field, values in zip(schema, zip(*rows)):
+        try:
+            arrays.append(pa.array(values, type=field.type))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # 列中混有其他类型的值（如外部导入的数据库）：REAL 列中无法转换的文本按缺失值处理，TEXT 列统一转为字符串
+            if pa.types.is_floating(field.type):
+                values = pd.to_numeric(pd.Series(values, dtype=object), errors="coerce")
+                arrays.append(pa.array(values, type=field.type, from_pandas=True))
+            else:
+                arrays.append(pa.array([None if v is None else str(v) for v in values], type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def contains_positions(table, col, text, positions=None):
+    """
+    按列“包含”筛选（按字面匹配，不区分大小写）
+    :param table: pyarrow.Table
+    :param col: 列名
+    :param text: 筛选条件
+    :param positions: 只在这些行中筛选（为 None 时在全表中筛选）
+    :return: 命中行在表中的行号
+    """
+    values = table.column(col)
+    if positions is not None:
+        values = values.take(pa.array(positions))
+    if not pa.types.is_string(values.type):
+        values = pc.cast(values, pa.string())
+    mask = pc.fill_null(pc.match_substring(values, text, ignore_case=True), False)
+    matched = np.flatnonzero(mask.to_numpy(zero_copy_only=False))
+    if positions is not None:
+        return np.asarray(positions, dtype=POSITION_DTYPE)[matched]
+    return matched.astype(POSITION_DTYPE)
+
+
+def equals_positions(table, conditions):
+    """
+    按列精确匹配
+    :param table: pyarrow.Table
+    :param conditions: {列名: 值}，各条件同时满足
+    :return: 命中行在表中的行号
+    """
+    mask = None
+    for col, value in conditions.items():
+        condition = pc.fill_null(pc.equal(table.column(col), value), False)
+        mask = condition if mask is None else pc.and_(mask, condition)
+    return np.flatnonzero(mask.to_numpy(zero_copy_only=False)).astype(POSITION_DTYPE)
+
+
+def prefix_positions(table, col, prefix):
+    """
+    按列前缀匹配（如科目编码 1122 匹配 1122 及其全部下级科目）
+    :param table: pyarrow.Table
+    :param col: 列名
+    :param prefix: 前缀
+    :return: 命中行在表中的行号
+    """
+    mask = pc.fill_null(pc.starts_with(table.column(col), prefix), False)
+    return np.flatnonzero(mask.to_numpy(zero_copy_only=False)).astype(POSITION_DTYPE)
+
+
+def neighbour_voucher(table, positions, step):
+    """
+    获取与指定凭证相邻的凭证（凭证分录在序时账中连续存放）
+    :param table: pyarrow.Table
+    :param positions: 该凭证分录的行号（非空）
+    :param step: -1 为上一张，1 为下一张
+    :return: (凭证字号, 日期)，不存在时为 None
+    """
+    position = int(positions.min()) - 1 if step < 0 else int(positions.max()) + 1
+    if not 0 <= position < table.num_rows:
+        return None
+    return table.column("凭证字号")[position].as_py(), table.column("日期")[position].as_py()
+
+
+def take_rows(table, positions):
+    """
+    将指定行转换为 Python 元组
+    :param table: pyarrow.Table
+    :param positions: 行号数组
+    :return: 元组列表
+    """
+    taken = table.take(pa.array(positions))
+    return list(zip(*(column.to_pylist() for column in taken.columns)))
+
+
+class ColumnarSource:
+    """
+    以内存映射的 Arrow 表为后端的数据源（供 VirtualGrid 使用），只转换可见行
+    """
+
+    def __init__(self, table, positions=None):
+        """
+        :param table: pyarrow.Table
+        :param positions: 要显示的行号（为 None 时显示全表）
+        """
+        self.table = table
+        self.positions = positions
+        self.appended = []  # 粘贴的行（只影响当前显示）
+
+    def __len__(self):
+        base = self.table.num_rows if self.positions is None else len(self.positions)
+        return base + len(self.appended)
+
+    def rows(self, start, stop):
+        """
+        获取 [start, stop) 范围内的行
+        :return: 元组列表
+        """
+        base = len(self) - len(self.appended)
+        result = []
+        if start < base:
+            end = min(stop, base)
+            if self.positions is None:
+                sliced = self.table.slice(start, end - start)
+                result = list(zip(*(column.to_pylist() for column in sliced.columns)))
+            else:
+                result = take_rows(self.table, self.positions[start:end])
+        if stop > base:
+            result.extend(self.appended[max(start - base, 0):stop - base])
+        return result
+
+    def append_rows(self, rows):
+        """
+        在末尾追加行（用于粘贴）
+        :param rows: 值列表的列表
+        """
+        width = self.table.num_columns
+        self.appended.extend(tuple(row[:width]) + ("",) * (width - len(row[:width])) for row in rows)
+
+
+class ColumnarFrame:
+    """
+    筛选状态的基础数据（列式）：整个序时账表，筛选结果以行号表示
+    接口与 filters.FilterState 对 DataFrame 基础数据的用法对应
+    """
+
+    def __init__(self, table):
+        """
+        :param table: pyarrow.Table
+        """
+        self.table = table
+
+    def __len__(self):
+        return self.table.num_rows
+
+    @property
+    def columns(self):
+        return self.table.column_names
+
+    def contains_positions(self, col, text, positions=None):
+        return contains_positions(self.table, col, text, positions)
+
+    def source(self, positions=None):
+        return ColumnarSource(self.table, positions)
+
+    def to_dataframe(self, positions=None):
+        table = self.table if positions is None else self.table.take(pa.array(positions))
+        return table.to_pandas()
+
+
+class ColumnarJournal:
+    """
+    列式序时账文件：导出、内存映射打开和删除。
+    每次写入都生成一个新版本的文件（journal.<版本>.arrow），写完后再更新指针文件（journal.current）指向它，
+    从不覆盖正在映射的文件：旧版本在仍被筛选结果或表格引用时（Windows 下无法删除或替换已映射的文件）保持可读，
+    等不再被映射后，在下次写入或删除时清理
+    """
+
+    def __init__(self, path):
+        """
+        :param path: Arrow IPC 文件路径（各版本文件和指针文件均以其文件名为前缀，位于同一目录）
+        """
+        self.path = path
+        self.directory = os.path.dirname(path) or "."
+        self.stem, self.suffix = os.path.splitext(os.path.basename(path))
+        self.pointer_path = os.path.join(self.directory, self.stem + POINTER_SUFFIX)
+        self._lock = threading.Lock()
+        self._mmap = None
+        self._table = None
+        self._opened = None  # 当前映射的文件路径
+
+    def current_path(self):
+        """
+        指针文件所指向的当前版本文件
+        :return: 文件路径，指针文件或其指向的文件不存在时为 None
+        """
+        try:
+            with open(self.pointer_path, encoding="utf-8") as f:
+                name = f.read().strip()
+        except FileNotFoundError:
+            return None
+        path = os.path.join(self.directory, name)
+        return path if name and os.path.exists(path) else None
+
+    def ready(self):
+        """
+        列式文件是否存在
+        """
+        return self.current_path() is not None
+
+    def open(self):
+        """
+        以内存映射方式打开当前版本的列式文件（零拷贝，文件未更新时多次调用返回同一个表）
+        :return: pyarrow.Table
+        """
+        with self._lock:
+            path = self.current_path()
+            if path is None:
+                raise FileNotFoundError(f"列式序时账文件不存在：{self.pointer_path}")
+            if self._table is None or self._opened != path:
+                self._release()
+                self._mmap = pa.memory_map(path, "r")
+                self._table = pa.ipc.open_file(self._mmap).read_all()
+                self._opened = path
+            return self._table
+
+    def close(self):
+        """
+        释放内存映射（已取出的数据在不再被引用后才真正解除映射）
+        """
+        with self._lock:
+            self._release()
+
+    def _release(self):
+        self._table = None
+        self._opened = None
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def remove(self):
+        """
+        删除列式文件（数据库中的序时账已变化，文件不再对应）：先删除指针文件，
+        各版本文件中仍被映射而无法删除的留待下次清理
+        """
+        self.close()
+        if os.path.exists(self.pointer_path):
+            os.remove(self.pointer_path)
+        self._remove_stale(keep=None)
+
+    def _version_paths(self):
+        """
+        目录中的全部版本文件（以及旧版本软件直接保存的 journal.arrow）
+        :return: {文件路径: 版本号}
+        """
+        pattern = re.compile(rf"^{re.escape(self.stem)}(?:\.(\d+))?{re.escape(self.suffix)}$")
+        versions = {}
+        if not os.path.isdir(self.directory):
+            return versions
+        for name in os.listdir(self.directory):
+            match = pattern.match(name)
+            if match is not None:
+                versions[os.path.join(self.directory, name)] = int(match.group(1) or 0)
+        return versions
+
+    def _remove_stale(self, keep):
+        """
+        删除 keep 以外的版本文件；仍被映射（Windows 下会拒绝删除）的文件跳过
+        """
+        for path in self._version_paths():
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def export(self, conn, token=None, progress=None, batch_rows=EXPORT_BATCH_ROWS):
+        """
+        从数据库导出序时账，先写临时文件，完成后替换原文件
+        :param conn: sqlite3 连接
+        :param token: 取消令牌（可选），每批之间检查
+        :param progress: 进度报告器（ProgressReporter，可选），报告已导出行数
+        :param batch_rows: 每批行数
+        :return: 导出行数
+        """
+        return self._write(self._query_batches(conn, 0, batch_rows), token, progress)
+
+    def append(self, conn, after_rowid, token=None, progress=None, batch_rows=EXPORT_BATCH_ROWS):
+        """
+        追加序时账后更新列式文件：原文件中的数据按批原样复制（不再从数据库读取），
+        只有 rowid 大于 after_rowid 的新行从数据库读取；列式文件不存在时全量导出
+        :param conn: sqlite3 连接
+        :param after_rowid: 追加前序时账的最大 rowid
+        :param token: 取消令牌（可选），每批之间检查
+        :param progress: 进度报告器（ProgressReporter，可选），报告已写入行数
+        :param batch_rows: 每批行数
+        :return: 写入行数
+        """
+        if not self.ready():
+            return self.export(conn, token, progress, batch_rows)
+
+        def batches():
+            yield from self.open().to_batches()
+            yield from self._query_batches(conn, after_rowid, batch_rows)
+
+        return self._write(batches(), token, progress)
+
+    @staticmethod
+    def _query_batches(conn, after_rowid, batch_rows):
+        """
+        按 rowid 顺序分批读取序时账中 rowid 大于 after_rowid 的行
+        :return: 生成器，每次产出一个 RecordBatch
+        """
+        schema = arrow_schema("journal")
+        cursor = conn.execute(
+            f"SELECT {', '.join(schema.names)} FROM journal WHERE rowid > ? ORDER BY rowid", (after_rowid,)
+        )
+        while True:
+            batch = cursor.fetchmany(batch_rows)
+            if not batch:
+                return
+            yield rows_to_batch(batch, schema)
+
+    def _write(self, batches, token=None, progress=None):
+        """
+        将各批数据写入新版本的文件，完成后将指针文件指向它（不替换正在映射的旧文件）
+        :param batches: 可迭代的 RecordBatch
+        :return: 写入行数
+        """
+        version = max(self._version_paths().values(), default=0) + 1
+        path = os.path.join(self.directory, f"{self.stem}.{version}{self.suffix}")
+        temp_path = path + ".tmp"
+        rows = 0
+        try:
+            with pa.OSFile(temp_path, "wb") as sink, pa.ipc.new_file(sink, arrow_schema("journal")) as writer:
+                for batch in batches:
+                    if token is not None:
+                        token.raise_if_cancelled()
+                    writer.write_batch(batch)
+                    rows += batch.num_rows
+                    report(progress, rows=rows)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        os.replace(temp_path, path)
+        pointer_temp = self.pointer_path + ".tmp"
+        with open(pointer_temp, "w", encoding="utf-8") as f:
+            f.write(os.path.basename(path))
+        os.replace(pointer_temp, self.pointer_path)
+        self.close()
+        self._remove_stale(keep=path)
+        return rows
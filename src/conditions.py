@@ -0,0 +1,261 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Audit-Inspector-Toolkit
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+组合筛选：将一张表各筛选框中的条件编译为一条参数化的 WHERE 子句，多列条件在数据库中一次完成，
+只有同时满足全部条件的行才会读入内存。
+
+筛选框中的写法：
+    差旅            包含（不区分大小写，与逐次筛选相同）
+    =6602           等于（日期列按日、月或年匹配）
+    6602*           以……开头（仅文本列）
+    100..500        范围，含两端；可省略一端，如 2023-03..（仅数值列和日期列）
+    >=100 >100 <=100 <100   比较（仅数值列和日期列）
+    !条件           取反，如 !差旅、!=0、!6602*（空值视为不满足原条件，取反后保留）
+日期可写作 2023-03-05、2023/3/5、20230305，写 2023-03 或 2023 表示整月或整年
+"""
+
+import datetime
+import re
+from dataclasses import dataclass
+
+from accounts import prefix_range
+from fulltext import FTS_TABLE, fts_ready, fts_searchable, like_contains
+from schema import DATE_COLUMNS, TABLE_SCHEMAS, table_columns
+
+NEGATE = "!"
+PREFIX_WILDCARD = "*"
+RANGE_SEPARATOR = ".."
+# 比较运算符（两个字符的在前）
+COMPARISONS = [">=", "<=", ">", "<"]
+
+DATE_PATTERNS = [
+    (re.compile(r"^(\d{4})[-/.年](\d{1,2})[-/.月](\d{1,2})日?$"), "day"),
+    (re.compile(r"^(\d{4})(\d{2})(\d{2})$"), "day"),
+    (re.compile(r"^(\d{4})[-/.年](\d{1,2})月?$"), "month"),
+    (re.compile(r"^(\d{4})(\d{2})$"), "month"),
+    (re.compile(r"^(\d{4})年?$"), "year"),
+]
+
+
+@dataclass(frozen=True)
+class Condition:
+    """
+    单列的筛选条件
+    """
+    column: str
+    op: str  # contains / equals / prefix / range
+    value: object = None  # contains / equals / prefix 的值
+    low: object = None  # range 的下界（None 为不限）
+    high: object = None  # range 的上界（None 为不限）
+    low_inclusive: bool = True
+    high_inclusive: bool = True
+    negate: bool = False
+
+
+def column_kind(table_name, col):
+    """
+    列的比较方式：number（REAL 列）、date（日期列）或 text
+    """
+    col_type = dict(TABLE_SCHEMAS[table_name]).get(col)
+    if col_type == "REAL":
+        return "number"
+    if col in DATE_COLUMNS:
+        return "date"
+    return "text"
+
+
+def parse_number(col, text):
+    try:
+        return float(text.replace(",", "").replace("，", ""))
+    except ValueError:
+        raise ValueError(f"{col}：无法识别的数值 '{text}'") from None
+
+
+def parse_date(col, text):
+    """
+    解析日期
+    :return: (起始日期, 结束日期的次日)，均为 年-月-日 文本；按月、按年时为整月、整年
+    """
+    for pattern, unit in DATE_PATTERNS:
+        match = pattern.match(text)
+        if match is None:
+            continue
+        parts = [int(part) for part in match.groups()]
+        try:
+            if unit == "day":
+                start = datetime.date(*parts)
+                end = start + datetime.timedelta(days=1)
+            elif unit == "month":
+                start = datetime.date(parts[0], parts[1], 1)
+                end = datetime.date(parts[0] + parts[1] // 12, parts[1] % 12 + 1, 1)
+            else:
+                start = datetime.date(parts[0], 1, 1)
+                end = datetime.date(parts[0] + 1, 1, 1)
+        except ValueError:
+            break
+        return start.isoformat(), end.isoformat()
+    raise ValueError(f"{col}：无法识别的日期 '{text}'")
+
+
+def parse_condition(table_name, col, text):
+    """
+    解析一个筛选框中的条件
+    :param table_name: 数据库表名
+    :param col: 列名
+    :param text: 筛选框中的文本
+    :return: Condition
+    """
+    text = text.strip()
+    negate = text.startswith(NEGATE)
+    if negate:
+        text = text[len(NEGATE):].strip()
+    if not text:
+        raise ValueError(f"{col}：筛选条件为空")
+    kind = column_kind(table_name, col)
+
+    if kind != "text":
+        for op in COMPARISONS:
+            if text.startswith(op):
+                bound = text[len(op):].strip()
+                if op.startswith(">"):
+                    return range_condition(col, kind, bound, None, op == ">=", True, negate)
+                return range_condition(col, kind, None, bound, True, op == "<=", negate)
+        if RANGE_SEPARATOR in text:
+            low, high = (part.strip() for part in text.split(RANGE_SEPARATOR, 1))
+            if not low and not high:
+                raise ValueError(f"{col}：范围的两端不能都为空")
+            return range_condition(col, kind, low or None, high or None, True, True, negate)
+
+    if text.startswith("="):
+        value = text[1:].strip()
+        if kind == "date":
+            # 同一天（月、年）的范围，日期列中带时间的值也能匹配
+            return range_condition(col, kind, value, value, True, True, negate)
+        return Condition(col, "equals", parse_number(col, value) if kind == "number" else value, negate=negate)
+    if text.endswith(PREFIX_WILDCARD) and len(text) > len(PREFIX_WILDCARD):
+        if kind == "number":
+            # 数值转为文本后的写法不固定（如 6602.0），按前缀匹配没有意义
+            raise ValueError(f"{col}：数值列不能按开头匹配，请使用范围或比较，如 6602..6603")
+        return Condition(col, "prefix", text[:-len(PREFIX_WILDCARD)], negate=negate)
+    return Condition(col, "contains", text, negate=negate)
+
+
+def range_condition(col, kind, low, high, low_inclusive, high_inclusive, negate):
+    """
+    生成范围条件；日期统一转换为 [起始日期, 结束日期的次日) 的半开区间
+    """
+    if kind == "number":
+        return Condition(
+            col, "range",
+            low=None if low is None else parse_number(col, low),
+            high=None if high is None else parse_number(col, high),
+            low_inclusive=low_inclusive, high_inclusive=high_inclusive, negate=negate,
+        )
+    low_date = None if low is None else parse_date(col, low)[0 if low_inclusive else 1]
+    high_date = None if high is None else parse_date(col, high)[1 if high_inclusive else 0]
+    return Condition(col, "range", low=low_date, high=high_date, high_inclusive=False, negate=negate)
+
+
+def parse_criteria(table_name, criteria):
+    """
+    解析一张表全部筛选框中的条件（空的筛选框忽略）
+    :param table_name: 数据库表名
+    :param criteria: {列名: 筛选框中的文本}
+    :return: Condition 列表
+    """
+    columns = table_columns(table_name)
+    conditions = []
+    for col, text in criteria.items():
+        if not text or not text.strip():
+            continue
+        if col not in columns:
+            raise ValueError(f"列名 '{col}' 不存在！")
+        conditions.append(parse_condition(table_name, col, text))
+    return conditions
+
+
+def condition_sql(table_name, condition):
+    """
+    单个条件的 SQL 表达式（不含取反）
+    :return: (表达式, 参数列表)
+    """
+    col = condition.column
+    if condition.op == "contains":
+        expression, pattern = like_contains(col, condition.value)
+        return expression, [pattern]
+    if condition.op == "equals":
+        return f"{col} = ?", [condition.value]
+    if condition.op == "prefix":
+        # 范围比较可以使用该列的索引（如科目编码及其全部下级科目）
+        return f"{col} >= ? AND {col} < ?", list(prefix_range(condition.value))
+    parts, params = [], []
+    if condition.low is not None:
+        parts.append(f"{col} {'>=' if condition.low_inclusive else '>'} ?")
+        params.append(condition.low)
+    if condition.high is not None:
+        parts.append(f"{col} {'<=' if condition.high_inclusive else '<'} ?")
+        params.append(condition.high)
+    return " AND ".join(parts), params
+
+
+def compile_where(conn, table_name, conditions):
+    """
+    将条件编译为一条参数化的 WHERE 子句。
+    序时账文本列上的“包含”条件合并为一次全文索引查询，其余条件由 SQLite 按索引计划选择索引
+    :param conn: sqlite3 连接（用于检查全文索引是否已建立）
+    :param table_name: 数据库表名
+    :param conditions: Condition 列表
+    :return: (WHERE 子句（不含 WHERE）, 参数元组)
+    """
+    use_fts = table_name == "journal" and fts_ready(conn)
+    clauses, params = [], []
+    fts_clauses, fts_params = [], []
+    for condition in conditions:
+        expression, values = condition_sql(table_name, condition)
+        if (
+                use_fts
+                and condition.op == "contains"
+                and not condition.negate
+                and fts_searchable(table_name, condition.column, condition.value)
+        ):
+            fts_clauses.append(expression)
+            fts_params.extend(values)
+            continue
+        if condition.negate:
+            # 原条件为假或为空值（NULL）时保留
+            expression = f"({expression}) IS NOT 1"
+        clauses.append(f"({expression})")
+        params.extend(values)
+    if fts_clauses:
+        clauses.insert(0, f"rowid IN (SELECT rowid FROM {FTS_TABLE} WHERE {' AND '.join(fts_clauses)})")
+        params[:0] = fts_params
+    return " AND ".join(clauses), tuple(params)
+
+
+def compound_query(conn, table_name, criteria):
+    """
+    生成组合筛选的查询语句（结果按 rowid 排序，与表中的原始顺序一致）
+    :param conn: sqlite3 连接
+    :param table_name: 数据库表名
+    :param criteria: {列名: 筛选框中的文本}
+    :return: (查询语句, 参数)
+    """
+    conditions = parse_criteria(table_name, criteria)
+    if not conditions:
+        raise ValueError("请输入筛选条件！")
+    where, params = compile_where(conn, table_name, conditions)
+    query = f"SELECT {', '.join(table_columns(table_name))} FROM {table_name} WHERE {where} ORDER BY rowid"
+    return query, params
@@ -0,0 +1,185 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Audit-Inspector-Toolkit
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+数据库连接管理：每个工作线程保持一个长期的读连接，另有一个共享的写连接，
+连接统一设置缓存、内存映射等参数，页缓存和预编译语句得以跨操作复用。
+WAL 模式会写入数据库文件本身并在旁边生成 -wal、-shm 文件，因此只用于软件自己的工作区数据库，
+用户上传或在命令行中指定的数据库保持原来的日志模式
+"""
+
+import pathlib
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from indexes import ACCOUNT_LINES_SQL, NEXT_VOUCHER_SQL, PREV_VOUCHER_SQL, VOUCHER_LINES_SQL, table_exists
+
+# 每个连接的页缓存（负数表示 KiB），约 64MB
+CACHE_SIZE_KIB = 64 * 1024
+# 批量写入期间写连接的页缓存，约 256MB
+BULK_CACHE_SIZE_KIB = 256 * 1024
+# 内存映射大小，由操作系统页缓存承担，多个连接共享
+MMAP_SIZE = 256 * 1024 * 1024
+# 每个连接缓存的预编译语句数量
+CACHED_STATEMENTS = 256
+
+# 右键明细账、凭证及上一张/下一张凭证等热点查询：连接打开后先预编译一次，之后直接复用
+HOT_STATEMENTS = [
+    (ACCOUNT_LINES_SQL, ("", "")),
+    (VOUCHER_LINES_SQL, ("", "")),
+    (PREV_VOUCHER_SQL, ("", "")),
+    (NEXT_VOUCHER_SQL, ("", "")),
+]
+
+
+def connect(db_path, wal=False, read_only=False):
+    """
+    打开一个设置好参数的数据库连接
+    :param db_path: 数据库路径
+    :param wal: 是否将数据库切换为 WAL 模式（只用于工作区数据库，该设置保存在文件中）
+    :param read_only: 是否以只读方式打开（只读取数据的命令使用，不会创建或修改文件）
+    :return: sqlite3 连接
+    """
+    # 连接只由创建它的线程使用（写连接由锁保护），关闭时可能在其他线程，因此关闭同线程检查
+    if read_only:
+        uri = f"{pathlib.Path(db_path).resolve().as_uri()}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False, cached_statements=CACHED_STATEMENTS)
+    else:
+        conn = sqlite3.connect(db_path, check_same_thread=False, cached_statements=CACHED_STATEMENTS)
+    if wal and not read_only:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")  # WAL 模式下仍可保证数据库不损坏
+    conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KIB}")
+    conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
+
+def warm_statements(conn):
+    """
+    预编译热点查询，使第一次右键查询也能直接使用缓存的语句
+    :param conn: sqlite3 连接
+    """
+    if not table_exists(conn, "journal"):
+        return
+    try:
+        for sql, params in HOT_STATEMENTS:
+            conn.execute(sql, params).fetchall()
+    except sqlite3.Error:
+        pass  # 表结构与预期不一致时，由实际查询报告错误
+
+
+class ConnectionManager:
+    """
+    长连接管理器
+    """
+
+    def __init__(self, db_path, wal=False):
+        """
+        :param db_path: 数据库路径
+        :param wal: 是否使用 WAL 模式（只用于工作区数据库）
+        """
+        self.db_path = db_path
+        self.wal = wal
+        self._local = threading.local()
+        self._readers = []  # 所有读连接，用于关闭
+        self._readers_lock = threading.Lock()
+        self._writer = None
+        self._writer_path = None
+        self._writer_lock = threading.RLock()
+
+    def set_path(self, db_path, wal=False):
+        """
+        切换当前数据库；各线程的读连接在下次使用时重新打开
+        :param db_path: 数据库路径
+        :param wal: 是否使用 WAL 模式（只用于工作区数据库）
+        """
+        with self._writer_lock:
+            self.db_path = db_path
+            self.wal = wal
+            self._close_writer()
+
+    def reader(self):
+        """
+        获取当前线程的读连接（不存在或数据库已切换时重新打开）
+        :return: sqlite3 连接
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.path == self.db_path:
+            return conn
+        if conn is not None:
+            self._discard_reader(conn)
+
+        conn = connect(self.db_path, wal=self.wal)
+        warm_statements(conn)
+        self._local.conn = conn
+        self._local.path = self.db_path
+        with self._readers_lock:
+            self._readers.append(conn)
+        return conn
+
+    @contextmanager
+    def writer(self):
+        """
+        独占使用写连接
+        """
+        with self._writer_lock:
+            if self._writer is None or self._writer_path != self.db_path:
+                self._close_writer()
+                self._writer = connect(self.db_path, wal=self.wal)
+                self._writer_path = self.db_path
+            try:
+                yield self._writer
+            except BaseException:
+                # 写入中途出错或被取消时回滚未提交的部分，避免影响下一次写入
+                self._writer.rollback()
+                raise
+
+    @contextmanager
+    def bulk_load(self):
+        """
+        独占使用写连接进行批量写入，期间使用更大的页缓存
+        """
+        with self.writer() as conn:
+            conn.execute(f"PRAGMA cache_size=-{BULK_CACHE_SIZE_KIB}")
+            try:
+                yield conn
+            finally:
+                conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KIB}")
+
+    def close_all(self):
+        """
+        关闭所有连接（退出程序时调用）
+        """
+        with self._readers_lock:
+            readers, self._readers = self._readers, []
+        self._local = threading.local()
+        for conn in readers:
+            conn.close()
+        with self._writer_lock:
+            self._close_writer()
+
+    def _discard_reader(self, conn):
+        with self._readers_lock:
+            if conn in self._readers:
+                self._readers.remove(conn)
+        conn.close()
+
+    def _close_writer(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            self._writer_path = None
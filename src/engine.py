@@ -0,0 +1,264 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Audit-Inspector-Toolkit
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+数据引擎：导入、建立索引和派生表、校验、明细账与凭证查询、筛选的非界面接口。
+界面（main.py）在工作线程中调用，命令行（cli.py）直接调用；函数只接收数据库连接，不依赖 Tkinter
+"""
+
+import pandas as pd
+
+from accounts import build_account_tree, prefix_range
+from conditions import compound_query
+from fulltext import build_fts, contains_query, drop_fts, fts_ready, update_fts
+from indexes import (
+    ACCOUNT_LINES_SQL,
+    NEXT_VOUCHER_SQL,
+    PREV_VOUCHER_SQL,
+    VOUCHER_LINES_SQL,
+    build_indexes,
+    drop_unplanned_indexes,
+    table_exists,
+)
+from ingest import DEFAULT_COMMIT_ROWS, ChunkReader, bulk_load, import_files
+from rowhash import ensure_row_hashes
+from schema import JOURNAL_COLUMNS, table_columns
+from summary import build_period_summary, period_summary_ready, update_period_summary
+from tracing import fetch_all, phase, set_rows
+from validation import reconcile
+from voucher import Voucher, assemble_voucher
+
+# 数据库表名对应的中文名称（用于进度说明）
+TABLE_LABELS = {"journal": "序时账", "balance": "科目余额表"}
+
+
+def _stage(progress, name, **totals):
+    if progress is not None:
+        progress.stage(name, **totals)
+
+
+def import_ledger(conn, table_name, file_paths, token=None, progress=None, on_file=None, sheets=None,
+                  append=False, fulltext=True, store=None, columnar=False, max_workers=None):
+    """
+    导入序时账或科目余额表文件，并建立（追加时增量更新）索引、汇总表、科目层级和全文索引
+    :param conn: sqlite3 连接（需可写，一般为 ConnectionManager.bulk_load() 的连接）
+    :param table_name: 数据库表名（"journal" 或 "balance"）
+    :param file_paths: 文件路径列表；多个文件在子进程中并行解析，按列表顺序在一个事务中写入
+    :param token: 取消令牌（可选）
+    :param progress: 进度报告器（ProgressReporter，可选）
+    :param on_file: 多个文件时的单个文件状态回调，参数为 (文件路径, 状态, 行数)
+    :param sheets: Excel 工作表名称列表（None 为第一个工作表，ALL_SHEETS 为全部工作表）
+    :param append: 是否追加到已有的数据（按行哈希跳过已导入的行）；数据表不存在时按替换处理
+    :param fulltext: 是否建立序时账全文索引
+    :param store: 列式序时账文件（ColumnarJournal，可选）；为 None 时不处理列式文件
+    :param columnar: 是否启用列式引擎；未启用时删除 store 中已过期的文件
+    :param max_workers: 解析多个文件的子进程数（默认不超过 CPU 核数）
+    :return: ImportStats
+    """
+    label = TABLE_LABELS.get(table_name, table_name)
+    after_rowid = None  # 追加前数据表的最大 rowid（替换时为 None）
+    if append and table_exists(conn, table_name):
+        _stage(progress, f"检查已导入{label}的行哈希")
+        ensure_row_hashes(conn, token, progress)  # 旧版本的数据库先补算行哈希
+        after_rowid = conn.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {table_name}").fetchone()[0]
+    elif table_name == "journal":
+        drop_fts(conn)  # 旧的全文索引与新数据不再对应
+    replace = after_rowid is None
+
+    if len(file_paths) == 1:
+        # 按块读取文件，内存占用只与块大小有关
+        reader = ChunkReader(file_paths[0], sheets=sheets)
+        _stage(progress, f"写入{label}", total_bytes=reader.total_bytes)
+        stats = bulk_load(
+            conn, table_name, reader, replace=replace, progress=progress,
+            # 追加时全部数据在一个事务中写入，出错时不留下部分数据
+            commit_rows=DEFAULT_COMMIT_ROWS if replace else None,
+        )
+    else:
+        _stage(progress, f"写入{label}（{len(file_paths)} 个文件）")
+        stats = import_files(
+            conn, table_name, file_paths, token=token, on_file=on_file, progress=progress,
+            max_workers=max_workers, sheets=sheets, replace=replace,
+        )
+
+    if not replace:
+        # 追加：索引随写入维护，全文索引、汇总表和列式文件只处理新增的行
+        _stage(progress, "更新全文索引和汇总表")
+        with phase("index"):
+            update_fts(conn, after_rowid)
+            if period_summary_ready(conn):
+                update_period_summary(conn, after_rowid)
+                conn.commit()
+            else:
+                build_period_summary(conn)
+            build_account_tree(conn)  # 由汇总表重建，不扫描序时账
+        with phase("columnar"):
+            sync_columnar(conn, store, columnar, token, after_rowid=after_rowid, progress=progress)
+        return stats
+
+    # 写入完成后按索引计划建立索引
+    with phase("index"):
+        _stage(progress, "建立索引")
+        build_indexes(conn, table_name)
+        if table_name == "journal":
+            _stage(progress, "汇总科目 × 月份发生额")
+            build_period_summary(conn)  # 科目 × 月份汇总
+        _stage(progress, "建立科目层级")
+        build_account_tree(conn)  # 科目层级及各级科目的发生额汇总
+        if table_name == "journal" and fulltext:
+            _stage(progress, "建立全文索引")
+            build_fts(conn)
+    if table_name == "journal":
+        with phase("columnar"):
+            sync_columnar(conn, store, columnar, token, progress=progress)
+    return stats
+
+
+def prepare_database(conn, token=None, progress=None, fulltext=True, store=None, columnar=False):
+    """
+    打开其他数据库文件前的准备：删除旧版本遗留的逐列索引，补齐索引计划中的索引，重建汇总表和科目层级
+    :param conn: sqlite3 连接（需可写）
+    :param token: 取消令牌（可选）
+    :param progress: 进度报告器（可选）
+    :param fulltext: 是否建立序时账全文索引
+    :param store: 列式序时账文件（ColumnarJournal，可选）
+    :param columnar: 是否启用列式引擎
+    """
+    _stage(progress, "检查索引")
+    for table_name in ["journal", "balance"]:
+        drop_unplanned_indexes(conn, table_name)
+        build_indexes(conn, table_name)
+    has_journal = table_exists(conn, "journal")
+    if fulltext and has_journal and not fts_ready(conn):
+        _stage(progress, "建立全文索引")
+        build_fts(conn)
+    if has_journal:
+        _stage(progress, "汇总科目 × 月份发生额")
+        build_period_summary(conn)  # 科目 × 月份汇总
+    _stage(progress, "建立科目层级")
+    build_account_tree(conn)  # 科目层级及各级科目的发生额汇总
+    sync_columnar(conn, store, columnar and has_journal, token, progress=progress)
+
+
+def sync_columnar(conn, store, enabled, token=None, after_rowid=None, progress=None):
+    """
+    数据库中的序时账变化后更新列式序时账文件
+    :param conn: sqlite3 连接
+    :param store: 列式序时账文件（ColumnarJournal）；为 None 时不处理
+    :param enabled: 是否启用列式引擎；未启用时删除已过期的文件
+    :param token: 取消令牌（可选）
+    :param after_rowid: 追加前序时账的最大 rowid；提供时只从数据库读取新增的行
+    :param progress: 进度报告器（可选）
+    """
+    if store is None:
+        return
+    if not enabled:
+        store.remove()
+        return
+    _stage(progress, "更新列式序时账", total_rows=conn.execute("SELECT COUNT(*) FROM journal").fetchone()[0])
+    if after_rowid is not None:
+        store.append(conn, after_rowid, token, progress)
+    else:
+        store.export(conn, token, progress)
+
+
+def validate(conn):
+    """
+    核对科目余额表与序时账，差异写入 validation_result 表
+    :param conn: sqlite3 连接（需可写）
+    :return: 差异明细（DataFrame）；数据库中缺少序时账或科目余额表时返回 None
+    """
+    return reconcile(conn)
+
+
+def account_lines(conn, subject_code):
+    """
+    明细账：指定科目及其全部下级科目的序时账分录（科目编码索引上的范围扫描）
+    :param conn: sqlite3 连接
+    :param subject_code: 科目编码
+    :return: DataFrame
+    """
+    rows = fetch_all(conn, ACCOUNT_LINES_SQL, prefix_range(subject_code))
+    with phase("frame"):
+        return pd.DataFrame(rows, columns=JOURNAL_COLUMNS)
+
+
+def find_voucher(conn, key):
+    """
+    读取并组装凭证（凭证字号、日期组合索引），同时查询相邻凭证
+    :param conn: sqlite3 连接
+    :param key: (凭证字号, 日期)
+    :return: Voucher，未找到时为 None
+    """
+    lines = fetch_all(conn, VOUCHER_LINES_SQL, key)
+    set_rows(len(lines))
+    if not lines:
+        return None
+    prev_key = next(iter(fetch_all(conn, PREV_VOUCHER_SQL, key)), None)
+    next_key = next(iter(fetch_all(conn, NEXT_VOUCHER_SQL, key)), None)
+    with phase("frame"):
+        return make_voucher(key, lines, prev_key, next_key)
+
+
+def make_voucher(key, lines, prev_key, next_key):
+    """
+    由凭证分录和相邻凭证组装 Voucher
+    :param key: (凭证字号, 日期)
+    :param lines: 凭证分录（元组列表，按序时账列顺序）
+    :param prev_key: 上一张凭证的 (凭证字号, 日期)，没有时为 None
+    :param next_key: 下一张凭证的 (凭证字号, 日期)，没有时为 None
+    :return: Voucher
+    """
+    voucher_df, total_debit, total_credit = assemble_voucher(lines)
+    return Voucher(
+        key, voucher_df, total_debit, total_credit,
+        tuple(prev_key) if prev_key else None, tuple(next_key) if next_key else None,
+    )
+
+
+def filter_rows(conn, table_name, col, filter_text):
+    """
+    筛选包含指定文本的行（序时账的文本列优先使用全文索引，否则使用 LIKE 进行模糊匹配）
+    :param conn: sqlite3 连接
+    :param table_name: 数据库表名
+    :param col: 列名
+    :param filter_text: 筛选条件
+    :return: DataFrame
+    """
+    columns = table_columns(table_name)
+    if col not in columns:
+        raise ValueError(f"列名 '{col}' 不存在！")
+    query, params = contains_query(conn, table_name, col, filter_text)
+    rows = fetch_all(conn, query, params)
+    with phase("frame"):
+        return pd.DataFrame(rows, columns=columns)
+
+
+def compound_filter(conn, table_name, criteria, first_rows=None, on_first=None):
+    """
+    组合筛选：各列的条件编译为一条 SQL，只读取同时满足全部条件的行（写法见 conditions.py）
+    :param conn: sqlite3 连接
+    :param table_name: 数据库表名
+    :param criteria: {列名: 筛选框中的文本}，空文本忽略
+    :param first_rows: 提供 on_first 时先读取的行数
+    :param on_first: 读取前 first_rows 行后立即调用 on_first(DataFrame)，再继续读取其余的行（即时筛选先显示部分结果）
+    :return: DataFrame
+    """
+    columns = table_columns(table_name)
+    query, params = compound_query(conn, table_name, criteria)
+    on_head = None if on_first is None else (lambda head: on_first(pd.DataFrame(head, columns=columns)))
+    rows = fetch_all(conn, query, params, first_rows, on_head)
+    with phase("frame"):
+        return pd.DataFrame(rows, columns=columns)
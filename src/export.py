@@ -0,0 +1,168 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Audit-Inspector-Toolkit
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+流式导出：按批从数据库游标读取并写入 Parquet / CSV / Excel 文件，内存占用只与批大小有关。
+Parquet 每批写入一个行组；Excel 以 openpyxl 只写模式写入，超过单个工作表的行数上限时续写到新的工作表
+"""
+
+import csv
+import os
+import time
+from dataclasses import dataclass
+
+from progress import report
+from schema import table_columns
+from tracing import record_statement
+
+# 每批从数据库读取的行数（Parquet 每个行组的行数）
+EXPORT_BATCH_ROWS = 100_000
+# Excel 单个工作表的行数上限（含标题行）
+EXCEL_MAX_ROWS = 1_048_576
+
+
+@dataclass
+class ExportStats:
+    """
+    导出统计信息
+    """
+    table_name: str
+    total_rows: int = 0  # 表中的总行数
+    rows: int = 0  # 已写入的行数
+    seconds: float = 0.0
+    sheets: int = 0  # Excel 工作表数
+
+    @property
+    def rows_per_sec(self):
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+
+def iter_batches(conn, table_name, token=None, batch_rows=EXPORT_BATCH_ROWS):
+    """
+    按 rowid 顺序分批读取数据表
+    :param conn: sqlite3 连接
+    :param table_name: 数据库表名
+    :param token: 取消令牌（可选），每批之间检查
+    :param batch_rows: 每批行数
+    :return: 生成器，每次产出一批行（元组列表）
+    """
+    columns = ", ".join(table_columns(table_name))
+    sql = f"SELECT {columns} FROM {table_name} ORDER BY rowid"
+    start_time = time.perf_counter()
+    cursor = conn.execute(sql)
+    while True:
+        if token is not None:
+            token.raise_if_cancelled()
+        batch = cursor.fetchmany(batch_rows)
+        record_statement(sql, (), time.perf_counter() - start_time)  # 写文件的时间不计入
+        if not batch:
+            return
+        yield batch
+        start_time = time.perf_counter()
+
+
+def _write_parquet(path, table_name, batches, on_batch):
+    import pyarrow.parquet as pq
+
+    from columnar import arrow_schema, rows_to_batch
+
+    schema = arrow_schema(table_name)
+    with pq.ParquetWriter(path, schema) as writer:
+        for batch in batches:
+            writer.write_batch(rows_to_batch(batch, schema))
+            on_batch(len(batch))
+
+
+def _write_csv(path, table_name, batches, on_batch):
+    # utf-8-sig 便于 Excel 直接打开
+    with open(path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.writer(f)
+        writer.writerow(table_columns(table_name))
+        for batch in batches:
+            writer.writerows(batch)
+            on_batch(len(batch))
+
+
+def _write_xlsx(path, table_name, batches, on_batch, sheet_name, max_rows):
+    from openpyxl import Workbook
+
+    columns = table_columns(table_name)
+    # 只写模式下各工作表的行随写随存入临时文件，不在内存中保留单元格对象
+    workbook = Workbook(write_only=True)
+    sheets = 0
+    sheet = None
+    sheet_rows = max_rows
+    for batch in batches:
+        for row in batch:
+            if sheet_rows >= max_rows:
+                sheets += 1
+                sheet = workbook.create_sheet(sheet_name if sheets == 1 else f"{sheet_name}_{sheets}")
+                sheet.append(columns)
+                sheet_rows = 1
+            sheet.append(row)
+            sheet_rows += 1
+        on_batch(len(batch))
+    if sheet is None:
+        sheets = 1
+        workbook.create_sheet(sheet_name).append(columns)
+    workbook.save(path)
+    return sheets
+
+
+def export_table(conn, table_name, file_path, token=None, progress=None,
+                 batch_rows=EXPORT_BATCH_ROWS, sheet_name=None, max_rows=EXCEL_MAX_ROWS):
+    """
+    将数据表流式导出为文件（按扩展名选择格式），先写临时文件，完成后替换目标文件
+    :param conn: sqlite3 连接
+    :param table_name: 数据库表名
+    :param file_path: 目标文件路径（.parquet、.csv 或 .xlsx）
+    :param token: 取消令牌（可选），每批之间检查
+    :param progress: 进度报告器（ProgressReporter，可选），报告已写入行数和总行数
+    :param batch_rows: 每批行数
+    :param sheet_name: Excel 工作表名称（默认为表名），续写的工作表依次命名为 名称_2、名称_3……
+    :param max_rows: Excel 单个工作表的行数上限（含标题行）
+    :return: ExportStats
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension not in (".parquet", ".csv", ".xlsx"):
+        raise ValueError(f"不支持的文件格式：{extension}")
+
+    stats = ExportStats(table_name)
+    stats.total_rows = conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+    start_time = time.perf_counter()
+
+    def on_batch(rows):
+        stats.rows += rows
+        stats.seconds = time.perf_counter() - start_time
+        report(progress, rows=stats.rows, total_rows=stats.total_rows)
+
+    batches = iter_batches(conn, table_name, token, batch_rows)
+    # 临时文件保留原扩展名，写入失败或取消时不会破坏已有的目标文件
+    temp_path = f"{file_path}.tmp{extension}"
+    try:
+        if extension == ".parquet":
+            _write_parquet(temp_path, table_name, batches, on_batch)
+        elif extension == ".csv":
+            _write_csv(temp_path, table_name, batches, on_batch)
+        else:
+            stats.sheets = _write_xlsx(temp_path, table_name, batches, on_batch, sheet_name or table_name, max_rows)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    os.replace(temp_path, file_path)
+    stats.seconds = time.perf_counter() - start_time
+    return stats
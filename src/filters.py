@@ -0,0 +1,210 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Audit-Inspector-Toolkit
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+筛选状态：第一次筛选的结果作为基础数据只保存一份，之后每次筛选只保存命中行在基础数据中的行号（int32），
+筛选历史每步每行只占 4 字节，恢复上一次筛选只需弹出栈顶。
+基础数据中重复值较多的文本列（如科目编码、科目名称、辅助核算）按字典编码（pandas category）保存，
+“包含”筛选只对每个不同的值匹配一次，再通过编码映射到各行
+"""
+
+import numpy as np
+import pandas as pd
+
+# 行号数组的类型（单次筛选结果不超过约 21 亿行）
+POSITION_DTYPE = np.int32
+# 不同值的数量不超过行数的该比例时，文本列按字典编码保存
+CATEGORY_MAX_RATIO = 0.5
+
+
+def encode_categories(df, max_ratio=CATEGORY_MAX_RATIO):
+    """
+    将重复值较多的文本列转换为字典编码（category）列
+    :param df: Pandas DataFrame（不修改）
+    :param max_ratio: 不同值数量与行数之比的上限
+    :return: 转换后的 DataFrame
+    """
+    columns = {}
+    for col in df.columns:
+        dtype = df[col].dtype
+        if not (pd.api.types.is_object_dtype(dtype) or pd.api.types.is_string_dtype(dtype)):
+            continue
+        encoded = df[col].astype("category")
+        if len(encoded.cat.categories) <= max_ratio * len(df):
+            columns[col] = encoded
+    return df.assign(**columns) if columns else df
+
+
+def contains_mask(values, text):
+    """
+    计算“包含”筛选的命中掩码（按字面匹配，不区分大小写，缺失值不命中；与数据库中的 LIKE 筛选一致）
+    :param values: 要筛选的列（Pandas Series）
+    :param text: 筛选条件
+    :return: 布尔数组
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        # 每个不同的值只匹配一次；缺失值的编码为 -1，对应查找表末尾的 False
+        matched = values.cat.categories.astype(str).str.contains(text, case=False, regex=False, na=False)
+        lookup = np.append(np.asarray(matched, dtype=bool), False)
+        return lookup[values.cat.codes.to_numpy()]
+    matched = values.astype("string").str.contains(text, case=False, regex=False, na=False)
+    return matched.to_numpy(dtype=bool)
+
+
+class RowSelectionSource:
+    """
+    按行号显示基础数据中部分行的数据源（供 VirtualGrid 使用），不复制基础数据
+    """
+
+    def __init__(self, df, positions):
+        """
+        :param df: 基础数据（Pandas DataFrame）
+        :param positions: 要显示的行在基础数据中的行号
+        """
+        self.df = df
+        self.positions = positions
+
+    def __len__(self):
+        return len(self.positions)
+
+    def rows(self, start, stop):
+        """
+        获取 [start, stop) 范围内的行
+        :return: 元组列表
+        """
+        return list(self.df.iloc[self.positions[start:stop]].itertuples(index=False, name=None))
+
+    def append_rows(self, rows):
+        """
+        在末尾追加行（用于粘贴；只影响当前显示，不修改筛选状态中的基础数据）
+        :param rows: 值列表的列表
+        """
+        width = len(self.df.columns)
+        rows = [tuple(row[:width]) + ("",) * (width - len(row[:width])) for row in rows]
+        start = len(self.df)
+        self.df = pd.concat([self.df, pd.DataFrame(rows, columns=self.df.columns)], ignore_index=True)
+        self.positions = np.concatenate(
+            [self.positions, np.arange(start, len(self.df), dtype=POSITION_DTYPE)]
+        )
+
+
+class FilterState:
+    """
+    单个表格的筛选状态：基础数据 + 行号栈
+    """
+
+    def __init__(self):
+        self.base = None  # 第一次筛选的结果（DataFrame），或列式引擎中的整个序时账（ColumnarFrame）
+        self.first = None  # 第一次筛选的结果在基础数据中的行号（为 None 时即基础数据的全部行）
+        self.stack = []  # 之后每次筛选的结果在基础数据中的行号（升序的 int32 数组）
+
+    @property
+    def depth(self):
+        """
+        已执行的筛选次数（0 表示未筛选）
+        """
+        return 0 if self.base is None else len(self.stack) + 1
+
+    def positions(self):
+        """
+        当前筛选结果在基础数据中的行号
+        """
+        if self.stack:
+            return self.stack[-1]
+        if self.first is not None:
+            return self.first
+        return np.arange(len(self.base), dtype=POSITION_DTYPE)
+
+    def __len__(self):
+        if self.base is None:
+            return 0
+        if self.stack:
+            return len(self.stack[-1])
+        return len(self.base) if self.first is None else len(self.first)
+
+    def is_empty(self):
+        """
+        当前没有筛选结果或筛选结果为空
+        """
+        return len(self) == 0
+
+    def reset(self, base, first=None):
+        """
+        以第一次筛选的结果重新开始
+        :param base: 第一次筛选的结果（DataFrame，重复值较多的文本列应已由 encode_categories 编码），
+                     或列式引擎中的整个序时账（ColumnarFrame）
+        :param first: 第一次筛选命中行在 base 中的行号（仅列式引擎使用）
+        """
+        self.base = base.reset_index(drop=True) if isinstance(base, pd.DataFrame) else base
+        self.first = None if first is None else np.asarray(first, dtype=POSITION_DTYPE)
+        self.stack = []
+
+    def clear(self):
+        """
+        清空筛选状态，释放基础数据
+        """
+        self.base = None
+        self.first = None
+        self.stack = []
+
+    def narrow(self, col, text):
+        """
+        在当前筛选结果中按列“包含”筛选（不修改筛选状态，可在工作线程中调用）
+        :param col: 列名
+        :param text: 筛选条件（不区分大小写）
+        :return: 命中行在基础数据中的行号
+        """
+        if not isinstance(self.base, pd.DataFrame):
+            return self.base.contains_positions(col, text, self.positions())
+        positions = self.positions()
+        values = self.base[col]
+        if self.stack:
+            values = values.iloc[positions]
+        return positions[contains_mask(values, text)]
+
+    def push(self, positions):
+        """
+        记录一次筛选结果
+        :param positions: 命中行在基础数据中的行号
+        """
+        self.stack.append(np.asarray(positions, dtype=POSITION_DTYPE))
+
+    def pop(self):
+        """
+        恢复到上一次筛选结果
+        :return: 是否成功（只有第一次筛选的结果时无法再恢复）
+        """
+        if not self.stack:
+            return False
+        self.stack.pop()
+        return True
+
+    def source(self):
+        """
+        当前筛选结果的表格数据源（不复制基础数据）
+        """
+        if not isinstance(self.base, pd.DataFrame):
+            return self.base.source(self.positions())
+        return RowSelectionSource(self.base, self.positions())
+
+    def to_dataframe(self):
+        """
+        将当前筛选结果转换为 DataFrame
+        """
+        if not isinstance(self.base, pd.DataFrame):
+            return self.base.to_dataframe(self.positions())
+        if not self.stack:
+            return self.base
+        return self.base.iloc[self.stack[-1]].reset_index(drop=True)
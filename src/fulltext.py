@@ -0,0 +1,153 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Audit-Inspector-Toolkit
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+序时账文本列的 FTS5 三元组（trigram）全文索引，用于加速筛选框的“包含”查询
+"""
+
+import sqlite3
+
+from schema import JOURNAL_SELECT, TABLE_SCHEMAS, table_columns
+
+FTS_TABLE = "journal_fts"
+# 建立全文索引的文本列
+FTS_COLUMNS = [col for col, col_type in TABLE_SCHEMAS["journal"] if col_type == "TEXT"]
+# trigram 分词器至少需要 3 个字符才能使用索引
+MIN_PATTERN_CHARS = 3
+# LIKE 中的通配符及转义字符：筛选文本按字面匹配，其中的 % 和 _ 需要转义
+LIKE_WILDCARDS = "%_"
+LIKE_ESCAPE = "\\"
+
+
+def fts_supported(conn):
+    """
+    检查当前 SQLite 是否支持 FTS5 trigram 分词器（需要 SQLite 3.34 及以上版本）
+    :param conn: sqlite3 连接
+    :return: bool
+    """
+    try:
+        conn.execute("CREATE VIRTUAL TABLE temp.fts_probe USING fts5(x, tokenize='trigram')")
+        conn.execute("DROP TABLE temp.fts_probe")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+def fts_ready(conn):
+    """
+    检查全文索引是否已建立
+    :param conn: sqlite3 连接
+    :return: bool
+    """
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name = ?", (FTS_TABLE,)
+    ).fetchone()
+    return row is not None
+
+
+def drop_fts(conn):
+    """
+    删除全文索引（序时账被替换时，旧索引的 rowid 不再对应）
+    :param conn: sqlite3 连接
+    """
+    conn.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    conn.commit()
+
+
+def build_fts(conn):
+    """
+    为序时账的文本列建立全文索引（外部内容表，不重复保存原文）
+    :param conn: sqlite3 连接
+    :return: 是否建立成功
+    """
+    if not fts_supported(conn):
+        return False
+
+    drop_fts(conn)
+    conn.execute(
+        f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5({', '.join(FTS_COLUMNS)}, "
+        f"content='journal', content_rowid='rowid', tokenize='trigram')"
+    )
+    conn.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES('rebuild')")
+    conn.commit()
+    return True
+
+
+def update_fts(conn, after_rowid):
+    """
+    追加序时账后，将新增的行加入全文索引（由调用方提交）
+    :param conn: sqlite3 连接
+    :param after_rowid: 追加前序时账的最大 rowid
+    :return: 是否已更新（全文索引不存在时返回 False）
+    """
+    if not fts_ready(conn):
+        return False
+    columns = ", ".join(FTS_COLUMNS)
+    conn.execute(
+        f"INSERT INTO {FTS_TABLE}(rowid, {columns}) SELECT rowid, {columns} FROM journal WHERE rowid > ?",
+        (after_rowid,),
+    )
+    return True
+
+
+def like_contains(col, filter_text):
+    """
+    生成“包含”条件的 LIKE 表达式：筛选文本按字面匹配（% 和 _ 不是通配符），不区分英文字母大小写，
+    与 pandas 和列式引擎中的“包含”筛选结果一致
+    :param col: 列名
+    :param filter_text: 筛选条件
+    :return: (表达式, 参数)
+    """
+    if not any(ch in filter_text for ch in LIKE_WILDCARDS):
+        return f"{col} LIKE ?", f"%{filter_text}%"
+    escaped = "".join(LIKE_ESCAPE + ch if ch in LIKE_WILDCARDS + LIKE_ESCAPE else ch for ch in filter_text)
+    return f"{col} LIKE ? ESCAPE '{LIKE_ESCAPE}'", f"%{escaped}%"
+
+
+def fts_searchable(table_name, col, filter_text):
+    """
+    “包含”条件能否使用全文索引：序时账的文本列，筛选文本不少于 3 个字符且不含需要转义的 % 和 _
+    （带 ESCAPE 的 LIKE 无法使用 trigram 索引）
+    :param table_name: 数据库表名
+    :param col: 列名
+    :param filter_text: 筛选条件
+    :return: bool
+    """
+    return (
+        table_name == "journal"
+        and col in FTS_COLUMNS
+        and len(filter_text) >= MIN_PATTERN_CHARS
+        and not any(ch in filter_text for ch in LIKE_WILDCARDS)
+    )
+
+
+def contains_query(conn, table_name, col, filter_text):
+    """
+    生成“包含”筛选的查询语句；能走全文索引时通过索引定位 rowid，否则退回 LIKE 全表扫描。
+    两种方式都使用同一个 LIKE 模式，结果与原来的筛选完全一致。
+    :param conn: sqlite3 连接
+    :param table_name: 数据库表名
+    :param col: 列名
+    :param filter_text: 筛选条件
+    :return: (查询语句, 参数)
+    """
+    expression, pattern = like_contains(col, filter_text)
+    if fts_searchable(table_name, col, filter_text) and fts_ready(conn):
+        query = (
+            f"SELECT {JOURNAL_SELECT} FROM journal WHERE rowid IN "
+            f"(SELECT rowid FROM {FTS_TABLE} WHERE {expression}) ORDER BY rowid"
+        )
+        return query, (pattern,)
+    return f"SELECT {', '.join(table_columns(table_name))} FROM {table_name} WHERE {expression}", (pattern,)
@@ -0,0 +1,172 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Audit-Inspector-Toolkit
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+索引计划：只为实际查询路径建立索引，并在批量写入完成后统一建立
+"""
+
+from schema import JOURNAL_SELECT, ROW_HASH_COLUMN, table_columns
+
+# 凭证明细（show_voucher_details）
+VOUCHER_LINES_SQL = f"SELECT {JOURNAL_SELECT} FROM journal WHERE 凭证字号 = ? AND 日期 = ?"
+# 上一张、下一张凭证（凭证分录在序时账中连续存放，按 rowid 定位相邻凭证）
+PREV_VOUCHER_SQL = (
+    "SELECT 凭证字号, 日期 FROM journal "
+    "WHERE rowid < (SELECT MIN(rowid) FROM journal WHERE 凭证字号 = ? AND 日期 = ?) "
+    "ORDER BY rowid DESC LIMIT 1"
+)
+NEXT_VOUCHER_SQL = (
+    "SELECT 凭证字号, 日期 FROM journal "
+    "WHERE rowid > (SELECT MAX(rowid) FROM journal WHERE 凭证字号 = ? AND 日期 = ?) "
+    "ORDER BY rowid LIMIT 1"
+)
+# 科目明细账（show_detail_journal）：科目及其全部下级科目，参数为 accounts.prefix_range 计算的编码范围
+ACCOUNT_LINES_SQL = f"SELECT {JOURNAL_SELECT} FROM journal WHERE 科目编码 >= ? AND 科目编码 < ?"
+# 日期范围筛选
+DATE_RANGE_SQL = f"SELECT {JOURNAL_SELECT} FROM journal WHERE 日期 >= ? AND 日期 <= ?"
+# 追加导入时按行哈希跳过已导入的行
+ROW_HASH_SQL = f"SELECT 1 FROM journal WHERE {ROW_HASH_COLUMN} = ?"
+# 数据校验（按科目汇总）
+JOURNAL_SUMMARY_SQL = "SELECT 科目编码, SUM(借方), SUM(贷方) FROM journal GROUP BY 科目编码"
+
+# 各查询路径及示例参数，用于输出查询计划
+QUERY_PATHS = {
+    "凭证明细": (VOUCHER_LINES_SQL, ("", "")),
+    "上一张凭证": (PREV_VOUCHER_SQL, ("", "")),
+    "下一张凭证": (NEXT_VOUCHER_SQL, ("", "")),
+    "科目明细账": (ACCOUNT_LINES_SQL, ("1122", "1123")),
+    "日期范围筛选": (DATE_RANGE_SQL, ("", "")),
+    "追加去重": (ROW_HASH_SQL, (0,)),
+    "数据校验汇总": (JOURNAL_SUMMARY_SQL, ()),
+}
+
+# 索引计划：表名 -> [(索引名, [列名, ...]), ...]
+# 金额列和只用 LIKE '%x%' 查询的摘要列无法从 B 树索引中受益，不建立索引
+INDEX_PLAN = {
+    "journal": [
+        ("idx_journal_凭证字号_日期", ["凭证字号", "日期"]),
+        ("idx_journal_科目编码", ["科目编码"]),
+        ("idx_journal_日期", ["日期"]),
+        (f"idx_journal_{ROW_HASH_COLUMN}", [ROW_HASH_COLUMN]),
+    ],
+    "balance": [
+        ("idx_balance_科目编码", ["科目编码"]),
+    ],
+}
+
+
+def table_exists(conn, table_name):
+    """
+    检查数据表是否存在
+    :param conn: sqlite3 连接
+    :param table_name: 数据库表名
+    :return: bool
+    """
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name = ?", (table_name,)
+    ).fetchone()
+    return row is not None
+
+
+def column_names(conn, table_name):
+    """
+    获取数据表中实际存在的列
+    :param conn: sqlite3 连接
+    :param table_name: 数据库表名
+    :return: 列名集合
+    """
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table_name})")}
+
+
+def drop_unplanned_indexes(conn, table_name):
+    """
+    删除旧版本“每列一个索引”遗留下来的、不在索引计划中的索引
+    :param conn: sqlite3 连接
+    :param table_name: 数据库表名
+    :return: 被删除的索引名列表
+    """
+    planned = {name for name, _ in INDEX_PLAN.get(table_name, [])}
+    legacy = {f"idx_{table_name}_{col}" for col in table_columns(table_name)}
+    rows = conn.execute(
+        "SELECT name FROM sqlite_master WHERE type='index' AND tbl_name = ?", (table_name,)
+    ).fetchall()
+    dropped = []
+    for (index_name,) in rows:
+        if index_name in legacy and index_name not in planned:
+            conn.execute(f"DROP INDEX IF EXISTS {index_name}")
+            dropped.append(index_name)
+    conn.commit()
+    return dropped
+
+
+def build_indexes(conn, table_name):
+    """
+    按索引计划建立索引，应在批量写入完成后调用
+    :param conn: sqlite3 连接
+    :param table_name: 数据库表名
+    :return: 计划中的索引名列表
+    """
+    if not table_exists(conn, table_name):
+        return []
+
+    created = []
+    existing = column_names(conn, table_name)
+    for index_name, columns in INDEX_PLAN.get(table_name, []):
+        if not set(columns) <= existing:
+            continue  # 旧版本数据库中没有行哈希列，追加导入时补齐后再建立
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table_name} ({', '.join(columns)})")
+        created.append(index_name)
+    # 更新统计信息，便于查询优化器选择索引
+    conn.execute("PRAGMA optimize")
+    conn.commit()
+    return created
+
+
+def explain(conn, sql, params=()):
+    """
+    获取查询计划
+    :param conn: sqlite3 连接
+    :param sql: 查询语句
+    :param params: 查询参数
+    :return: 查询计划文本（每步一行）
+    """
+    rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+    return "\n".join(row[-1] for row in rows)
+
+
+def index_plan_report(conn):
+    """
+    输出索引计划及各查询路径的查询计划，用于确认查询是否使用了索引
+    :param conn: sqlite3 连接
+    :return: 报告文本
+    """
+    existing = {
+        row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='index'").fetchall()
+    }
+
+    lines = ["索引计划："]
+    for table_name, indexes in INDEX_PLAN.items():
+        for index_name, columns in indexes:
+            state = "已建立" if index_name in existing else "未建立"
+            lines.append(f"  {table_name}({', '.join(columns)})  {index_name}  [{state}]")
+
+    if table_exists(conn, "journal"):
+        lines.append("")
+        lines.append("查询计划：")
+        for path_name, (sql, params) in QUERY_PATHS.items():
+            lines.append(f"  {path_name}：")
+            for step in explain(conn, sql, params).splitlines():
+                lines.append(f"    {step}")
+    return "\n".join(lines)
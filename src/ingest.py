@@ -0,0 +1,541 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Audit-Inspector-Toolkit
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+流式导入：按块读取 CSV / Parquet / Excel 文件，并分批写入 SQLite；
+Excel 文件优先使用 python-calamine（Rust 实现）逐行读取，未安装时使用 openpyxl 只读模式，不加载整个工作簿；
+多个文件时在子进程中并行解析，由单个写连接在一个事务中依次写入
+"""
+
+import datetime
+import os
+import pickle
+import re
+import shutil
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from dataclasses import dataclass
+from xml.etree import ElementTree
+
+import pandas as pd
+
+from indexes import ROW_HASH_SQL
+from progress import report
+from rowhash import RowHasher, has_row_hash
+from schema import DATE_COLUMNS, create_table_sql, numeric_columns, stored_columns, table_columns
+from tracing import phase, record_statement, timed_iter
+
+# 每次从文件读取的行数
+DEFAULT_CHUNKSIZE = 100_000
+# 每个事务写入的行数（大事务可显著减少 fsync 次数）
+DEFAULT_COMMIT_ROWS = 500_000
+# 已是标准格式的日期文本（年-月-日，或 年-月-日 时:分:秒）
+ISO_DATE_PATTERN = r"^\d{4}-\d{2}-\d{2}(?: \d{2}:\d{2}:\d{2})?$"
+# 其他写法的日期文本：2023/3/5、2023.3.5、2023年3月5日、20230305，可带 时:分[:秒]
+DATE_TEXT_PATTERNS = [
+    re.compile(r"^(\d{4})[-/.年](\d{1,2})[-/.月](\d{1,2})日?(?:[ T](\d{1,2}):(\d{1,2})(?::(\d{1,2}))?)?$"),
+    re.compile(r"^(\d{4})(\d{2})(\d{2})$"),
+]
+# 编码检测使用的样本大小
+ENCODING_SAMPLE_BYTES = 1 << 20
+# 读取 Excel 文件中的全部工作表（ERP 导出超过 1048576 行时会拆分为多个工作表）
+ALL_SHEETS = "*"
+
+
+def sniff_encoding(file_path, sample_size=ENCODING_SAMPLE_BYTES):
+    """
+    根据文件开头的样本检测文本编码，避免对整个文件运行 chardet
+    :param file_path: 文件路径
+    :param sample_size: 样本字节数
+    :return: 编码名称
+    """
+    with open(file_path, "rb") as f:
+        sample = f.read(sample_size)
+
+    if sample.startswith(b"\xef\xbb\xbf"):
+        return "utf-8-sig"
+
+    # 样本可能在多字节字符中间截断，去掉末尾最多 3 个字节后再尝试 utf-8
+    for cut in range(4):
+        try:
+            sample[:len(sample) - cut].decode("utf-8")
+            return "utf-8"
+        except UnicodeDecodeError:
+            continue
+
+    import chardet  # 只有样本不是 utf-8 时才需要，按需导入以加快启动
+
+    encoding = chardet.detect(sample)["encoding"] or "utf-8"
+    # GB2312 / GBK 均为 GB18030 的子集，统一使用 GB18030 以免生僻字解码失败
+    if encoding.lower() in ("gb2312", "gbk"):
+        encoding = "gb18030"
+    return encoding
+
+
+def is_excel(file_path):
+    """
+    是否为 Excel 文件
+    """
+    return file_path.lower().endswith((".xlsx", ".xlsm", ".xls"))
+
+
+def _open_calamine(file_path):
+    """
+    使用 python-calamine 打开工作簿
+    :return: CalamineWorkbook，未安装 python-calamine 时为 None
+    """
+    try:
+        from python_calamine import CalamineWorkbook
+    except ImportError:
+        return None
+    return CalamineWorkbook.from_path(file_path)
+
+
+def excel_sheet_names(file_path):
+    """
+    读取 Excel 文件中的工作表名称（不读取单元格）
+    :param file_path: 文件路径
+    :return: 工作表名称列表
+    """
+    workbook = _open_calamine(file_path)
+    if workbook is not None:
+        return list(workbook.sheet_names)
+    if file_path.lower().endswith(".xls"):
+        return list(pd.ExcelFile(file_path).sheet_names)
+
+    # xlsx 为 zip 包，工作表名称记录在 xl/workbook.xml 中，无需加载共享字符串
+    with zipfile.ZipFile(file_path) as archive:
+        root = ElementTree.fromstring(archive.read("xl/workbook.xml"))
+    return [sheet.get("name") for sheet in root.iter() if sheet.tag.endswith("}sheet")]
+
+
+def convert_calamine_cell(value):
+    """
+    与 pandas 读取 calamine 单元格的转换一致：整数值的浮点数转换为 int，日期转换为 datetime，空单元格转换为 None，
+    使科目编码、凭证字号、日期等列写入数据库的文本（及行哈希）与 openpyxl 读取时相同
+    """
+    if value == "":
+        return None
+    if isinstance(value, float):
+        whole = int(value) if value.is_integer() else None
+        return value if whole is None else whole
+    if isinstance(value, datetime.date) and not isinstance(value, datetime.datetime):
+        return datetime.datetime(value.year, value.month, value.day)
+    return value
+
+
+def _calamine_rows(sheet):
+    """
+    按行读取 calamine 工作表，并转换单元格
+    """
+    for row in sheet.iter_rows():
+        yield tuple(convert_calamine_cell(value) for value in row)
+
+
+class ChunkReader:
+    """
+    按块读取数据文件，每次产出一个 DataFrame，并记录读取进度
+    """
+
+    def __init__(self, file_path, chunksize=DEFAULT_CHUNKSIZE, sheets=None):
+        """
+        :param file_path: 文件路径（csv、parquet、xlsx、xls）
+        :param chunksize: 每块的行数
+        :param sheets: 要读取的 Excel 工作表：None 为第一个工作表，ALL_SHEETS 为全部工作表，
+                       或工作表名称列表；多个工作表按顺序合并，各工作表都须有相同的标题行
+        """
+        self.file_path = file_path
+        self.chunksize = chunksize
+        self.sheets = sheets
+        self.total_bytes = os.path.getsize(file_path)
+        self.bytes_read = 0
+        self.total_rows = None  # 未知时为 None
+        self._handle = None
+
+    def __iter__(self):
+        lower_path = self.file_path.lower()
+        if lower_path.endswith(".csv"):
+            return self._iter_csv()
+        if lower_path.endswith(".parquet"):
+            return self._iter_parquet()
+        return self._iter_excel()
+
+    def _iter_csv(self):
+        encoding = sniff_encoding(self.file_path)
+        # 以二进制句柄交给 pandas，便于通过 tell() 获取已读取的字节数
+        with open(self.file_path, "rb") as handle:
+            reader = pd.read_csv(handle, encoding=encoding, chunksize=self.chunksize, dtype=str)
+            for chunk in reader:
+                self.bytes_read = handle.tell()
+                yield chunk
+        self.bytes_read = self.total_bytes
+
+    def _iter_parquet(self):
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(self.file_path)
+        self.total_rows = parquet_file.metadata.num_rows
+        rows_read = 0
+        # iter_batches 按行组顺序读取，每次最多 chunksize 行
+        for batch in parquet_file.iter_batches(batch_size=self.chunksize):
+            rows_read += batch.num_rows
+            if self.total_rows:
+                self.bytes_read = int(self.total_bytes * rows_read / self.total_rows)
+            yield batch.to_pandas()
+        self.bytes_read = self.total_bytes
+
+    def _sheet_names(self, available):
+        """
+        按 sheets 参数确定要读取的工作表
+        """
+        if self.sheets is None:
+            return available[:1]
+        if self.sheets == ALL_SHEETS:
+            return available
+        missing = [name for name in self.sheets if name not in available]
+        if missing:
+            raise ValueError(f"文件中没有工作表：{', '.join(missing)}")
+        return list(self.sheets)
+
+    def _iter_excel(self):
+        workbook = _open_calamine(self.file_path)
+        if workbook is not None:
+            sheets = [workbook.get_sheet_by_name(name) for name in self._sheet_names(list(workbook.sheet_names))]
+            self.total_rows = sum(sheet.total_height for sheet in sheets)
+            yield from self._iter_sheet_rows(_calamine_rows(sheet) for sheet in sheets)
+        elif self.file_path.lower().endswith(".xls"):
+            # 旧版 xls 格式 openpyxl 无法读取，未安装 python-calamine 时由 pandas（xlrd）整表读取
+            yield from self._iter_xls()
+        else:
+            from openpyxl import load_workbook
+
+            # 只读模式按行解析 XML，不建立工作簿对象模型；data_only 读取公式的计算结果
+            workbook = load_workbook(self.file_path, read_only=True, data_only=True)
+            try:
+                sheets = [workbook[name] for name in self._sheet_names(workbook.sheetnames)]
+                self.total_rows = sum(sheet.max_row or 0 for sheet in sheets) or None
+                yield from self._iter_sheet_rows(sheet.iter_rows(values_only=True) for sheet in sheets)
+            finally:
+                workbook.close()
+        self.bytes_read = self.total_bytes
+
+    def _iter_sheet_rows(self, sheets):
+        """
+        将各工作表的行迭代器按块转换为 DataFrame（每个工作表的第一行为标题行）
+        :param sheets: 各工作表的行迭代器（每行为值元组）
+        """
+        rows_read = 0
+        for rows in sheets:
+            rows = iter(rows)
+            header = next(rows, None)
+            if header is None:
+                continue
+            columns = [f"Unnamed: {i}" if name is None else str(name) for i, name in enumerate(header)]
+            rows_read += 1
+            batch = []
+            for row in rows:
+                rows_read += 1
+                if all(value is None or value == "" for value in row):
+                    continue  # 跳过空行（与 pandas.read_excel 一致）
+                batch.append(row)
+                if len(batch) >= self.chunksize:
+                    yield self._excel_chunk(batch, columns, rows_read)
+                    batch = []
+            if batch:
+                yield self._excel_chunk(batch, columns, rows_read)
+
+    def _excel_chunk(self, batch, columns, rows_read):
+        """
+        将一批行转换为 DataFrame，并按已读行数估算读取进度
+        """
+        if self.total_rows:
+            self.bytes_read = int(self.total_bytes * min(rows_read / self.total_rows, 1))
+        width = len(columns)
+        return pd.DataFrame([tuple(row[:width]) + (None,) * (width - len(row)) for row in batch], columns=columns)
+
+    def _iter_xls(self):
+        names = self._sheet_names(list(pd.ExcelFile(self.file_path).sheet_names))
+        for name in names:
+            df = pd.read_excel(self.file_path, sheet_name=name)
+            for start in range(0, len(df), self.chunksize):
+                yield df.iloc[start:start + self.chunksize]
+
+
+@dataclass
+class ImportStats:
+    """
+    导入统计信息
+    """
+    table_name: str
+    rows: int = 0  # 已写入的行数
+    seconds: float = 0.0
+    skipped: int = 0  # 追加导入时跳过的已导入行数
+
+    @property
+    def rows_per_sec(self):
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+
+def normalize_date(value):
+    """
+    将日期文本转换为 年-月-日（带时间时为 年-月-日 时:分:秒，与 Excel 日期单元格写入的格式一致）
+    :param value: 日期文本
+    :return: 转换后的文本；无法识别的原样返回
+    """
+    text = value.strip()
+    for pattern in DATE_TEXT_PATTERNS:
+        match = pattern.match(text)
+        if match is None:
+            continue
+        parts = [int(part) for part in match.groups() if part is not None]
+        try:
+            parsed = datetime.datetime(*parts)
+        except ValueError:
+            return value
+        if len(parts) > 3:
+            return parsed.strftime("%Y-%m-%d %H:%M:%S")
+        return parsed.strftime("%Y-%m-%d")
+    return value
+
+
+def coerce_chunk(chunk, table_name):
+    """
+    校验标题行，并将数据块转换为与数据表一致的类型
+    :param chunk: 数据块（DataFrame）
+    :param table_name: 数据库表名
+    :return: 按表结构顺序排列的列值列表
+    """
+    columns = table_columns(table_name)
+    if list(chunk.columns) != columns:
+        raise ValueError(f"文件标题行与数据表不一致，应为：{', '.join(columns)}")
+
+    numeric = set(numeric_columns(table_name))
+    values = []
+    for col in columns:
+        series = chunk[col]
+        if col in numeric:
+            series = pd.to_numeric(series, errors="coerce")
+        elif pd.api.types.is_datetime64_any_dtype(series):
+            # 与 to_sql 写入日期的格式保持一致
+            series = series.dt.strftime("%Y-%m-%d %H:%M:%S")
+        else:
+            series = series.where(series.isna(), series.astype(str))
+            if col in DATE_COLUMNS:
+                # 2023/3/5 等写法转换为 年-月-日，否则按年月汇总和日期筛选时会被遗漏
+                other = series.notna() & ~series.astype(object).fillna("").str.match(ISO_DATE_PATTERN)
+                if other.any():
+                    series = series.where(~other, series[other].map(normalize_date))
+        # SQLite 会将 NaN 作为 NULL 写入，这里统一转换为 None
+        values.append(series.astype(object).where(series.notna(), None).tolist())
+    return values
+
+
+def prepare_chunk(chunk, table_name, hasher=None):
+    """
+    转换数据块，并附加行哈希列（保存行哈希的表）
+    :param chunk: 数据块（DataFrame）
+    :param table_name: 数据库表名
+    :param hasher: 当前文件的 RowHasher
+    :return: 按 stored_columns 顺序排列的列值列表
+    """
+    values = coerce_chunk(chunk, table_name)
+    if hasher is not None:
+        values.append(hasher(values))
+    return values
+
+
+def bulk_load(conn, table_name, chunks, replace=True, commit_rows=DEFAULT_COMMIT_ROWS, progress=None):
+    """
+    将数据块分批写入 SQLite，内存占用只与块大小有关
+    :param conn: sqlite3 连接
+    :param table_name: 数据库表名
+    :param chunks: 可迭代的数据块（DataFrame，或已由 prepare_chunk 转换的列值列表）
+    :param replace: 是否先清空原表；为 False 时追加，保存行哈希的表跳过行哈希已存在的行（需已有行哈希索引）
+    :param commit_rows: 每个事务写入的行数；为 None 时全部数据在一个事务中写入，出错时整体回滚
+    :param progress: 进度报告器（ProgressReporter，可选），报告已读取、已写入的行数；
+                     chunks 为 ChunkReader 时同时报告已读取的字节数
+    :return: ImportStats
+    """
+    stats = ImportStats(table_name)
+    columns = stored_columns(table_name)
+    placeholders = ", ".join("?" for _ in columns)
+    hashed = has_row_hash(table_name)
+    if hashed and not replace:
+        # 追加：每行写入前在行哈希索引上检查是否已导入（同一事务中先写入的行也会被检查到）
+        insert_sql = (
+            f"INSERT INTO {table_name} ({', '.join(columns)}) SELECT {placeholders} "
+            f"WHERE NOT EXISTS ({ROW_HASH_SQL})"
+        )
+    else:
+        insert_sql = f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({placeholders})"
+    hasher = RowHasher(table_name) if hashed else None
+
+    cursor = conn.cursor()
+    if commit_rows is None and not conn.in_transaction:
+        # 显式开始事务，使清空原表也包含在同一事务中
+        cursor.execute("BEGIN")
+    if replace:
+        # 重建表会同时删除旧索引，避免写入时逐行维护索引
+        cursor.execute(f"DROP TABLE IF EXISTS {table_name}")
+    cursor.execute(create_table_sql(table_name))
+
+    start_time = time.perf_counter()
+    uncommitted = 0
+    for chunk in timed_iter(chunks, "read"):
+        with phase("frame"):
+            values = prepare_chunk(chunk, table_name, hasher) if isinstance(chunk, pd.DataFrame) else chunk
+        rows = len(values[0]) if values else 0
+        if rows == 0:
+            continue
+        before = conn.total_changes
+        # 追加时行哈希再作为 NOT EXISTS 子查询的参数
+        columns_values = (*values, values[-1]) if hashed and not replace else values
+        insert_start = time.perf_counter()
+        cursor.executemany(insert_sql, zip(*columns_values))
+        record_statement(insert_sql, next(zip(*columns_values)), time.perf_counter() - insert_start)
+        written = conn.total_changes - before
+        stats.rows += written
+        stats.skipped += rows - written
+        uncommitted += written
+        if commit_rows is not None and uncommitted >= commit_rows:
+            conn.commit()
+            uncommitted = 0
+        stats.seconds = time.perf_counter() - start_time
+        report(
+            progress, rows=stats.rows, rows_read=stats.rows + stats.skipped,
+            bytes_done=getattr(chunks, "bytes_read", None), total_rows=getattr(chunks, "total_rows", None),
+        )
+
+    conn.commit()
+    stats.seconds = time.perf_counter() - start_time
+    return stats
+
+
+def parse_file(file_path, table_name, spill_path, chunksize=DEFAULT_CHUNKSIZE, sheets=None):
+    """
+    读取并转换整个文件（在子进程中执行），转换后的数据块逐块写入临时文件，子进程只占用一个块的内存
+    :param file_path: 文件路径
+    :param table_name: 数据库表名
+    :param spill_path: 临时文件路径（各数据块的列值列表依次 pickle，由 read_spill 读取）
+    :param chunksize: 每块的行数
+    :param sheets: 要读取的 Excel 工作表（同 ChunkReader）
+    :return: 行数
+    """
+    reader = ChunkReader(file_path, chunksize, sheets=sheets)
+    hasher = RowHasher(table_name) if has_row_hash(table_name) else None
+    rows = 0
+    with open(spill_path, "wb") as spill:
+        for chunk in reader:
+            if chunk.empty:
+                continue
+            values = prepare_chunk(chunk, table_name, hasher)
+            pickle.dump(values, spill, protocol=pickle.HIGHEST_PROTOCOL)
+            rows += len(values[0])
+    return rows
+
+
+def read_spill(spill_path):
+    """
+    按写入顺序逐块读取 parse_file 的临时文件
+    :return: 各数据块的列值列表（生成器）
+    """
+    with open(spill_path, "rb") as spill:
+        while True:
+            try:
+                yield pickle.load(spill)
+            except EOFError:
+                return
+
+
+def import_files(
+    conn, table_name, file_paths, token=None, on_file=None, progress=None, max_workers=None, sheets=None,
+    replace=True,
+):
+    """
+    并行导入多个文件：各文件在子进程中解析和转换类型并逐块写入临时文件，写连接按文件顺序逐块读取写入，
+    内存占用只与块大小和子进程数有关，不随文件数量增长。
+    全部文件在一个事务中写入，任一文件出错时整体回滚。总耗时约为最大文件的解析时间加写入时间
+    :param conn: sqlite3 连接
+    :param table_name: 数据库表名
+    :param file_paths: 文件路径列表（按此顺序写入）
+    :param token: 取消令牌（可选），每个数据块之间检查
+    :param on_file: 单个文件状态回调，参数为 (文件路径, 状态, 行数)；解析完成的回调在后台线程中调用
+    :param progress: 进度报告器（ProgressReporter，可选），报告合计的行数及已写入文件的字节数
+    :param max_workers: 子进程数，默认不超过 CPU 核数
+    :param sheets: 要读取的 Excel 工作表（同 ChunkReader，对每个 Excel 文件相同）
+    :param replace: 是否先清空原表；为 False 时追加并跳过已导入的行（同 bulk_load）
+    :return: ImportStats
+    """
+    workers = max(1, min(len(file_paths), max_workers or os.cpu_count() or 1))
+    spill_dir = tempfile.mkdtemp(prefix="audit_import_")
+    spill_paths = [os.path.join(spill_dir, f"{index}.pickle") for index in range(len(file_paths))]
+    pool = ProcessPoolExecutor(max_workers=workers)
+    futures = [
+        pool.submit(parse_file, path, table_name, spill_path, sheets=sheets)
+        for path, spill_path in zip(file_paths, spill_paths)
+    ]
+
+    def parsed(path, future):
+        if on_file is not None and not future.cancelled() and future.exception() is None:
+            on_file(path, "已解析", future.result())
+
+    for path, future in zip(file_paths, futures):
+        future.add_done_callback(lambda future, path=path: parsed(path, future))
+
+    def wait(future):
+        # 等待解析结果期间也能响应取消
+        while True:
+            if token is not None:
+                token.raise_if_cancelled()
+            try:
+                return future.result(timeout=0.1)
+            except FutureTimeoutError:
+                continue
+
+    # 按已写入文件的大小报告字节进度
+    total_bytes = sum(os.path.getsize(path) for path in file_paths)
+    report(progress, bytes_done=0, total_bytes=total_bytes)
+
+    def chunks():
+        bytes_done = 0
+        for path, spill_path, future in zip(file_paths, spill_paths, futures):
+            wait(future)
+            if on_file is not None:
+                on_file(path, "写入中", 0)
+            rows = 0
+            for values in read_spill(spill_path):
+                if token is not None:
+                    token.raise_if_cancelled()
+                rows += len(values[0])
+                yield values
+            os.remove(spill_path)  # 已写入的文件的临时文件立即删除
+            if on_file is not None:
+                on_file(path, "已写入", rows)
+            bytes_done += os.path.getsize(path)
+            report(progress, bytes_done=bytes_done)
+
+    try:
+        return bulk_load(conn, table_name, chunks(), replace=replace, commit_rows=None, progress=progress)
+    except BaseException:
+        for future in futures:
+            future.cancel()
+        raise
+    finally:
+        pool.shutdown(wait=False)
+        # 取消时仍在解析的子进程可能还占用临时文件，删除失败的留给系统清理
+        shutil.rmtree(spill_dir, ignore_errors=True)
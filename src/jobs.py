@@ -0,0 +1,194 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Audit-Inspector-Toolkit
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+后台任务执行器：数据库操作在工作线程中执行，结果通过队列交回 Tk 主线程，
+主线程用 after() 轮询队列，界面始终保持响应
+"""
+
+import queue
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+# 工作线程数
+DEFAULT_WORKERS = 4
+# 主线程轮询结果队列的间隔（毫秒），约 60 帧/秒
+POLL_INTERVAL_MS = 16
+
+
+class JobCancelled(Exception):
+    """
+    任务已被取消
+    """
+
+
+class CancelToken:
+    """
+    取消令牌：取消时中断所有已绑定的数据库连接（sqlite3.Connection.interrupt 可跨线程调用）
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._connections = set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self):
+        """
+        取消任务，正在执行的 SQL 会立即中断
+        """
+        with self._lock:
+            self._event.set()
+            for conn in self._connections:
+                conn.interrupt()
+
+    def raise_if_cancelled(self):
+        """
+        任务已取消时抛出 JobCancelled，供分块处理的任务在块之间检查
+        """
+        if self.cancelled:
+            raise JobCancelled()
+
+    @contextmanager
+    def bind(self, conn):
+        """
+        在 with 块内将连接绑定到令牌，取消时中断该连接上的查询
+        :param conn: sqlite3 连接
+        """
+        with self._lock:
+            if self._event.is_set():
+                raise JobCancelled()
+            self._connections.add(conn)
+        try:
+            yield conn
+        finally:
+            with self._lock:
+                self._connections.discard(conn)
+
+
+class JobExecutor:
+    """
+    任务执行器：工作线程池负责数据库操作，回调一律在 Tk 主线程中执行
+    """
+
+    def __init__(self, root, max_workers=DEFAULT_WORKERS, poll_interval=POLL_INTERVAL_MS):
+        """
+        :param root: Tkinter 根窗口
+        :param max_workers: 工作线程数
+        :param poll_interval: 轮询结果队列的间隔（毫秒）
+        """
+        self.root = root
+        self.poll_interval = poll_interval
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="db-worker")
+        self._results = queue.Queue()
+        self._groups = {}  # 任务分组 -> 最新任务的取消令牌
+        self._tokens = set()  # 尚未结束的任务
+        self._closed = False
+        self.root.after(self.poll_interval, self._poll)
+
+    def submit(self, func, *args, on_done=None, on_error=None, group=None):
+        """
+        提交任务
+        :param func: 任务函数，在工作线程中以 func(token, *args) 调用
+        :param on_done: 成功时在主线程中调用 on_done(result)
+        :param on_error: 出错时在主线程中调用 on_error(exception)
+        :param group: 任务分组；同组的新任务提交时，旧任务会被取消（如同一表格的筛选）
+        :return: 取消令牌
+        """
+        token = CancelToken()
+        if group is not None:
+            previous = self._groups.get(group)
+            if previous is not None:
+                previous.cancel()
+            self._groups[group] = token
+        self._tokens.add(token)
+        self._pool.submit(self._run, token, func, args, on_done, on_error, group)
+        return token
+
+    def submit_background(self, func, *args):
+        """
+        提交不需要回调主线程的后台任务（如预取）
+        :return: concurrent.futures.Future
+        """
+        return self._pool.submit(func, *args)
+
+    def post(self, callback, *args):
+        """
+        从工作线程请求在主线程中执行回调（如刷新进度条）
+        """
+        self._results.put((callback, args))
+
+    def cancel_all(self):
+        """
+        取消所有尚未结束的任务
+        """
+        for token in list(self._tokens):
+            token.cancel()
+
+    def shutdown(self):
+        """
+        取消所有任务并关闭线程池
+        """
+        self._closed = True
+        self.cancel_all()
+        self._pool.shutdown(wait=False)
+
+    def _run(self, token, func, args, on_done, on_error, group):
+        """
+        在工作线程中执行任务，并将结果放入队列
+        """
+        try:
+            if token.cancelled:
+                raise JobCancelled()
+            result = func(token, *args)
+            self._results.put((self._finish, (token, group, on_done, result)))
+        except Exception as e:
+            # 被取消的查询会抛出 sqlite3.OperationalError("interrupted")，统一视为取消
+            if token.cancelled:
+                e = JobCancelled()
+            self._results.put((self._finish, (token, group, on_error, e)))
+
+    def _finish(self, token, group, callback, value):
+        """
+        在主线程中结束任务并调用回调；已取消的任务不再回调
+        """
+        self._tokens.discard(token)
+        if group is not None and self._groups.get(group) is token:
+            del self._groups[group]
+        if token.cancelled or isinstance(value, JobCancelled) or callback is None:
+            return
+        callback(value)
+
+    def _poll(self):
+        """
+        在主线程中处理结果队列
+        """
+        while True:
+            try:
+                callback, args = self._results.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                callback(*args)
+            except Exception:
+                # 回调出错不能中断轮询，交给 Tk 的默认异常处理
+                self.root.report_callback_exception(*sys.exc_info())
+        if not self._closed:
+            self.root.after(self.poll_interval, self._poll)
@@ -13,18 +13,57 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import time
+
+# 冷启动计时起点（在导入 pandas 等模块之前）
+START_TIME = time.perf_counter()
+
 import os
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import pandas as pd
-import numpy as np
-import time
-import chardet
-import pyarrow
-import webbrowser
-import requests
-import threading
 import sqlite3
+import threading
+import multiprocessing
+from contextlib import closing, nullcontext
+
+from accounts import prefix_range
+from db import ConnectionManager, connect
+from engine import (
+    account_lines,
+    compound_filter,
+    filter_rows,
+    find_voucher,
+    import_ledger,
+    make_voucher,
+    prepare_database,
+    validate,
+)
+from export import export_table
+from filters import FilterState, encode_categories
+from indexes import index_plan_report, table_exists
+from ingest import ALL_SHEETS, excel_sheet_names, is_excel
+from jobs import JobExecutor
+from pager import JOURNAL_PAGE_SIZE, KeysetPager
+from progress import Progress, ProgressReporter
+from schema import JOURNAL_COLUMNS, create_table_sql, table_columns
+from summary import CREATE_PERIOD_SUMMARY_SQL, monthly_summary, period_summary_ready
+from tracing import TRACE_LOG_FILE, Tracer, count_rows, explain, fetch_all, phase
+from virtual_grid import DataFrameSource, VirtualGrid
+from voucher import VoucherCache
+from workspace import WorkspaceError, check_schema, load_last_db, record_metric, repair, save_last_db
+
+# 进度条窗口刷新耗时的间隔（毫秒）
+PROGRESS_REFRESH_MS = 200
+# 保存数据库时每批复制的页数
+BACKUP_PAGES = 1024
+# 性能面板显示的操作数
+PERFORMANCE_PANEL_SPANS = 50
+# 即时筛选：停止输入多少毫秒后查询，以及先显示的行数
+FILTER_DEBOUNCE_MS = 150
+LIVE_FILTER_FIRST_ROWS = 200
+# 支持组合筛选和即时筛选的表格（数据保存在数据库中）
+DB_SHEETS = ("序时账", "科目余额表")
 
 
 class ExcelLikeApp:
@@ -48,8 +87,31 @@ class ExcelLikeApp:
         if not os.path.exists(self.data_dir):
             os.makedirs(self.data_dir)
 
+        # 是否在导入序时账时建立全文索引（加速筛选框的“包含”查询，但会增大数据库文件）
+        self.fulltext_enabled = True
+
+        # 可选的列式序时账引擎：序时账另存为内存映射的 Arrow 文件，筛选、明细账和凭证查询直接在列上完成
+        # （首次使用时才导入 pyarrow，见 columnar 属性）
+        self._columnar = None
+        self._columnar_lock = threading.Lock()
+        self.columnar_enabled = tk.BooleanVar(value=False)
+
+        # 组合筛选：回车时当前表全部非空筛选框的条件编译为一条 SQL，代替逐次筛选
+        self.compound_filter_enabled = tk.BooleanVar(value=False)
+
+        # 即时筛选：输入时自动按组合筛选查询（停止输入后才查询，新的输入会中断尚未完成的查询）
+        self.live_filter_enabled = tk.BooleanVar(value=False)
+        self.live_filters = {}  # 表名 -> {"after": 待执行的 after 标识, "token": 查询的取消令牌, "criteria": 筛选条件}
+
+        # 持久化工作区：启动时重新打开上次使用的数据库；为 False 时每次启动清空 data.db（旧版本的行为）
+        self.persistent_workspace = True
+
         # 初始化数据库
-        self.db_path = os.path.join(self.data_dir, "data.db")
+        self.default_db_path = os.path.join(self.data_dir, "data.db")
+        if self.persistent_workspace:
+            self.db_path = load_last_db(self.data_dir, self.default_db_path)
+        else:
+            self.db_path = self.default_db_path
         self.init_db()
 
         # 初始化当前表格名称
@@ -58,18 +120,15 @@ class ExcelLikeApp:
         # 初始化每个表的筛选状态
         self.filter_states = {
             "序时账": {
-                "filter_history": [],  # 筛选历史记录
-                "filtered_data_cache": None,  # 当前筛选结果缓存
+                "filter": FilterState(),  # 筛选结果及历史记录（基础数据 + 行号栈）
                 "filter_entries": {}  # 筛选框输入框状态
             },
             "科目余额表": {
-                "filter_history": [],
-                "filtered_data_cache": None,
+                "filter": FilterState(),
                 "filter_entries": {}
             },
             "凭证": {
-                "filter_history": [],
-                "filtered_data_cache": None,
+                "filter": FilterState(),
                 "filter_entries": {}
             }
         }
@@ -86,23 +145,38 @@ class ExcelLikeApp:
             ),
         }
 
+        # 已组装凭证的 LRU 缓存及当前显示的凭证
+        self.voucher_cache = VoucherCache()
+        self.current_voucher = None
+
+        # 序时账的键集分页器（同时作为序时账表格的数据源）
+        self.journal_pager = None
+        self.journal_page_loading = False
+
+        # 后台任务执行器：数据库操作在工作线程中执行，结果交回主线程
+        self.jobs = JobExecutor(self.root)
+
+        # 操作追踪：各操作的耗时分解写入 saved_data/trace.log，并在性能面板中查看
+        self.tracer = Tracer(os.path.join(self.data_dir, TRACE_LOG_FILE))
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+
         # 初始化 trees 和 filter_frames
         self.trees = {}
         self.filter_frames = {}
         self.filter_entries = {}
 
-        # 初始化筛选历史记录
-        self.filter_history = []
-        self.filtered_data_cache = None
-
         # 创建按钮栏
         self.create_buttons()
 
         # 创建每个sheet的界面
         self.create_sheets_ui()
 
-        # 初始加载数据
-        self.load_from_db("序时账", limit=100, offset=0)  # 加载前 100 行序时账
+        # 初始加载数据（首页显示后记录冷启动耗时，再在后台检查工作区）
+        window_seconds = time.perf_counter() - START_TIME
+        self.load_from_db(
+            "序时账", limit=JOURNAL_PAGE_SIZE, offset=0,  # 加载第一页序时账
+            on_loaded=lambda df: self.on_first_page(df, window_seconds),
+        )
         self.load_from_db("科目余额表")  # 全量加载科目余额表
 
         # 绑定快捷键
@@ -115,17 +189,81 @@ class ExcelLikeApp:
             lambda event: self.paste_selection(self.trees[self.notebook.tab(self.notebook.select(), "text")]),
         )
 
+    @property
+    def columnar(self):
+        """
+        列式序时账文件（首次使用时才导入 pyarrow，加快启动）
+        """
+        with self._columnar_lock:
+            if self._columnar is None:
+                from columnar import JOURNAL_ARROW_FILE, ColumnarJournal
+
+                self._columnar = ColumnarJournal(os.path.join(self.data_dir, JOURNAL_ARROW_FILE))
+            return self._columnar
+
+    def on_first_page(self, df, window_seconds):
+        """
+        启动后序时账第一页显示时调用：记录冷启动耗时，并在后台补齐工作区中缺失的索引和派生表
+        :param df: 第一页数据
+        :param window_seconds: 从启动到窗口创建完成的耗时
+        """
+        first_page_seconds = time.perf_counter() - START_TIME
+        try:
+            record_metric(
+                self.data_dir, "cold_start",
+                import_seconds=round(IMPORT_SECONDS, 3),
+                window_seconds=round(window_seconds, 3),
+                first_page_seconds=round(first_page_seconds, 3),
+                first_page_rows=len(df),
+                db_bytes=os.path.getsize(self.db_path) if os.path.exists(self.db_path) else 0,
+            )
+        except OSError:
+            pass  # 指标文件无法写入时不影响使用
+
+        if not self.persistent_workspace:
+            return
+
+        def repair_job(token):
+            with self.db.writer() as conn, token.bind(conn):
+                actions = repair(conn, token, fulltext=self.fulltext_enabled)
+                # 列式序时账文件与数据库中的序时账行数不一致时（如上次写入中断）删除，启用列式引擎时重新导出
+                if self.columnar.ready() and table_exists(conn, "journal"):
+                    rows = conn.execute("SELECT COUNT(*) FROM journal").fetchone()[0]
+                    if self.columnar.open().num_rows != rows:
+                        self.columnar.remove()
+                        actions.append("删除已过期的列式序时账")
+            return actions
+
+        def on_repaired(actions):
+            if actions:
+                self.invalidate_vouchers()
+                self.root.title(f"{self.root.title()}（已修复工作区：{'；'.join(actions)}）")
+
+        self.jobs.submit(
+            repair_job,
+            on_done=on_repaired,
+            on_error=lambda e: messagebox.showerror("错误", f"检查工作区时出错: {e}"),
+            group="workspace",
+        )
+
+    def on_close(self):
+        """
+        关闭窗口时取消所有后台任务
+        """
+        self.jobs.shutdown()
+        self.db.close_all()
+        self.root.destroy()
+
     def copy_selection(self, tree):
         """
         复制选中的数据到剪贴板
-        :param tree: Treeview 控件
+        :param tree: VirtualGrid 表格
         """
-        selected_items = tree.selection()
-        if selected_items:
-            # 获取所有选中行的数据
+        selected_values = tree.selected_values()
+        if selected_values:
+            # 获取所有选中行的数据（包括已滚动出可见窗口的行）
             copied_data = []
-            for item in selected_items:
-                values = tree.item(item, 'values')
+            for values in selected_values:
                 copied_data.append("\t".join(map(str, values)))
 
             # 将多行数据复制到剪贴板
@@ -134,16 +272,14 @@ class ExcelLikeApp:
 
     def paste_selection(self, tree):
         """
-        将剪贴板中的数据粘贴到 Treeview 中
-        :param tree: Treeview 控件
+        将剪贴板中的数据粘贴到表格中
+        :param tree: VirtualGrid 表格
         """
         try:
             clipboard_data = self.root.clipboard_get()
             # 按行分割剪贴板中的数据
             rows = clipboard_data.split("\n")
-            for row in rows:
-                values = row.split("\t")
-                tree.insert("", "end", values=values)
+            tree.append_rows([row.split("\t") for row in rows])
         except tk.TclError:
             messagebox.showerror("错误", "剪贴板中没有数据或数据格式不正确！")
 
@@ -159,6 +295,12 @@ class ExcelLikeApp:
         upload_journal_button = ttk.Button(upload_frame, text="上传序时账", command=lambda: self.upload_file("序时账"))
         upload_journal_button.pack(side=tk.LEFT, padx=5)
 
+        # 添加追加序时账按钮（跳过已导入的行）
+        append_journal_button = ttk.Button(
+            upload_frame, text="追加序时账", command=lambda: self.upload_file("序时账", append=True)
+        )
+        append_journal_button.pack(side=tk.LEFT, padx=5)
+
         # 添加上传科目余额表按钮
         upload_balance_button = ttk.Button(upload_frame, text="上传科目余额表", command=lambda: self.upload_file("科目余额表"))
         upload_balance_button.pack(side=tk.LEFT, padx=5)
@@ -212,6 +354,43 @@ class ExcelLikeApp:
         second_row_frame = ttk.Frame(self.root)
         second_row_frame.pack(side=tk.TOP, fill=tk.X, pady=5)
 
+        # 查看索引计划按钮
+        index_plan_button = ttk.Button(second_row_frame, text="索引计划", command=self.show_index_plan)
+        index_plan_button.pack(side=tk.LEFT, padx=5)
+
+        # 列式引擎开关
+        columnar_check = ttk.Checkbutton(
+            second_row_frame, text="列式引擎", variable=self.columnar_enabled, command=self.toggle_columnar
+        )
+        columnar_check.pack(side=tk.LEFT, padx=5)
+
+        # 组合筛选开关
+        compound_check = ttk.Checkbutton(second_row_frame, text="组合筛选", variable=self.compound_filter_enabled)
+        compound_check.pack(side=tk.LEFT, padx=5)
+
+        # 即时筛选开关
+        live_check = ttk.Checkbutton(second_row_frame, text="即时筛选", variable=self.live_filter_enabled)
+        live_check.pack(side=tk.LEFT, padx=5)
+
+        # 月度汇总按钮
+        monthly_button = ttk.Button(second_row_frame, text="月度汇总", command=self.show_monthly_summary)
+        monthly_button.pack(side=tk.LEFT, padx=5)
+
+        # 凭证翻阅按钮
+        prev_voucher_button = ttk.Button(second_row_frame, text="上一张凭证", command=lambda: self.step_voucher(-1))
+        prev_voucher_button.pack(side=tk.LEFT, padx=5)
+
+        next_voucher_button = ttk.Button(second_row_frame, text="下一张凭证", command=lambda: self.step_voucher(1))
+        next_voucher_button.pack(side=tk.LEFT, padx=5)
+
+        # 性能面板按钮
+        performance_button = ttk.Button(second_row_frame, text="性能", command=self.show_performance_panel)
+        performance_button.pack(side=tk.LEFT, padx=5)
+
+        # 即时筛选的状态（匹配行数、耗时）
+        self.filter_status = ttk.Label(second_row_frame, text="")
+        self.filter_status.pack(side=tk.LEFT, padx=5)
+
         # 将恢复筛选和清空筛选按钮放到第二排的最右边
         clear_filter_button = ttk.Button(second_row_frame, text="清空筛选", command=self.clear_filter)
         clear_filter_button.pack(side=tk.RIGHT, padx=5)
@@ -241,21 +420,10 @@ class ExcelLikeApp:
             filter_frame.pack(fill=tk.X, pady=5)
             self.filter_frames[sheet_name] = filter_frame
 
-            # 创建Treeview控件
-            tree = ttk.Treeview(tab_frame, columns=list(df.columns), show="headings")
-            tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+            # 创建虚拟表格（只渲染可见行，自带垂直滚动条）
+            tree = VirtualGrid(tab_frame, df.columns)
 
-            # 添加垂直滚动条
-            scrollbar = ttk.Scrollbar(tab_frame, orient=tk.VERTICAL, command=tree.yview)
-            scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-            tree.configure(yscrollcommand=scrollbar.set)
-
-            # 设置列标题
-            for col in df.columns:
-                tree.heading(col, text=col)
-                tree.column(col, width=100)
-
-            # 保存Treeview控件以便后续更新
+            # 保存表格控件以便后续更新
             self.trees[sheet_name] = tree
 
             # 绑定右键单击事件（仅对科目余额表和序时账）
@@ -265,24 +433,24 @@ class ExcelLikeApp:
                 tree.bind("<Button-3>", self.show_voucher_details)  # 右键单击事件
 
                 # 绑定滚动事件（仅对序时账）
-                def on_scroll(event, tree=tree):
+                def on_scroll_end(tree=tree):
                     """
                     当用户滚动到底部时加载下一部分数据
                     """
-                    # 检查是否滚动到底部
-                    if tree.yview()[1] == 1.0:  # 滚动条到底部
-                        # 计算当前已加载的行数
-                        offset = len(self.sheets["序时账"])
-                        # 加载下一部分数据
-                        self.load_from_db("序时账", limit=100, offset=offset)
-
-                # 绑定滚动事件
-                tree.bind("<MouseWheel>", on_scroll)  # Windows 和 macOS
-                tree.bind("<Button-4>", on_scroll)  # Linux（向上滚动）
-                tree.bind("<Button-5>", on_scroll)  # Linux（向下滚动）
+                    # 当前显示的是筛选结果或明细账时，不追加原始序时账
+                    if tree.source is not self.journal_pager:
+                        return
+                    # 计算当前已加载的行数
+                    offset = len(self.journal_pager)
+                    # 加载下一部分数据（通常已由后台预取完成）
+                    self.load_from_db("序时账", limit=JOURNAL_PAGE_SIZE, offset=offset)
+
+                tree.on_scroll_end = on_scroll_end
 
             elif sheet_name == "凭证":
                 tree.bind("<Button-3>", lambda event: self.notebook.select(0))  # 右键切换到序时账选项卡
+                tree.bind("<Left>", lambda event: self.step_voucher(-1))  # 左方向键查看上一张凭证
+                tree.bind("<Right>", lambda event: self.step_voucher(1))  # 右方向键查看下一张凭证
 
             # 初始化筛选框
             self.update_filter_entries(sheet_name)
@@ -295,153 +463,327 @@ class ExcelLikeApp:
         selected_tab_index = self.notebook.index(self.notebook.select())
         self.current_sheet_name = self.notebook.tab(selected_tab_index, "text")
 
-    def create_progress_window(self, title):
+    def create_progress_window(self, title, on_cancel=None):
         """
         创建进度条窗口
         :param title: 窗口标题
+        :param on_cancel: 取消回调（可选）；提供时窗口中显示“取消”按钮
         :return: 返回进度条窗口、进度条和计时器标签
         """
         # 创建进度条窗口
         progress_window = tk.Toplevel(self.root)
         progress_window.title(title)
-        progress_window.geometry("300x100")
+        progress_window.geometry("380x150" if on_cancel else "380x120")
 
         # 添加进度条
-        progress_bar = ttk.Progressbar(progress_window, orient="horizontal", length=250, mode="determinate")
+        progress_bar = ttk.Progressbar(progress_window, orient="horizontal", length=340, mode="determinate")
         progress_bar.pack(pady=10)
 
-        # 添加计时器标签
-        timer_label = ttk.Label(progress_window, text="耗时: 0.00 秒")
+        # 添加计时器标签（进度说明较长时自动换行）
+        timer_label = ttk.Label(progress_window, text="耗时: 0.00 秒", wraplength=360, justify=tk.CENTER)
         timer_label.pack(pady=5)
 
+        # 添加取消按钮
+        if on_cancel is not None:
+            def cancel():
+                on_cancel()
+                progress_window.destroy()
+
+            cancel_button = ttk.Button(progress_window, text="取消", command=cancel)
+            cancel_button.pack(pady=5)
+            progress_window.protocol("WM_DELETE_WINDOW", cancel)
+
         return progress_window, progress_bar, timer_label
 
-    def update_progress(self, progress_window, progress_bar, timer_label, start_time, current, total):
+    def progress_reporter(self, progress_window, progress_bar, timer_label):
         """
-        更新进度条
+        创建进度报告器：工作线程报告的进度在主线程中刷新到进度条窗口。
+        总量已知时按完成比例显示进度条，否则进度条以不确定模式滚动；耗时每隔 PROGRESS_REFRESH_MS 刷新一次
         :param progress_window: 进度条窗口
         :param progress_bar: 进度条
         :param timer_label: 计时器标签
-        :param start_time: 开始时间
-        :param current: 当前进度
-        :param total: 总进度
+        :return: ProgressReporter（在工作线程中使用）
+        """
+        latest = {"progress": Progress()}
+
+        def render():
+            if not progress_window.winfo_exists():
+                return
+            progress = latest["progress"]
+            fraction = progress.fraction
+            if fraction is None:
+                if str(progress_bar["mode"]) != "indeterminate":
+                    progress_bar.config(mode="indeterminate")
+                    progress_bar.start(50)
+            else:
+                if str(progress_bar["mode"]) == "indeterminate":
+                    progress_bar.stop()
+                    progress_bar.config(mode="determinate")
+                progress_bar["value"] = fraction * 100
+            timer_label.config(text=progress.describe())
+
+        def show(progress):
+            latest["progress"] = progress
+            render()
+
+        def tick():
+            if progress_window.winfo_exists():
+                render()
+                progress_window.after(PROGRESS_REFRESH_MS, tick)
+
+        tick()
+        return ProgressReporter(lambda progress: self.jobs.post(show, progress))
+
+    def traced_submit(self, name, job, on_done=None, on_error=None, group=None, render=True, **detail):
         """
-        # 更新进度条
-        progress_bar["value"] = (current + 1) / total * 100
-        timer_label.config(text=f"耗时: {time.time() - start_time:.2f} 秒")
-        progress_window.update()
-        time.sleep(0.01)  # 模拟处理延迟
+        提交后台任务并追踪为一个操作：任务中的 SQL、DataFrame 构建计入对应阶段，
+        on_done 中的表格刷新计入 render 阶段
+        :param name: 操作名称（如 "first_filter"）
+        :param job: 任务函数，参数同 JobExecutor.submit
+        :param on_done: 成功时的回调
+        :param on_error: 出错时的回调
+        :param group: 任务分组
+        :param render: on_done 是否计入操作耗时；为 False 时（如弹出提示框）先结束追踪再调用 on_done
+        :param detail: 记录到追踪日志的操作参数
+        :return: 取消令牌
+        """
+        span = self.tracer.start(name, **detail)
+
+        def traced_job(token):
+            with self.tracer.activate(span):
+                try:
+                    value = job(token)
+                except Exception as e:
+                    if token.cancelled:
+                        self.tracer.finish(span, "cancelled")  # 被取消的任务不会回调主线程
+                    raise
+            if token.cancelled:
+                self.tracer.finish(span, "cancelled")
+            return value
+
+        def traced_done(value):
+            rows = span.rows if span.rows is not None else count_rows(value)
+            if render and on_done is not None:
+                with span.phase("render"):
+                    on_done(value)
+                self.tracer.finish(span, rows=rows)
+                return
+            self.tracer.finish(span, rows=rows)
+            if on_done is not None:
+                on_done(value)
+
+        def traced_error(e):
+            self.tracer.finish(span, "error", e)
+            if on_error is not None:
+                on_error(e)
+
+        return self.jobs.submit(traced_job, on_done=traced_done, on_error=traced_error, group=group)
 
     def init_db(self):
         """
         初始化数据库，仅创建数据表（如果表不存在）
+        持久化工作区重新打开上次使用的数据库并检查表结构；表结构不兼容时将其改名备份，改用新的 data.db
         """
-        # 如果数据库文件已存在，先删除它
-        if os.path.exists(self.db_path):
-            os.remove(self.db_path)
-
-        # 创建新的数据库文件
-        with sqlite3.connect(self.db_path) as conn:
+        if not self.persistent_workspace:
+            # 删除已存在的数据库文件（连同 WAL 模式产生的 -wal、-shm 文件以及列式序时账文件）
+            self.remove_db_files(self.db_path)
+            self.columnar.remove()
+
+        # 之后的数据库操作均使用连接管理器中的长连接
+        self.db = ConnectionManager(self.db_path, wal=self.is_workspace_db(self.db_path))
+        if self.persistent_workspace:
+            try:
+                with self.db.writer() as conn:
+                    check_schema(conn)
+            except (WorkspaceError, sqlite3.DatabaseError) as e:
+                self.db.close_all()
+                if self.db_path == self.default_db_path:
+                    backup_path = self.db_path + ".bak"
+                    self.remove_db_files(backup_path)
+                    os.replace(self.db_path, backup_path)
+                    self.remove_db_files(self.db_path)
+                    message = f"上次的工作区无法打开（{e}），已备份为 {backup_path}，将使用新的工作区。"
+                else:
+                    message = f"上次使用的数据库 {self.db_path} 无法打开（{e}），将使用新的工作区。"
+                messagebox.showwarning("警告", message)
+                self.db_path = self.default_db_path
+                self.db = ConnectionManager(self.db_path, wal=True)
+            save_last_db(self.data_dir, self.db_path)
+
+        with self.db.writer() as conn:
             cursor = conn.cursor()
 
-            # 创建序时账表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS journal (
-                    日期 TEXT,
-                    凭证字号 TEXT,
-                    科目编码 TEXT,
-                    科目名称 TEXT,
-                    辅助核算 TEXT,
-                    摘要 TEXT,
-                    借方 REAL,
-                    贷方 REAL,
-                    数量 REAL,
-                    外币 REAL
-                )
-            ''')
-
-            # 创建科目余额表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS balance (
-                    科目编码 TEXT,
-                    科目名称 TEXT,
-                    期初借方余额 REAL,
-                    期初贷方余额 REAL,
-                    本期借方发生额 REAL,
-                    本期贷方发生额 REAL,
-                    期末借方余额 REAL,
-                    期末贷方余额 REAL
-                )
-            ''')
+            # 创建序时账表、科目余额表及科目 × 月份汇总表
+            cursor.execute(create_table_sql("journal"))
+            cursor.execute(create_table_sql("balance"))
+            cursor.execute(CREATE_PERIOD_SUMMARY_SQL)
 
             conn.commit()
 
-    def upload_file(self, sheet_name):
+    def is_workspace_db(self, db_path):
+        """
+        是否为软件自己的工作区数据库（saved_data 中的 data.db）；只有它使用 WAL 模式，
+        用户上传的数据库保持原来的日志模式，不会在其旁边生成 -wal、-shm 文件
+        """
+        return os.path.abspath(db_path) == os.path.abspath(self.default_db_path)
+
+    @staticmethod
+    def remove_db_files(db_path):
+        """
+        删除数据库文件及 WAL 模式产生的 -wal、-shm 文件
+        """
+        for path in (db_path, db_path + "-wal", db_path + "-shm"):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def ask_excel_sheets(self, file_paths):
+        """
+        Excel 文件包含多个工作表时，选择要读取的工作表（多个工作表按顺序合并）
+        :param file_paths: 上传的文件路径
+        :return: (是否继续上传, sheets 参数)；sheets 的含义同 ingest.ChunkReader
+        """
+        excel_paths = [path for path in file_paths if is_excel(path)]
+        sheet_names = {path: excel_sheet_names(path) for path in excel_paths}
+        if all(len(names) <= 1 for names in sheet_names.values()):
+            return True, None
+
+        if len(file_paths) > 1:
+            # 多个文件时不逐个选择：读取各文件的第一个工作表或全部工作表
+            merge = messagebox.askyesnocancel(
+                "选择工作表", "部分 Excel 文件包含多个工作表，是否合并读取各文件的全部工作表？\n选择“否”则只读取第一个工作表。"
+            )
+            if merge is None:
+                return False, None
+            return True, ALL_SHEETS if merge else None
+
+        names = sheet_names[excel_paths[0]]
+        dialog = tk.Toplevel(self.root)
+        dialog.title("选择工作表")
+        dialog.geometry("300x300")
+        dialog.transient(self.root)
+        ttk.Label(dialog, text="选择要读取的工作表（可多选，按顺序合并）：").pack(pady=5)
+        sheet_list = tk.Listbox(dialog, selectmode=tk.EXTENDED, exportselection=False)
+        sheet_list.pack(fill=tk.BOTH, expand=True, padx=10)
+        for name in names:
+            sheet_list.insert(tk.END, name)
+        sheet_list.selection_set(0, tk.END)  # 默认合并全部工作表
+
+        result = {"sheets": None}
+
+        def confirm():
+            selected = [names[i] for i in sheet_list.curselection()]
+            if not selected:
+                messagebox.showwarning("警告", "请至少选择一个工作表", parent=dialog)
+                return
+            result["sheets"] = selected
+            dialog.destroy()
+
+        ttk.Button(dialog, text="确定", command=confirm).pack(pady=5)
+        dialog.grab_set()
+        self.root.wait_window(dialog)
+        if result["sheets"] is None:
+            return False, None
+        return True, result["sheets"]
+
+    def upload_file(self, sheet_name, append=False):
         """
         上传文件并写入初始化的数据库（data.db），显示进度条
+        序时账可一次选择多个文件（如 12 个月的序时账），各文件并行解析后在一个事务中依次写入
+        :param sheet_name: 表名（如 "序时账" 或 "科目余额表"）
+        :param append: 是否追加到已有的序时账（按行哈希跳过已导入的行，索引和汇总增量更新）
         """
-        file_path = filedialog.askopenfilename(
-            filetypes=[("Excel files", "*.xlsx *.xls"), ("CSV files", "*.csv"), ("Parquet files", "*.parquet")]
-        )
-        if not file_path:
+        filetypes = [("Excel files", "*.xlsx *.xlsm *.xls"), ("CSV files", "*.csv"), ("Parquet files", "*.parquet")]
+        if sheet_name == "序时账":
+            # 按文件名排序，使按月份命名的文件依次写入
+            file_paths = sorted(filedialog.askopenfilenames(filetypes=filetypes))
+        else:
+            file_path = filedialog.askopenfilename(filetypes=filetypes)
+            file_paths = [file_path] if file_path else []
+        if not file_paths:
+            return
+
+        table_name = self.table_name_mapping.get(sheet_name)
+        if not table_name:
+            messagebox.showerror("错误", f"不支持的文件类型：{sheet_name}")
+            return
+
+        try:
+            proceed, sheets = self.ask_excel_sheets(file_paths)
+        except Exception as e:
+            messagebox.showerror("错误", f"读取工作表时出错: {e}")
+            return
+        if not proceed:
             return
 
         # 创建进度条窗口
         progress_window, progress_bar, timer_label = self.create_progress_window("上传文件")
+        progress = self.progress_reporter(progress_window, progress_bar, timer_label)
+        columnar = self.columnar_enabled.get()
+
+        # 多个文件时在进度条窗口中逐个显示文件状态
+        file_list = None
+        if len(file_paths) > 1:
+            progress_window.geometry(f"420x{160 + 18 * min(len(file_paths), 12)}")
+            file_list = tk.Listbox(progress_window, height=min(len(file_paths), 12))
+            file_list.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+            for path in file_paths:
+                file_list.insert(tk.END, f"{os.path.basename(path)}：等待解析")
+
+        def show_file(path, status, rows):
+            """
+            刷新单个文件的状态（在主线程中执行）
+            """
+            if not progress_window.winfo_exists():
+                return
+            index = file_paths.index(path)
+            text = f"{os.path.basename(path)}：{status}" + (f" {rows} 行" if rows else "")
+            file_list.delete(index)
+            file_list.insert(index, text)
+
+        def upload_job(token):
+            """
+            在工作线程中按块读取文件、分批写入数据库并建立索引
+            """
+            # 分批写入初始化的数据库（data.db），写入期间独占写连接
+            with self.db.bulk_load() as conn, token.bind(conn):
+                return import_ledger(
+                    conn, table_name, file_paths, token=token, progress=progress,
+                    on_file=lambda path, status, rows: self.jobs.post(show_file, path, status, rows),
+                    sheets=sheets, append=append, fulltext=self.fulltext_enabled,
+                    store=self.columnar if table_name == "journal" else None, columnar=columnar,
+                )
 
-        try:
-            # 模拟上传过程
-            total_steps = 10
-            start_time = time.time()
-            for i in range(total_steps):
-                self.update_progress(progress_window, progress_bar, timer_label, start_time, i, total_steps)
-                time.sleep(0.1)  # 模拟上传延迟
-
-            # 读取文件
-            if file_path.endswith('.csv'):
-                with open(file_path, 'rb') as f:
-                    raw_data = f.read()
-                    result = chardet.detect(raw_data)
-                    encoding = result['encoding']
-                df = pd.read_csv(file_path, encoding=encoding)
-            elif file_path.endswith('.parquet'):
-                df = pd.read_parquet(file_path)
-            else:
-                df = pd.read_excel(file_path)
-
-            # 将数据写入初始化的数据库（data.db）
-            with sqlite3.connect(self.db_path) as conn:
-                table_name = self.table_name_mapping.get(sheet_name)
-                if not table_name:
-                    messagebox.showerror("错误", f"不支持的文件类型：{sheet_name}")
-                    return
-
-                # 写入数据
-                df.to_sql(table_name, conn, if_exists='replace', index=False)
-
-                # 为每一列创建索引
-                cursor = conn.cursor()
-                for col in df.columns:
-                    index_name = f"idx_{table_name}_{col}"
-                    cursor.execute(f'CREATE INDEX IF NOT EXISTS {index_name} ON {table_name} ({col})')
-                conn.commit()
-
-            # 更新 Treeview
+        def on_done(stats):
+            progress_window.destroy()  # 关闭进度条窗口
+            if table_name == "journal":
+                self.invalidate_vouchers()
+
+            # 更新表格
             if sheet_name == "序时账":
-                self.load_from_db("序时账", limit=100, offset=0)  # 加载前 100 行
+                self.load_from_db("序时账", limit=JOURNAL_PAGE_SIZE, offset=0)  # 加载第一页
             else:
                 self.load_from_db(sheet_name)  # 全量加载
 
-            messagebox.showinfo("成功", f"{sheet_name}上传完成！")
+            file_count = f"{len(file_paths)} 个文件，" if len(file_paths) > 1 else ""
+            skipped = f"，跳过已导入的 {stats.skipped} 行" if stats.skipped else ""
+            messagebox.showinfo(
+                "成功",
+                f"{sheet_name}{'追加' if append else '上传'}完成！{file_count}共写入 {stats.rows} 行{skipped}，"
+                f"用时 {stats.seconds:.2f} 秒（{stats.rows_per_sec:,.0f} 行/秒）"
+            )
 
-        except Exception as e:
-            messagebox.showerror("错误", f"上传{sheet_name}时出错: {e}")
-        finally:
+        def on_error(e):
             progress_window.destroy()  # 关闭进度条窗口
+            messagebox.showerror("错误", f"上传{sheet_name}时出错: {e}")
+
+        self.traced_submit(
+            "import", upload_job, on_done=on_done, on_error=on_error, render=False,
+            table=table_name, files=len(file_paths), append=append,
+        )
 
     def upload_db(self):
         """
-        上传指定路径的数据库文件，并检查每一列的索引，显示进度条
+        上传指定路径的数据库文件，并按索引计划检查索引，显示进度条
         """
         file_path = filedialog.askopenfilename(filetypes=[("SQLite files", "*.db")])
         if not file_path:
@@ -449,129 +791,306 @@ class ExcelLikeApp:
 
         # 创建进度条窗口
         progress_window, progress_bar, timer_label = self.create_progress_window("上传数据库")
+        progress = self.progress_reporter(progress_window, progress_bar, timer_label)
+        columnar = self.columnar_enabled.get()
+
+        def index_job(token):
+            """
+            在工作线程中检查指定路径的数据库文件
+            """
+            with closing(connect(file_path)) as conn, token.bind(conn):
+                # 删除旧版本遗留的逐列索引，补齐索引计划中的索引、汇总表和科目层级
+                prepare_database(
+                    conn, token, progress, fulltext=self.fulltext_enabled, store=self.columnar, columnar=columnar
+                )
 
-        try:
-            # 模拟上传过程
-            total_steps = 10
-            start_time = time.time()
-            for i in range(total_steps):
-                self.update_progress(progress_window, progress_bar, timer_label, start_time, i, total_steps)
-                time.sleep(0.1)  # 模拟上传延迟
-
-            # 检查指定路径的数据库文件
-            with sqlite3.connect(file_path) as conn:
-                cursor = conn.cursor()
-
-                # 检查每一列的索引
-                for table_name in ["journal", "balance"]:
-                    cursor.execute(f"PRAGMA table_info({table_name})")
-                    columns = [row[1] for row in cursor.fetchall()]  # 获取列名
-                    for col in columns:
-                        index_name = f"idx_{table_name}_{col}"
-                        cursor.execute(f'CREATE INDEX IF NOT EXISTS {index_name} ON {table_name} ({col})')
-                conn.commit()
+        def on_done(_):
+            progress_window.destroy()  # 关闭进度条窗口
 
             # 将指定路径的数据库文件设置为当前数据库
             self.db_path = file_path
+            self.db.set_path(file_path, wal=self.is_workspace_db(file_path))
+            self.invalidate_vouchers()
+            if self.persistent_workspace:
+                save_last_db(self.data_dir, file_path)  # 下次启动时重新打开该数据库
 
-            # 更新 Treeview
-            self.load_from_db("序时账", limit=100, offset=0)  # 分页加载序时账（前 100 行）
+            # 更新表格
+            self.load_from_db("序时账", limit=JOURNAL_PAGE_SIZE, offset=0)  # 分页加载序时账（第一页）
             self.load_from_db("科目余额表")  # 全量加载科目余额表
 
             messagebox.showinfo("成功", "数据库上传完成！")
 
-        except Exception as e:
-            messagebox.showerror("错误", f"上传数据库时出错: {e}")
-        finally:
+        def on_error(e):
             progress_window.destroy()  # 关闭进度条窗口
+            messagebox.showerror("错误", f"上传数据库时出错: {e}")
 
-    def load_from_db(self, sheet_name, limit=None, offset=None):
+        self.traced_submit("open_database", index_job, on_done=on_done, on_error=on_error, render=False)
+
+    def columnar_active(self):
         """
-        从当前数据库加载数据
-        :param sheet_name: 表名（如 "序时账" 或 "科目余额表"）
-        :param limit: 每次加载的行数（仅对序时账有效）
-        :param offset: 起始行数（仅对序时账有效）
-        :return: 返回一个 DataFrame，即使为空也不会返回 None
+        列式引擎是否已启用且列式序时账文件可用
         """
-        try:
-            with sqlite3.connect(self.db_path) as conn:
-                table_name = self.table_name_mapping.get(sheet_name)
-                if not table_name:
-                    messagebox.showerror("错误", f"未找到表名映射：{sheet_name}")
-                    return pd.DataFrame()  # 返回空 DataFrame 而不是 None
-
-                query = f'SELECT * FROM {table_name}'
-
-                # 如果是序时账，分页加载
-                if sheet_name == "序时账" and limit is not None and offset is not None:
-                    query += f' LIMIT {limit} OFFSET {offset}'
-
-                df = pd.read_sql(query, conn)
-
-                # 更新当前表格数据
-                if sheet_name == "序时账":
-                    if offset == 0:  # 第一次加载
-                        self.sheets[sheet_name] = df
-                    else:  # 追加数据
-                        self.sheets[sheet_name] = pd.concat([self.sheets[sheet_name], df], ignore_index=True)
-                else:  # 科目余额表，全量加载
-                    self.sheets[sheet_name] = df
+        return self.columnar_enabled.get() and self.columnar.ready()
+
+    def toggle_columnar(self):
+        """
+        切换列式引擎：启用时若列式序时账文件不存在，则从当前数据库导出；之后重新加载序时账
+        """
+        if not self.columnar_enabled.get() or self.columnar.ready():
+            self.load_from_db("序时账", limit=JOURNAL_PAGE_SIZE, offset=0)
+            return
 
-                # 更新 Treeview
-                tree = self.trees[sheet_name]
-                if sheet_name == "序时账" and offset == 0:  # 第一次加载时清空 Treeview
-                    for item in tree.get_children():
-                        tree.delete(item)
-                for _, row in df.iterrows():
-                    tree.insert("", "end", values=list(row))
+        progress_window, progress_bar, timer_label = self.create_progress_window("导出列式序时账")
+        progress = self.progress_reporter(progress_window, progress_bar, timer_label)
 
-                return df  # 确保返回 DataFrame
+        def export_job(token):
+            with token.bind(self.db.reader()) as conn:
+                if not table_exists(conn, "journal"):
+                    return 0
+                progress.stage("导出列式序时账", total_rows=conn.execute("SELECT COUNT(*) FROM journal").fetchone()[0])
+                return self.columnar.export(conn, token, progress)
 
-        except Exception as e:
+        def on_done(rows):
+            progress_window.destroy()
+            if rows == 0:
+                self.columnar_enabled.set(False)
+                messagebox.showwarning("警告", "数据库中没有序时账数据，未启用列式引擎！")
+                return
+            self.load_from_db("序时账", limit=JOURNAL_PAGE_SIZE, offset=0)
+
+        def on_error(e):
+            progress_window.destroy()
+            self.columnar_enabled.set(False)
+            messagebox.showerror("错误", f"导出列式序时账时出错: {e}")
+
+        self.jobs.submit(export_job, on_done=on_done, on_error=on_error, group="columnar")
+
+    def show_index_plan(self):
+        """
+        显示索引计划以及各查询路径的查询计划
+        """
+
+        def report_job(token):
+            with token.bind(self.db.reader()) as conn:
+                return index_plan_report(conn)
+
+        self.jobs.submit(
+            report_job,
+            on_done=lambda report: messagebox.showinfo("索引计划", report),
+            on_error=lambda e: messagebox.showerror("错误", f"获取索引计划时出错: {e}"),
+            group="index_plan",
+        )
+
+    def show_performance_panel(self):
+        """
+        性能面板：最近操作中耗时最长的若干个，按 SQL、DataFrame 构建、渲染分解耗时；
+        选中一行时显示该操作执行的 SQL 及其查询计划
+        """
+        columns = ["时间", "操作", "状态", "总耗时(秒)", "SQL(秒)", "DataFrame(秒)", "渲染(秒)", "行数",
+                   "内存变化(MB)", "参数"]
+        spans = []
+
+        window = tk.Toplevel(self.root)
+        window.title("性能")
+        window.geometry("1000x600")
+
+        top_frame = ttk.Frame(window)
+        top_frame.pack(fill=tk.X, padx=10, pady=5)
+        ttk.Label(
+            top_frame, text=f"最近操作中耗时最长的 {PERFORMANCE_PANEL_SPANS} 个（完整记录见 {self.data_dir}/{TRACE_LOG_FILE}）"
+        ).pack(side=tk.LEFT)
+
+        grid_frame = ttk.Frame(window)
+        grid_frame.pack(fill=tk.BOTH, expand=True)
+        grid = VirtualGrid(grid_frame, columns=columns)
+
+        detail_text = tk.Text(window, height=14, wrap=tk.NONE)
+        detail_text.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+
+        def seconds(span, phase_name):
+            value = span.phases.get(phase_name)
+            return "" if value is None else f"{value:.3f}"
+
+        def refresh():
+            spans[:] = self.tracer.slowest(PERFORMANCE_PANEL_SPANS)
+            grid.set_dataframe(pd.DataFrame(
+                [
+                    [
+                        time.strftime("%H:%M:%S", time.localtime(span.started)), span.name, span.status,
+                        f"{span.seconds:.3f}", seconds(span, "sql"), seconds(span, "frame"), seconds(span, "render"),
+                        "" if span.rows is None else span.rows,
+                        "" if span.rss_delta is None else f"{span.rss_delta / 2 ** 20:.1f}",
+                        ", ".join(f"{key}={value}" for key, value in span.detail.items()),
+                    ]
+                    for span in spans
+                ],
+                columns=columns,
+            ))
+            show_detail("")
+
+        def show_detail(text):
+            if detail_text.winfo_exists():
+                detail_text.delete("1.0", tk.END)
+                detail_text.insert(tk.END, text)
+
+        def explain_job(token, span):
+            # 在读连接上重新获取查询计划（只解释，不执行）
+            lines = [
+                f"{span.name}：总耗时 {span.seconds:.3f} 秒，"
+                + "，".join(f"{name} {value:.3f} 秒" for name, value in span.phases.items())
+            ]
+            if span.error:
+                lines.append(f"错误：{span.error}")
+            with token.bind(self.db.reader()) as conn:
+                for statement in span.statements:
+                    lines.append("")
+                    lines.append(f"SQL（{statement.calls} 次，共 {statement.seconds:.3f} 秒）：{statement.sql}")
+                    if statement.params:
+                        lines.append(f"参数：{statement.params}")
+                    lines.append("查询计划：")
+                    lines.extend(f"  {line}" for line in explain(conn, statement.sql, statement.params))
+            return "\n".join(lines)
+
+        def on_select(event):
+            positions = grid.selected_rows()
+            if not positions or positions[0] >= len(spans):
+                return
+            self.jobs.submit(
+                explain_job, spans[positions[0]],
+                on_done=show_detail,
+                on_error=lambda e: show_detail(f"获取查询计划时出错: {e}"),
+                group="performance_explain",
+            )
+
+        grid.bind("<ButtonRelease-1>", on_select)
+        ttk.Button(top_frame, text="刷新", command=refresh).pack(side=tk.RIGHT)
+        window.bind("<Control-c>", lambda event: self.copy_selection(grid))
+        refresh()
+
+    def load_from_db(self, sheet_name, limit=None, offset=None, on_loaded=None):
+        """
+        从当前数据库加载数据（在工作线程中查询，完成后在主线程中更新表格）
+        :param sheet_name: 表名（如 "序时账" 或 "科目余额表"）
+        :param limit: 每页的行数（仅对序时账有效）
+        :param offset: 为 0 时从第一页重新加载，大于 0 时继续加载下一页（仅对序时账有效）。
+                       序时账按 rowid 键集分页，不使用 SQL OFFSET，滚动越深也不会变慢
+        :param on_loaded: 加载完成后的回调，参数为本次加载的 DataFrame（即使为空也不会是 None）
+        """
+        table_name = self.table_name_mapping.get(sheet_name)
+        if not table_name:
+            messagebox.showerror("错误", f"未找到表名映射：{sheet_name}")
+            return
+
+        tree = self.trees[sheet_name]
+
+        def on_error(e):
+            if sheet_name == "序时账":
+                self.journal_page_loading = False
             messagebox.showerror("错误", f"从数据库加载数据时出错: {e}")
-            return pd.DataFrame()  # 返回空 DataFrame 而不是 None
+
+        # 列式引擎：整个序时账以内存映射方式打开，表格直接显示，无需分页
+        if sheet_name == "序时账" and offset == 0 and self.columnar_active():
+            from columnar import ColumnarSource
+
+            self.journal_pager = None
+            self.journal_page_loading = False
+
+            def columnar_job(token):
+                table = self.columnar.open()
+                return table, table.slice(0, limit or JOURNAL_PAGE_SIZE).to_pandas()
+
+            def on_columnar_loaded(result):
+                table, df = result
+                self.sheets[sheet_name] = df
+                tree.set_source(ColumnarSource(table))
+                if on_loaded is not None:
+                    on_loaded(df)
+
+            self.traced_submit(
+                "load", columnar_job, on_done=on_columnar_loaded, on_error=on_error, group="load:序时账",
+                table=table_name, engine="columnar",
+            )
+            return
+
+        # 如果是序时账，分页加载
+        if sheet_name == "序时账" and limit is not None and offset is not None:
+            first_page = offset == 0 or self.journal_pager is None
+            if first_page:  # 第一次加载
+                self.journal_pager = KeysetPager(
+                    self.db, table_name, JOURNAL_COLUMNS, page_size=limit, executor=self.jobs
+                )
+            elif self.journal_page_loading:  # 下一页正在加载
+                return
+            pager = self.journal_pager
+            self.journal_page_loading = True
+
+            def on_page_loaded(df):
+                if pager is not self.journal_pager:
+                    return  # 已被新的加载替换
+                self.journal_page_loading = False
+                if first_page:
+                    self.sheets[sheet_name] = df
+                    tree.set_source(pager)
+                elif not df.empty:  # 追加下一页（已加载的页不会被复制），保留滚动位置
+                    tree.invalidate()
+                # 在后台预取后续页
+                pager.prefetch()
+                if on_loaded is not None:
+                    on_loaded(df)
+
+            self.traced_submit(
+                "load",
+                lambda token: pager.load_next_page(),
+                on_done=on_page_loaded,
+                on_error=on_error,
+                group="load:序时账" if first_page else None,
+                table=table_name, page="first" if first_page else "next",
+            )
+            return
+
+        def load_job(token):
+            columns = table_columns(table_name)
+            with token.bind(self.db.reader()) as conn:
+                rows = fetch_all(conn, f"SELECT {', '.join(columns)} FROM {table_name}")
+            with phase("frame"):
+                return pd.DataFrame(rows, columns=columns)
+
+        def on_table_loaded(df):
+            # 更新当前表格数据（科目余额表，全量加载）
+            self.sheets[sheet_name] = df
+            tree.set_dataframe(df)
+            if on_loaded is not None:
+                on_loaded(df)
+
+        self.traced_submit(
+            "load", load_job, on_done=on_table_loaded, on_error=on_error, group=f"load:{sheet_name}", table=table_name
+        )
 
     def clear_sheet(self, sheet_name):
         """
         清空指定表的数据
         :param sheet_name: 表名
         """
-        # 创建进度条窗口
-        progress_window, progress_bar, timer_label = self.create_progress_window(f"清空 {sheet_name}")
-
         try:
-            # 模拟清空过程
-            total_steps = 10
-            start_time = time.time()
-            for i in range(total_steps):
-                self.update_progress(progress_window, progress_bar, timer_label, start_time, i, total_steps)
-
             # 清空数据
             self.sheets[sheet_name] = pd.DataFrame(columns=self.sheets[sheet_name].columns)
 
-            # 清空Treeview
-            tree = self.trees[sheet_name]
-            for item in tree.get_children():
-                tree.delete(item)
+            # 清空表格
+            self.trees[sheet_name].clear()
 
             # 更新筛选框
             self.update_filter_entries(sheet_name)
 
         except Exception as e:
             messagebox.showerror("错误", f"清空 {sheet_name} 时出错: {e}")
-        finally:
-            progress_window.destroy()
 
-    def restore_journal(self, limit=100, offset=0):
+    def restore_journal(self, limit=JOURNAL_PAGE_SIZE, offset=0):
         """
         恢复序时账数据（分页加载）
         :param limit: 每次加载的行数
         :param offset: 起始行数
         """
-        try:
-            # 从数据库中加载原始序时账数据（分页加载）
-            original_journal = self.load_from_db("序时账", limit=limit, offset=offset)
-
+        def on_loaded(original_journal):
             # 检查返回值是否为空 DataFrame
             if original_journal.empty:
                 if offset == 0:  # 第一次加载时提示
@@ -584,6 +1103,9 @@ class ExcelLikeApp:
             # 切换到序时账选项卡
             self.notebook.select(self.trees["序时账"].master)
 
+        try:
+            # 从数据库中加载原始序时账数据（分页加载）
+            self.load_from_db("序时账", limit=limit, offset=offset, on_loaded=on_loaded)
         except Exception as e:
             messagebox.showerror("错误", f"恢复序时账时出错: {e}")
 
@@ -591,10 +1113,7 @@ class ExcelLikeApp:
         """
         恢复科目余额表数据（全量加载）
         """
-        try:
-            # 从数据库中加载原始科目余额表数据（全量加载）
-            original_balance = self.load_from_db("科目余额表")
-
+        def on_loaded(original_balance):
             # 检查返回值是否为空 DataFrame
             if original_balance.empty:
                 messagebox.showwarning("警告", "未找到科目余额表数据！")
@@ -606,6 +1125,9 @@ class ExcelLikeApp:
             # 切换到科目余额表选项卡
             self.notebook.select(self.trees["科目余额表"].master)
 
+        try:
+            # 从数据库中加载原始科目余额表数据（全量加载）
+            self.load_from_db("科目余额表", on_loaded=on_loaded)
         except Exception as e:
             messagebox.showerror("错误", f"恢复科目余额表时出错: {e}")
 
@@ -623,39 +1145,42 @@ class ExcelLikeApp:
         if not file_path:
             return  # 用户取消选择
 
-        # 创建进度条窗口
-        progress_window, progress_bar, timer_label = self.create_progress_window(f"保存 {sheet_name}")
-
-        try:
-            # 获取数据库中的表名
-            table_name = self.table_name_mapping.get(sheet_name)
-            if not table_name:
-                messagebox.showerror("错误", f"未找到表名映射：{sheet_name}")
-                return
-
-            # 模拟保存过程
-            total_steps = 10
-            start_time = time.time()
-            for i in range(total_steps):
-                self.update_progress(progress_window, progress_bar, timer_label, start_time, i, total_steps)
+        # 获取数据库中的表名
+        table_name = self.table_name_mapping.get(sheet_name)
+        if not table_name:
+            messagebox.showerror("错误", f"未找到表名映射：{sheet_name}")
+            return
 
-            # 从数据库中读取数据并保存为指定格式
-            with sqlite3.connect(self.db_path) as conn:
-                df = pd.read_sql(f"SELECT * FROM {table_name}", conn)
+        # 创建进度条窗口（可取消保存）
+        progress_window, progress_bar, timer_label = self.create_progress_window(
+            f"保存 {sheet_name}", on_cancel=lambda: token.cancel()
+        )
+        progress = self.progress_reporter(progress_window, progress_bar, timer_label)
 
-                if file_path.endswith('.parquet'):
-                    df.to_parquet(file_path, index=False)
-                elif file_path.endswith('.xlsx'):
-                    df.to_excel(file_path, index=False)
-                elif file_path.endswith('.csv'):
-                    df.to_csv(file_path, index=False, encoding='utf-8-sig')
+        def save_job(token):
+            """
+            在工作线程中按批从数据库读取数据并写入文件（内存占用只与批大小有关）
+            """
+            with token.bind(self.db.reader()) as conn:
+                progress.stage(f"保存{sheet_name}")
+                return export_table(conn, table_name, file_path, token=token, progress=progress, sheet_name=sheet_name)
 
-            messagebox.showinfo("成功", f"{sheet_name} 已保存！")
+        def on_done(stats):
+            progress_window.destroy()
+            sheets = f"（共 {stats.sheets} 个工作表）" if stats.sheets > 1 else ""
+            messagebox.showinfo(
+                "成功",
+                f"{sheet_name} 已保存！共 {stats.rows} 行{sheets}，用时 {stats.seconds:.2f} 秒"
+            )
 
-        except Exception as e:
-            messagebox.showerror("错误", f"保存 {sheet_name} 时出错: {e}")
-        finally:
+        def on_error(e):
             progress_window.destroy()
+            messagebox.showerror("错误", f"保存 {sheet_name} 时出错: {e}")
+
+        token = self.traced_submit(
+            "export", save_job, on_done=on_done, on_error=on_error, render=False,
+            table=table_name, format=os.path.splitext(file_path)[1].lower(),
+        )
 
     def save_to_db_from_ui(self):
         """
@@ -672,124 +1197,145 @@ class ExcelLikeApp:
 
         # 创建进度条窗口
         progress_window, progress_bar, timer_label = self.create_progress_window("保存数据库")
+        progress = self.progress_reporter(progress_window, progress_bar, timer_label)
 
-        try:
-            # 模拟保存过程
-            total_steps = 10
-            start_time = time.time()
-            for i in range(total_steps):
-                self.update_progress(progress_window, progress_bar, timer_label, start_time, i, total_steps)
+        def copy_job(token):
+            # 通过 SQLite 备份接口复制当前数据库（包含 WAL 文件中尚未合并的内容）到用户指定的位置，
+            # 按批复制页面并报告已复制的字节数
+            source = self.db.reader()
+            page_size = source.execute("PRAGMA page_size").fetchone()[0]
+            progress.stage("复制数据库")
+
+            def on_pages(status, remaining, total):
+                token.raise_if_cancelled()
+                progress.update(bytes_done=(total - remaining) * page_size, total_bytes=total * page_size)
 
-            # 复制当前的数据库文件到用户指定的位置
-            import shutil
-            shutil.copy(self.db_path, file_path)
+            with closing(sqlite3.connect(file_path)) as target:
+                source.backup(target, pages=BACKUP_PAGES, progress=on_pages, sleep=0)
 
+        def on_done(_):
+            progress_window.destroy()
             messagebox.showinfo("成功", f"数据库已保存至：{file_path}")
 
-        except Exception as e:
-            messagebox.showerror("错误", f"保存数据库时出错: {e}")
-        finally:
+        def on_error(e):
             progress_window.destroy()
+            messagebox.showerror("错误", f"保存数据库时出错: {e}")
+
+        self.jobs.submit(copy_job, on_done=on_done, on_error=on_error)
 
     def data_validation(self):
         """
         数据校验：检查科目余额表与序时账的金额是否一致
         """
-        # 创建进度条窗口
-        progress_window, progress_bar, timer_label = self.create_progress_window("数据校验")
 
-        # 在单独的线程中执行数据校验
-        def validate_data():
-            try:
-                with sqlite3.connect(self.db_path) as conn:
-                    cursor = conn.cursor()
-
-                    # 检查数据库中是否存在序时账和科目余额表
-                    cursor.execute(
-                        "SELECT name FROM sqlite_master WHERE type='table' AND name IN ('journal', 'balance')")
-                    tables = cursor.fetchall()
-                    if len(tables) != 2:
-                        messagebox.showerror("错误", "数据库中没有找到序时账或科目余额表！")
-                        return
+        # 在工作线程中执行数据校验（一条集合运算 SQL），差异写入 validation_result 表后交回主线程显示
+        def validate_job(token):
+            with self.db.writer() as conn, token.bind(conn):
+                progress.stage("核对科目余额表与序时账")
+                return validate(conn)
 
-                    # 创建临时表存储序时账的汇总数据
-                    cursor.execute('''
-                        CREATE TEMPORARY TABLE temp_journal_summary AS
-                        SELECT 科目编码, SUM(借方) AS 序时账借方金额, SUM(贷方) AS 序时账贷方金额
-                        FROM journal
-                        GROUP BY 科目编码
-                    ''')
-
-                    # 为临时表创建索引以加快查询速度
-                    cursor.execute('CREATE INDEX idx_temp_journal_subject_code ON temp_journal_summary (科目编码)')
-
-                    # 读取科目余额表数据
-                    cursor.execute('''
-                        SELECT 科目编码, 科目名称, 本期借方发生额, 本期贷方发生额
-                        FROM balance
-                    ''')
-                    balance_data = cursor.fetchall()
-
-                    # 计算校验值
-                    discrepancies = []
-                    for row in balance_data:
-                        subject_code = row[0]
-                        subject_name = row[1]
-                        debit_balance = row[2]
-                        credit_balance = row[3]
-
-                        # 从临时表中获取序时账的金额
-                        cursor.execute('''
-                            SELECT 序时账借方金额, 序时账贷方金额
-                            FROM temp_journal_summary
-                            WHERE 科目编码 = ?
-                        ''', (subject_code,))
-                        journal_row = cursor.fetchone()
-                        journal_debit, journal_credit = journal_row if journal_row else (0, 0)
-
-                        # 计算差异
-                        debit_diff = debit_balance - journal_debit
-                        credit_diff = credit_balance - journal_credit
-                        total_diff = debit_diff + credit_diff
-
-                        if abs(total_diff) > 1e-3:  # 浮点数精度问题
-                            discrepancies.append((subject_code, subject_name, total_diff))
-
-                    # 检查是否有差异
-                    if not discrepancies:
-                        messagebox.showinfo("成功", "科目余额表与序时账金额核对一致！")
-                    else:
-                        # 显示差异信息
-                        discrepancy_message = "以下科目余额表与序时账金额不一致：\n\n"
-                        for subject_code, subject_name, diff in discrepancies:
-                            discrepancy_message += f"科目编码: {subject_code}, 科目名称: {subject_name}, 差异金额: {diff:.2f}\n"
-                        messagebox.showerror("错误", discrepancy_message)
-
-                    # 删除临时表
-                    cursor.execute("DROP TABLE temp_journal_summary")
-
-            except Exception as e:
-                messagebox.showerror("错误", f"数据校验时出错: {e}")
-            finally:
-                # 关闭进度条窗口
-                progress_window.destroy()
+        def on_done(discrepancies):
+            # 关闭进度条窗口
+            progress_window.destroy()
 
-        # 启动线程
-        threading.Thread(target=validate_data).start()
+            if discrepancies is None:
+                messagebox.showerror("错误", "数据库中没有找到序时账或科目余额表！")
+            # 检查是否有差异
+            elif discrepancies.empty:
+                messagebox.showinfo("成功", "科目余额表与序时账金额核对一致！")
+            else:
+                # 在表格窗口中显示差异明细
+                self.show_validation_result(discrepancies)
 
-    def update_treeview(self, tree, df):
+        def on_error(e):
+            progress_window.destroy()
+            messagebox.showerror("错误", f"数据校验时出错: {e}")
+
+        # 创建进度条窗口（可取消校验）；校验为一条 SQL，进度条以不确定模式滚动并显示耗时
+        progress_window, progress_bar, timer_label = self.create_progress_window(
+            "数据校验", on_cancel=lambda: token.cancel()
+        )
+        progress = self.progress_reporter(progress_window, progress_bar, timer_label)
+        token = self.traced_submit(
+            "validation", validate_job, on_done=on_done, on_error=on_error, group="validation", render=False
+        )
+
+    def show_validation_result(self, discrepancies):
         """
-        更新 Treeview 中的数据
-        :param tree: Treeview 控件
+        在新窗口中以表格显示数据校验的差异明细
+        :param discrepancies: 差异明细（DataFrame）
+        """
+        # 按差异类型汇总差异科目数
+        counts = discrepancies["差异类型"].value_counts()
+        summary = "，".join(f"{kind} {count} 个" for kind, count in counts.items())
+        self.show_table_window(
+            "数据校验结果",
+            f"以下 {len(discrepancies)} 个科目余额表与序时账金额不一致（{summary}）：",
+            discrepancies,
+            geometry="1000x500",
+        )
+
+    def show_table_window(self, title, heading, df, geometry="800x400"):
+        """
+        在新窗口中以表格显示数据
+        :param title: 窗口标题
+        :param heading: 表格上方的说明文字
         :param df: 要显示的数据（Pandas DataFrame）
+        :param geometry: 窗口大小
         """
-        # 清空 Treeview
-        for item in tree.get_children():
-            tree.delete(item)
+        result_window = tk.Toplevel(self.root)
+        result_window.title(title)
+        result_window.geometry(geometry)
 
-        # 插入数据
-        for _, row in df.iterrows():
-            tree.insert("", "end", values=list(row))
+        ttk.Label(result_window, text=heading).pack(anchor=tk.W, padx=10, pady=5)
+
+        frame = ttk.Frame(result_window)
+        frame.pack(fill=tk.BOTH, expand=True)
+        grid = VirtualGrid(frame, columns=list(df.columns))
+        grid.set_dataframe(df)
+
+        # 主窗口的快捷键不作用于新窗口，单独绑定复制
+        result_window.bind("<Control-c>", lambda event: self.copy_selection(grid))
+
+    def show_monthly_summary(self):
+        """
+        显示月度汇总：在科目余额表中选中科目时汇总该科目及其全部下级科目，否则汇总全部科目
+        """
+        subject_code = None
+        if self.notebook.tab(self.notebook.select(), "text") == "科目余额表":
+            selected_values = self.trees["科目余额表"].selected_values()
+            if selected_values:
+                subject_code = str(selected_values[0][0]).strip() or None
+
+        def summary_job(token):
+            with token.bind(self.db.reader()) as conn:
+                if not period_summary_ready(conn):
+                    return None
+                return monthly_summary(conn, prefix_range(subject_code) if subject_code else None)
+
+        def on_done(df):
+            if df is None or df.empty:
+                messagebox.showinfo("提示", "没有可汇总的序时账数据！")
+                return
+            scope = f"科目 {subject_code}（含下级科目）" if subject_code else "全部科目"
+            self.show_table_window(
+                "月度汇总", f"{scope}的月度发生额（凭证数按科目分别计数后相加）：", df
+            )
+
+        self.jobs.submit(
+            summary_job,
+            on_done=on_done,
+            on_error=lambda e: messagebox.showerror("错误", f"月度汇总时出错: {e}"),
+            group="monthly_summary",
+        )
+
+    def update_treeview(self, tree, df):
+        """
+        更新表格中的数据（只渲染可见行）
+        :param tree: VirtualGrid 表格
+        :param df: 要显示的数据（Pandas DataFrame）
+        """
+        tree.set_dataframe(df)
 
     def apply_filter_from_entry(self, tree, col, entry):
         """
@@ -801,6 +1347,20 @@ class ExcelLikeApp:
         # 获取当前表格的中文名称
         sheet_name = self.notebook.tab(self.notebook.select(), "text")
 
+        # 即时筛选：回车时不再等待，立即查询
+        if self.live_filter_enabled.get() and sheet_name in DB_SHEETS:
+            self.schedule_live_filter(sheet_name, immediate=True)
+            return
+
+        # 组合筛选：序时账、科目余额表的全部筛选框一起编译为一条 SQL
+        if self.compound_filter_enabled.get() and sheet_name in DB_SHEETS:
+            criteria = self.filter_criteria(sheet_name)
+            if not criteria:
+                messagebox.showwarning("警告", "请输入筛选条件！")
+                return
+            self.apply_compound_filter(tree, sheet_name, criteria)
+            return
+
         # 获取输入框的内容
         filter_text = entry.get().strip()
 
@@ -809,10 +1369,7 @@ class ExcelLikeApp:
             return
 
         # 检查当前表的筛选缓存
-        if (
-                self.filter_states[sheet_name]["filtered_data_cache"] is None
-                or self.filter_states[sheet_name]["filtered_data_cache"].empty
-        ):
+        if self.filter_states[sheet_name]["filter"].is_empty():
             # 如果是第一次筛选，从数据库中加载数据
             self.apply_first_filter(tree, col, filter_text)
         else:
@@ -827,18 +1384,14 @@ class ExcelLikeApp:
             # 获取当前表格的中文名称
             sheet_name = self.notebook.tab(self.notebook.select(), "text")
 
-            # 检查当前表的筛选历史记录
-            if len(self.filter_states[sheet_name]["filter_history"]) <= 1:
+            # 恢复到上一次的筛选结果（弹出当前筛选结果的行号）
+            filter_state = self.filter_states[sheet_name]["filter"]
+            if not filter_state.pop():
                 messagebox.showwarning("警告", "没有可恢复的筛选记录！")
                 return
 
-            # 恢复到上一次的筛选结果
-            self.filter_states[sheet_name]["filtered_data_cache"] = self.filter_states[sheet_name]["filter_history"][
-                -2]  # 使用倒数第二条记录
-            self.filter_states[sheet_name]["filter_history"].pop()  # 移除当前筛选结果
-
-            # 更新 Treeview
-            self.update_treeview(self.trees[sheet_name], self.filter_states[sheet_name]["filtered_data_cache"])
+            # 更新表格
+            self.trees[sheet_name].set_source(filter_state.source())
 
         except Exception as e:
             messagebox.showerror("错误", f"恢复上一次筛选时出错: {e}")
@@ -854,28 +1407,10 @@ class ExcelLikeApp:
                 raise ValueError("未找到当前选中的选项卡！")
 
             # 清空当前 sheet 的筛选缓存和历史记录
-            self.filter_states[sheet_name]["filtered_data_cache"] = None
-            self.filter_states[sheet_name]["filter_history"] = []
-
-            # 根据表格类型加载数据
-            if sheet_name == "序时账":
-                # 序时账加载前 100 行
-                self.load_from_db(sheet_name, limit=100, offset=0)
-            elif sheet_name == "科目余额表":
-                # 科目余额表全量加载
-                self.load_from_db(sheet_name)
-            else:
-                # 其他表格（如凭证）全量加载
-                self.load_from_db(sheet_name)
-
-            # 更新 Treeview
-            tree = self.trees[sheet_name]
-            for item in tree.get_children():
-                tree.delete(item)
+            self.filter_states[sheet_name]["filter"].clear()
 
-            # 插入原始数据
-            for _, row in self.sheets[sheet_name].iterrows():
-                tree.insert("", "end", values=list(row))
+            # 根据表格类型加载数据（load_from_db 会同时更新表格）
+            self.reload_sheet(sheet_name)
 
             # 更新筛选框
             self.update_filter_entries(sheet_name)
@@ -883,12 +1418,148 @@ class ExcelLikeApp:
         except Exception as e:
             messagebox.showerror("错误", f"清空筛选时出错: {e}")
 
+    def reload_sheet(self, sheet_name):
+        """
+        重新显示未筛选的表格
+        :param sheet_name: 表名
+        """
+        if sheet_name == "序时账":
+            # 序时账加载第一页
+            self.load_from_db(sheet_name, limit=JOURNAL_PAGE_SIZE, offset=0)
+        elif sheet_name == "科目余额表":
+            # 科目余额表全量加载
+            self.load_from_db(sheet_name)
+        else:
+            # 其他表格（如凭证）显示缓存中的数据
+            self.update_treeview(self.trees[sheet_name], self.sheets[sheet_name])
+
+    def filter_criteria(self, sheet_name):
+        """
+        当前表全部非空筛选框的内容
+        :return: {列名: 筛选条件}
+        """
+        criteria = {}
+        for col, entry in self.filter_states[sheet_name]["filter_entries"].items():
+            text = entry.get().strip()
+            if text:
+                criteria[col] = text
+        return criteria
+
+    def on_filter_key(self, sheet_name):
+        """
+        筛选框中按键后调用：启用即时筛选时安排查询
+        """
+        if self.live_filter_enabled.get() and sheet_name in DB_SHEETS:
+            self.schedule_live_filter(sheet_name)
+
+    def schedule_live_filter(self, sheet_name, immediate=False):
+        """
+        即时筛选：筛选条件变化后，等待 FILTER_DEBOUNCE_MS 毫秒内没有新的输入再查询；
+        条件再次变化时，尚未完成的旧查询立即中断（Connection.interrupt）
+        :param sheet_name: 表名
+        :param immediate: 是否立即查询（回车）
+        """
+        live = self.live_filters.setdefault(sheet_name, {"after": None, "token": None, "criteria": None})
+        criteria = self.filter_criteria(sheet_name)
+        if criteria == live["criteria"] and not immediate:
+            return  # 按键没有改变筛选条件（如方向键）
+        self.cancel_live_filter(sheet_name)
+        live["criteria"] = criteria
+        if immediate:
+            self.run_live_filter(sheet_name)
+        else:
+            live["after"] = self.root.after(FILTER_DEBOUNCE_MS, lambda: self.run_live_filter(sheet_name))
+
+    def cancel_live_filter(self, sheet_name):
+        """
+        取消等待中和执行中的即时筛选
+        """
+        live = self.live_filters.get(sheet_name)
+        if live is None:
+            return
+        if live["after"] is not None:
+            self.root.after_cancel(live["after"])
+            live["after"] = None
+        if live["token"] is not None:
+            live["token"].cancel()
+            live["token"] = None
+
+    def run_live_filter(self, sheet_name):
+        """
+        执行即时筛选：在工作线程中按组合筛选查询，前 LIVE_FILTER_FIRST_ROWS 行读到后立即显示，
+        其余的行读完后再显示全部结果和匹配行数。结果作为新的第一次筛选
+        :param sheet_name: 表名
+        """
+        live = self.live_filters[sheet_name]
+        live["after"] = None
+        criteria = live["criteria"]
+        tree = self.trees[sheet_name]
+        filter_state = self.filter_states[sheet_name]["filter"]
+
+        if not criteria:
+            # 筛选框已全部清空：恢复未筛选的表格
+            filter_state.clear()
+            self.filter_status.config(text="")
+            self.reload_sheet(sheet_name)
+            return
+
+        table_name = self.table_name_mapping[sheet_name]
+        columns = self.sheets[sheet_name].columns
+        start_time = time.perf_counter()
+
+        def elapsed_ms():
+            return (time.perf_counter() - start_time) * 1000
+
+        def show_first(df):
+            # 在主线程中先显示前几行（查询已被新的输入取代时忽略）
+            if live["token"] is not token:
+                return
+            tree.set_dataframe(df)
+            if len(df) >= LIVE_FILTER_FIRST_ROWS:
+                self.filter_status.config(text=f"已显示前 {len(df)} 行，正在统计…（{elapsed_ms():.0f} 毫秒）")
+
+        def filter_job(token):
+            with token.bind(self.db.reader()) as conn:
+                filtered_df = compound_filter(
+                    conn, table_name, criteria, LIVE_FILTER_FIRST_ROWS, lambda df: self.jobs.post(show_first, df)
+                )
+            if not filtered_df.empty:
+                with phase("frame"):
+                    return encode_categories(filtered_df)
+            return pd.DataFrame(columns=columns)
+
+        def on_done(filtered_df):
+            live["token"] = None
+            filter_state.reset(filtered_df)
+            tree.set_dataframe(filter_state.base, keep_position=True)  # 保留已显示的前几行的滚动位置
+            self.filter_status.config(text=f"共 {len(filtered_df)} 行（{elapsed_ms():.0f} 毫秒）")
+
+        def on_error(e):
+            # 输入过程中的条件可能不完整（如 2023-1），只在状态栏提示，不弹出对话框
+            live["token"] = None
+            self.filter_status.config(text=f"筛选条件有误：{e}")
+
+        token = self.traced_submit(
+            "live_filter",
+            filter_job,
+            on_done=on_done,
+            on_error=on_error,
+            group=f"filter:{sheet_name}",
+            table=table_name, criteria=criteria,
+        )
+        live["token"] = token
+
     def update_filter_entries(self, sheet_name, filtered_df=None):
         """
         更新筛选框（仅保留输入框筛选）
         :param sheet_name: 表名（例如 "序时账" 或 "科目余额表"）
         :param filtered_df: 筛选后的数据（可选）
         """
+        # 筛选框重建后，旧筛选框的即时筛选不再有效
+        self.cancel_live_filter(sheet_name)
+        self.live_filters.pop(sheet_name, None)
+        self.filter_status.config(text="")
+
         # 清空筛选框容器
         filter_frame = self.filter_frames[sheet_name]
         for widget in filter_frame.winfo_children():
@@ -901,6 +1572,7 @@ class ExcelLikeApp:
             df = filtered_df
 
         # 使用 grid 布局来排列筛选框
+        filter_entries = {}
         for col_idx, col in enumerate(df.columns):
             # 创建输入框（文字筛选框）
             filter_entry = ttk.Entry(filter_frame)
@@ -910,16 +1582,20 @@ class ExcelLikeApp:
             filter_entry.bind("<Return>", lambda event, c=col, e=filter_entry: self.apply_filter_from_entry(
                 self.trees[sheet_name], c, e))
 
+            # 绑定输入框的按键事件（即时筛选）
+            filter_entry.bind("<KeyRelease>", lambda event: self.on_filter_key(sheet_name))
+
             # 设置列权重，使筛选框自适应宽度
             filter_frame.columnconfigure(col_idx, weight=1)
+            filter_entries[col] = filter_entry
 
         # 保存筛选框的输入框到当前表的筛选状态
-        self.filter_states[sheet_name]["filter_entries"] = {col: filter_entry for col_idx, col in enumerate(df.columns)}
+        self.filter_states[sheet_name]["filter_entries"] = filter_entries
 
     def apply_first_filter(self, tree, col, filter_text):
         """
-        第一次筛选（从数据库中加载数据）
-        :param tree: Treeview 控件
+        第一次筛选（在工作线程中从数据库中加载数据；同一表格的新筛选会取消尚未完成的旧筛选）
+        :param tree: VirtualGrid 表格
         :param col: 列名
         :param filter_text: 筛选条件
         """
@@ -930,123 +1606,176 @@ class ExcelLikeApp:
             messagebox.showerror("错误", f"未找到表名映射：{sheet_name}")
             return
 
-        # 使用 SQL 进行指定列的筛选
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-
-            # 构建 SQL 查询
-            query = f"SELECT * FROM {table_name} WHERE {col} LIKE ?"
-            cursor.execute(query, (f"%{filter_text}%",))  # 使用 LIKE 进行模糊匹配
-            filtered_data = cursor.fetchall()
-
         # 获取列名
         columns = self.sheets[sheet_name].columns
+        filter_state = self.filter_states[sheet_name]["filter"]
+
+        if sheet_name == "序时账" and self.columnar_active():
+            from columnar import ColumnarFrame
+
+            # 列式引擎：在内存映射的序时账上筛选，只记录命中行的行号
+            def columnar_filter_job(token):
+                frame = ColumnarFrame(self.columnar.open())
+                return frame, frame.contains_positions(col, filter_text)
+
+            def on_columnar_done(result):
+                frame, positions = result
+                filter_state.reset(frame, first=positions)
+                tree.set_source(filter_state.source())
+
+            self.traced_submit(
+                "first_filter",
+                columnar_filter_job,
+                on_done=on_columnar_done,
+                on_error=lambda e: messagebox.showerror("错误", f"筛选时出错: {e}"),
+                group=f"filter:{sheet_name}",
+                table=table_name, column=col, text=filter_text, engine="columnar",
+            )
+            return
 
-        # 将筛选结果转换为 Pandas DataFrame
-        if filtered_data:
-            filtered_df = pd.DataFrame(filtered_data, columns=columns)
-        else:
-            filtered_df = pd.DataFrame(columns=columns)
-
-        # 保存筛选结果到当前表的筛选状态
-        self.filter_states[sheet_name]["filtered_data_cache"] = filtered_df
-        self.filter_states[sheet_name]["filter_history"].append(filtered_df.copy())  # 将结果添加到历史记录
+        def filter_job(token):
+            # 使用 SQL 进行指定列的筛选（序时账的文本列优先使用全文索引，否则使用 LIKE 进行模糊匹配）
+            with token.bind(self.db.reader()) as conn:
+                filtered_df = filter_rows(conn, table_name, col, filter_text)
+
+            # 重复值较多的文本列按字典编码保存，供后续筛选使用
+            if not filtered_df.empty:
+                with phase("frame"):
+                    return encode_categories(filtered_df)
+            return pd.DataFrame(columns=columns)
+
+        def on_done(filtered_df):
+            # 第一次筛选的结果作为当前表筛选状态的基础数据
+            filter_state.reset(filtered_df)
+
+            # 更新表格
+            self.update_treeview(tree, filter_state.base)
+
+        self.traced_submit(
+            "first_filter",
+            filter_job,
+            on_done=on_done,
+            on_error=lambda e: messagebox.showerror("错误", f"筛选时出错: {e}"),
+            group=f"filter:{sheet_name}",
+            table=table_name, column=col, text=filter_text,
+        )
 
-        # 更新 Treeview
-        self.update_treeview(tree, filtered_df)
+    def apply_compound_filter(self, tree, sheet_name, criteria):
+        """
+        组合筛选（在工作线程中执行一条 SQL，只读取同时满足全部条件的行；列式引擎启用时同样查询数据库）。
+        结果作为新的第一次筛选，之后仍可在结果中逐次筛选
+        :param tree: VirtualGrid 表格
+        :param sheet_name: 表名（"序时账" 或 "科目余额表"）
+        :param criteria: {列名: 筛选框中的文本}
+        """
+        table_name = self.table_name_mapping[sheet_name]
+        columns = self.sheets[sheet_name].columns
+        filter_state = self.filter_states[sheet_name]["filter"]
+
+        def filter_job(token):
+            with token.bind(self.db.reader()) as conn:
+                filtered_df = compound_filter(conn, table_name, criteria)
+
+            # 重复值较多的文本列按字典编码保存，供后续筛选使用
+            if not filtered_df.empty:
+                with phase("frame"):
+                    return encode_categories(filtered_df)
+            return pd.DataFrame(columns=columns)
+
+        def on_done(filtered_df):
+            filter_state.reset(filtered_df)
+            self.update_treeview(tree, filter_state.base)
+
+        self.traced_submit(
+            "compound_filter",
+            filter_job,
+            on_done=on_done,
+            on_error=lambda e: messagebox.showerror("错误", f"筛选时出错: {e}"),
+            group=f"filter:{sheet_name}",
+            table=table_name, criteria=criteria,
+        )
 
     def apply_nth_filter(self, tree, col, filter_text):
         """
-        第 N 次筛选（在内存中进行）
-        :param tree: Treeview 控件
+        第 N 次筛选（在工作线程中基于内存中的缓存进行）
+        :param tree: VirtualGrid 表格
         :param col: 列名
         :param filter_text: 筛选条件
         """
         # 获取当前表格的中文名称
         sheet_name = self.notebook.tab(self.notebook.select(), "text")
+        filter_state = self.filter_states[sheet_name]["filter"]
 
         # 检查当前表的筛选缓存
-        if (
-                self.filter_states[sheet_name]["filtered_data_cache"] is None
-                or self.filter_states[sheet_name]["filtered_data_cache"].empty
-        ):
+        if filter_state.is_empty():
             messagebox.showwarning("警告", "请先进行第一次筛选！")
             return
 
         # 确保列名存在
-        if col not in self.filter_states[sheet_name]["filtered_data_cache"].columns:
+        if col not in filter_state.base.columns:
             messagebox.showerror("错误", f"列名 '{col}' 不存在！")
             return
 
-        # 将指定列转换为字符串类型
-        self.filter_states[sheet_name]["filtered_data_cache"][col] = \
-        self.filter_states[sheet_name]["filtered_data_cache"][col].astype(str)
-
-        # 在内存中进行筛选
-        try:
-            filtered_df = self.filter_states[sheet_name]["filtered_data_cache"][
-                self.filter_states[sheet_name]["filtered_data_cache"][col].str.contains(filter_text, case=False,
-                                                                                        na=False)
-            ]
-        except Exception as e:
-            messagebox.showerror("错误", f"筛选时出错: {e}")
-            return
-
-        # 保存筛选结果到当前表的筛选状态
-        self.filter_states[sheet_name]["filtered_data_cache"] = filtered_df
-        self.filter_states[sheet_name]["filter_history"].append(filtered_df.copy())  # 将结果添加到历史记录
-
-        # 更新 Treeview
-        self.update_treeview(tree, filtered_df)
+        def filter_job(token):
+            # 在当前筛选结果中进行筛选，只返回命中行的行号（不修改筛选状态）
+            with phase("frame"):
+                return filter_state.narrow(col, filter_text)
+
+        def on_done(positions):
+            # 只记录命中行的行号，基础数据不复制
+            filter_state.push(positions)
+
+            # 更新表格
+            tree.set_source(filter_state.source())
+
+        self.traced_submit(
+            "nth_filter",
+            filter_job,
+            on_done=on_done,
+            on_error=lambda e: messagebox.showerror("错误", f"筛选时出错: {e}"),
+            group=f"filter:{sheet_name}",
+            sheet=sheet_name, column=col, text=filter_text,
+        )
 
     def show_detail_journal(self, event):
         """
-        在科目余额表右键时，从数据库中筛选出与选中科目相关的序时账数据，并显示在序时账 Treeview 中。
+        在科目余额表右键时，从数据库中筛选出与选中科目（含全部下级科目）相关的序时账数据，并显示在序时账表格中。
         """
-        try:
+        # 获取选中的行
+        selected_values = self.trees["科目余额表"].selected_values()
+        if not selected_values:
+            return
 
-            # 获取选中的行
-            selected_item = self.trees["科目余额表"].selection()
-            if not selected_item:
-                return
+        # 获取科目编码
+        item_values = selected_values[0]
+        subject_code = str(item_values[0]).strip()  # 将科目编码转换为字符串并去除空格
 
-            # 获取科目编码
-            item_values = self.trees["科目余额表"].item(selected_item, "values")
-            subject_code = str(item_values[0]).strip()  # 将科目编码转换为字符串并去除空格
+        if not subject_code:
+            messagebox.showwarning("警告", "未选中有效的科目编码！")
+            return
 
-            if not subject_code:
-                messagebox.showwarning("警告", "未选中有效的科目编码！")
-                return
+        columnar = self.columnar_active()
 
-            # 使用 SQL 查询从数据库中筛选数据
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
+        def detail_job(token):
+            with token.bind(self.db.reader()) as conn:
+                if columnar:
+                    from columnar import ColumnarSource, prefix_positions
 
-                # 构建 SQL 查询
-                query = '''
-                    SELECT * FROM journal
-                    WHERE 科目编码 = ?
-                '''
-                cursor.execute(query, (subject_code,))
-                filtered_data = cursor.fetchall()
+                    # 列式引擎：在内存映射的序时账上按科目编码前缀匹配，只显示命中行
+                    table = self.columnar.open()
+                    return ColumnarSource(table, prefix_positions(table, "科目编码", subject_code))
 
+                # 使用 SQL 查询从数据库中筛选该科目及其全部下级科目的分录（科目编码索引上的范围扫描）
+                return DataFrameSource(account_lines(conn, subject_code))
+
+        def on_done(source):
             # 检查是否有匹配的数据
-            if not filtered_data:
+            if len(source) == 0:
                 messagebox.showinfo("提示", f"未找到科目编码为 {subject_code} 的明细账！")
                 return
 
-            # 将筛选结果转换为 Pandas DataFrame
-            columns = ["日期", "凭证字号", "科目编码", "科目名称", "辅助核算", "摘要", "借方", "贷方", "数量", "外币"]
-            filtered_df = pd.DataFrame(filtered_data, columns=columns)
-
-            # 清空当前序时账 Treeview
-            tree = self.trees["序时账"]
-            for item in tree.get_children():
-                tree.delete(item)
-
-            # 插入筛选后的数据
-            for _, row in filtered_df.iterrows():
-                tree.insert("", "end", values=list(row))
+            # 在序时账表格中显示筛选后的数据
+            self.trees["序时账"].set_source(source)
 
             # 切换到序时账选项卡
             self.notebook.select(self.trees["序时账"].master)
@@ -1054,114 +1783,149 @@ class ExcelLikeApp:
             # 标记为已筛选状态
             self.is_filtered = True
 
-        except Exception as e:
-            messagebox.showerror("错误", f"显示明细账时出错: {e}")
+        self.traced_submit(
+            "drilldown",
+            detail_job,
+            on_done=on_done,
+            on_error=lambda e: messagebox.showerror("错误", f"显示明细账时出错: {e}"),
+            group="drilldown:序时账",
+            account=subject_code, engine="columnar" if columnar else "sqlite",
+        )
 
     def show_voucher_details(self, event):
         """
         在序时账右键时，根据选中的凭证编号，从数据库中筛选出相同凭证编号的记录，
         并将结果交给 Pandas 处理，放入凭证 Sheet 中。
         """
-        try:
-            # 获取选中的行
-            selected_item = self.trees["序时账"].selection()
-            if not selected_item:
-                return
+        # 获取选中的行
+        selected_values = self.trees["序时账"].selected_values()
+        if not selected_values:
+            return
 
-            # 获取选中行的数据
-            item_values = self.trees["序时账"].item(selected_item, "values")
-            selected_voucher = item_values[1]  # 凭证字号
-            selected_date = item_values[0]  # 日期
+        # 获取选中行的数据
+        item_values = selected_values[0]
+        selected_voucher = item_values[1]  # 凭证字号
+        selected_date = item_values[0]  # 日期
 
-            # 检查凭证字号和日期是否为空
-            if not selected_voucher or not selected_date:
-                messagebox.showwarning("警告", "未选中有效的凭证！")
-                return
+        # 检查凭证字号和日期是否为空
+        if not selected_voucher or not selected_date:
+            messagebox.showwarning("警告", "未选中有效的凭证！")
+            return
 
-            # 使用 SQL 查询从数据库中筛选数据
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
+        self.open_voucher((selected_voucher, selected_date))
 
-                # 构建 SQL 查询
-                query = '''
-                    SELECT * FROM journal
-                    WHERE 凭证字号 = ? AND 日期 = ?
-                '''
-                cursor.execute(query, (selected_voucher, selected_date))
-                filtered_data = cursor.fetchall()
+    def load_voucher(self, key, columnar, token=None):
+        """
+        读取并组装凭证（在工作线程中调用）
+        :param key: (凭证字号, 日期)
+        :param columnar: 是否使用列式引擎（需在主线程中读取）
+        :param token: 取消令牌（可选）
+        :return: Voucher，未找到时为 None
+        """
+        generation = self.voucher_cache.generation
+        if columnar:
+            from columnar import equals_positions, neighbour_voucher, take_rows
+
+            # 列式引擎：在内存映射的序时账上按凭证字号、日期匹配
+            table = self.columnar.open()
+            positions = equals_positions(table, {"凭证字号": key[0], "日期": key[1]})
+            if len(positions) == 0:
+                return None
+            voucher = make_voucher(
+                key, take_rows(table, positions),
+                neighbour_voucher(table, positions, -1), neighbour_voucher(table, positions, 1),
+            )
+        else:
+            conn = self.db.reader()
+            with token.bind(conn) if token is not None else nullcontext(conn):
+                # 使用凭证字号、日期组合索引查询分录及相邻凭证
+                voucher = find_voucher(conn, key)
+            if voucher is None:
+                return None
 
-            # 检查是否有匹配的数据
-            if not filtered_data:
+        self.voucher_cache.put(voucher, generation)
+        return voucher
+
+    def open_voucher(self, key):
+        """
+        显示指定凭证，已缓存的凭证直接显示
+        :param key: (凭证字号, 日期)
+        """
+        voucher = self.voucher_cache.get(key)
+        if voucher is not None:
+            self.display_voucher(voucher)
+            return
+
+        columnar = self.columnar_active()
+
+        def on_done(voucher):
+            if voucher is None:
                 messagebox.showwarning("警告", "未找到符合条件的凭证记录！")
                 return
+            self.display_voucher(voucher)
+
+        self.traced_submit(
+            "voucher",
+            lambda token: self.load_voucher(key, columnar, token),
+            on_done=on_done,
+            on_error=lambda e: messagebox.showerror("错误", f"显示凭证信息时出错: {e}"),
+            group="drilldown:凭证",
+            voucher=str(key[0]), date=str(key[1]), engine="columnar" if columnar else "sqlite",
+        )
 
-            # 将筛选结果转换为 Pandas DataFrame
-            columns = ["日期", "凭证字号", "科目编码", "科目名称", "辅助核算", "摘要", "借方", "贷方", "数量", "外币"]
-            filtered_df = pd.DataFrame(filtered_data, columns=columns)
-
-            # 清空凭证表
-            self.sheets["凭证"] = pd.DataFrame(
-                columns=["日期", "凭证字号", "摘要", "科目名称", "借方", "贷方", "数量", "外币"])
-
-            # 将筛选后的数据插入凭证表
-            new_rows = []
-            for _, row in filtered_df.iterrows():
-                project_name = row.get("科目名称", "").strip()
-                if project_name:
-                    project_name = f"【{project_name}】"
-
-                new_row = {
-                    "日期": pd.to_datetime(row["日期"]),  # 统一为 datetime 类型
-                    "凭证字号": str(row["凭证字号"]),  # 统一为字符串类型
-                    "摘要": str(row["摘要"]),  # 统一为字符串类型
-                    "科目名称": f"{str(row['科目名称'])}{project_name}",  # 统一为字符串类型
-                    "借方": float(row["借方"]) if row["借方"] != 0 else "",  # 统一为浮点数类型
-                    "贷方": float(row["贷方"]) if row["贷方"] != 0 else "",  # 统一为浮点数类型
-                    "数量": row["数量"] if row["数量"] != 0 else "",  # 保持原始值
-                    "外币": row["外币"] if row["外币"] != 0 else ""  # 保持原始值
-                }
-                new_rows.append(new_row)
-
-            # 使用 pd.concat 添加新行
-            if new_rows:
-                self.sheets["凭证"] = pd.concat([self.sheets["凭证"], pd.DataFrame(new_rows)], ignore_index=True)
-
-            # 将 "借方" 和 "贷方" 列中的空字符串替换为 0
-            self.sheets["凭证"]["借方"] = self.sheets["凭证"]["借方"].replace("", 0).astype(float)
-            self.sheets["凭证"]["贷方"] = self.sheets["凭证"]["贷方"].replace("", 0).astype(float)
-
-            # 计算借方和贷方的合计
-            total_debit = self.sheets["凭证"]["借方"].sum()
-            total_credit = self.sheets["凭证"]["贷方"].sum()
-
-            # 添加合计行
-            total_row = {
-                "摘要": "合     计",
-                "借方": total_debit,
-                "贷方": total_credit
-            }
-            self.sheets["凭证"] = pd.concat([self.sheets["凭证"], pd.DataFrame([total_row])], ignore_index=True)
+    def display_voucher(self, voucher):
+        """
+        在凭证表格中显示凭证，并在后台预取上一张、下一张凭证
+        :param voucher: Voucher
+        """
+        self.current_voucher = voucher
+        self.sheets["凭证"] = voucher.table
 
-            # 检查借贷是否平衡
-            if abs(total_debit - total_credit) > 1e-6:  # 浮点数精度问题
-                messagebox.showerror("错误", "数据有误，请检查！详见【凭证】")
+        # 检查借贷是否平衡
+        if not voucher.balanced:
+            messagebox.showerror("错误", "数据有误，请检查！详见【凭证】")
 
-            # 更新凭证 Treeview
-            tree = self.trees["凭证"]
-            for item in tree.get_children():
-                tree.delete(item)
+        # 更新凭证表格
+        self.update_treeview(self.trees["凭证"], self.sheets["凭证"])
 
-            for _, row in self.sheets["凭证"].iterrows():
-                tree.insert("", "end", values=list(row))
+        # 切换到凭证选项卡
+        self.notebook.select(self.trees["凭证"].master)
 
-            # 切换到凭证选项卡
-            self.notebook.select(self.trees["凭证"].master)
+        # 预取相邻凭证，翻阅时可直接从缓存显示
+        columnar = self.columnar_active()
+        for key in (voucher.prev_key, voucher.next_key):
+            if key is not None and key not in self.voucher_cache:
+                self.jobs.submit_background(self.load_voucher, key, columnar)
 
-        except Exception as e:
-            messagebox.showerror("错误", f"显示凭证信息时出错: {e}")
+    def step_voucher(self, step):
+        """
+        翻阅凭证
+        :param step: -1 为上一张，1 为下一张
+        """
+        if self.current_voucher is None:
+            messagebox.showwarning("警告", "请先在序时账中右键查看凭证！")
+            return "break"
+        key = self.current_voucher.prev_key if step < 0 else self.current_voucher.next_key
+        if key is None:
+            messagebox.showinfo("提示", "已经是第一张凭证！" if step < 0 else "已经是最后一张凭证！")
+            return "break"
+        self.open_voucher(key)
+        return "break"
+
+    def invalidate_vouchers(self):
+        """
+        数据库中的序时账变化后清空凭证缓存
+        """
+        self.voucher_cache.clear()
+        self.current_voucher = None
+
+# 导入模块的耗时（冷启动指标的一部分）
+IMPORT_SECONDS = time.perf_counter() - START_TIME
 
 
 if __name__ == "__main__":
+    # 多文件导入使用子进程解析，打包为可执行文件时需要
+    multiprocessing.freeze_support()
     root = tk.Tk()
     root.geometry("800x600")  # 设置初始窗口大小
     app = ExcelLikeApp(root)
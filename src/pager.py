@@ -0,0 +1,150 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Audit-Inspector-Toolkit
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+序时账键集分页：按 rowid 定位下一页（不使用 OFFSET），并在后台工作线程中预取后续页
+"""
+
+import threading
+
+import pandas as pd
+
+from tracing import fetch_all
+
+# 每页行数
+JOURNAL_PAGE_SIZE = 1000
+# 接近已加载数据末尾时，后台预取的页数
+PREFETCH_PAGES = 3
+
+
+class KeysetPager:
+    """
+    键集分页器，同时作为 VirtualGrid 的数据源
+    已加载的页按列表保存，新页直接追加，不复制已加载的数据
+    """
+
+    def __init__(self, db, table_name, columns, page_size=JOURNAL_PAGE_SIZE, prefetch_pages=PREFETCH_PAGES,
+                 executor=None):
+        """
+        :param db: ConnectionManager，每个工作线程使用自己的读连接
+        :param table_name: 数据库表名
+        :param columns: 列名列表
+        :param page_size: 每页行数
+        :param prefetch_pages: 每次后台预取的页数
+        :param executor: JobExecutor，用于后台预取；为 None 时不预取
+        """
+        self.db = db
+        self.table_name = table_name
+        self.columns = list(columns)
+        self.page_size = page_size
+        self.prefetch_pages = prefetch_pages
+        self.executor = executor
+
+        self.pages = []  # 每页为元组列表
+        self.last_rowid = 0  # 已加载的最后一行的 rowid
+        self.exhausted = False  # 是否已读到表尾
+        self.error = None  # 后台预取时的异常
+        self._length = 0
+        self._lock = threading.Lock()  # 同一时间只允许一个线程读取下一页
+        self._prefetch_future = None
+
+    def __len__(self):
+        return self._length
+
+    def rows(self, start, stop):
+        """
+        获取 [start, stop) 范围内已加载的行；读取位置接近末尾时触发后台预取
+        :return: 元组列表
+        """
+        result = self._slice(start, stop)
+        if stop + self.page_size * self.prefetch_pages > self._length:
+            self.prefetch()
+        return result
+
+    def load_next_page(self):
+        """
+        同步加载下一页（用户已滚动到末尾时调用）；若后台正在预取，则等待预取完成
+        :return: 新加载的行（DataFrame）
+        """
+        length = self._length
+        future = self._prefetch_future
+        # 尚未开始的预取直接取消，改为同步读取；已开始的预取等待其完成
+        if future is not None and not future.cancel():
+            future.result()
+
+        if self._length == length and not self.exhausted:
+            with self._lock:
+                self._fetch_page(self.db.reader())
+
+        return self.to_dataframe(length, self._length)
+
+    def prefetch(self):
+        """
+        在后台工作线程中预取后续页
+        """
+        if self.executor is None or self.exhausted or self.error is not None:
+            return
+        if self._prefetch_future is not None and not self._prefetch_future.done():
+            return
+        self._prefetch_future = self.executor.submit_background(self._prefetch_worker)
+
+    def to_dataframe(self, start=0, stop=None):
+        """
+        将已加载的部分行转换为 DataFrame
+        """
+        stop = self._length if stop is None else stop
+        return pd.DataFrame(self._slice(start, stop), columns=self.columns)
+
+    def _slice(self, start, stop):
+        """
+        按页拼接 [start, stop) 范围内已加载的行
+        """
+        stop = min(stop, self._length)
+        result = []
+        if start < stop:
+            for page_index in range(start // self.page_size, (stop - 1) // self.page_size + 1):
+                page_start = page_index * self.page_size
+                result.extend(self.pages[page_index][max(start - page_start, 0):stop - page_start])
+        return result
+
+    def _prefetch_worker(self):
+        """
+        后台预取任务：使用所在工作线程的读连接读取若干页
+        """
+        try:
+            with self._lock:
+                conn = self.db.reader()
+                for _ in range(self.prefetch_pages):
+                    if self.exhausted:
+                        break
+                    self._fetch_page(conn)
+        except Exception as e:
+            self.error = e
+
+    def _fetch_page(self, conn):
+        """
+        读取 rowid 大于已加载最后一行的下一页（调用方需持有 _lock）
+        """
+        query = (
+            f"SELECT rowid, {', '.join(self.columns)} FROM {self.table_name} "
+            f"WHERE rowid > ? ORDER BY rowid LIMIT ?"
+        )
+        rows = fetch_all(conn, query, (self.last_rowid, self.page_size))
+        if len(rows) < self.page_size:
+            self.exhausted = True
+        if rows:
+            self.last_rowid = rows[-1][0]
+            self.pages.append([row[1:] for row in rows])
+            self._length += len(rows)
@@ -0,0 +1,160 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Audit-Inspector-Toolkit
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+进度报告：导入、建立索引、校验、导出等耗时操作在工作线程中按实际处理的行数、字节数报告进度，
+由 ProgressReporter 节流后交给界面（进度条窗口）或命令行显示，包括每秒行数和预计剩余时间
+"""
+
+import time
+from dataclasses import dataclass, field
+
+# 两次进度回调之间的最短间隔（秒）
+PROGRESS_INTERVAL = 0.1
+
+
+@dataclass
+class Progress:
+    """
+    进度快照
+    """
+    stage: str = ""  # 当前阶段（如 "写入序时账"、"建立索引"）
+    rows: int = 0  # 已写入（已处理）的行数
+    rows_read: int = 0  # 已读取的行数（追加导入时包括跳过的行）
+    total_rows: int = None  # 总行数，未知时为 None
+    bytes_done: int = 0  # 已处理的字节数
+    total_bytes: int = None  # 总字节数，未知时为 None
+    stage_seconds: float = 0.0  # 当前阶段的耗时（快照时）
+    started: float = field(default_factory=time.perf_counter)  # 整个操作的开始时间（perf_counter）
+
+    @property
+    def rows_per_sec(self):
+        return self.rows / self.stage_seconds if self.stage_seconds > 0 else 0.0
+
+    @property
+    def fraction(self):
+        """
+        当前阶段的完成比例（0~1）：优先按字节数，其次按行数；总量未知时为 None
+        """
+        if self.total_bytes:
+            return min(self.bytes_done / self.total_bytes, 1.0)
+        if self.total_rows:
+            return min(self.rows_read / self.total_rows, 1.0)
+        return None
+
+    @property
+    def eta(self):
+        """
+        当前阶段的预计剩余秒数，无法估计时为 None
+        """
+        fraction = self.fraction
+        if not fraction or self.stage_seconds <= 0:
+            return None
+        return self.stage_seconds * (1 - fraction) / fraction
+
+    def elapsed(self, now=None):
+        """
+        整个操作的耗时（秒）
+        """
+        return (now or time.perf_counter()) - self.started
+
+    def describe(self, now=None):
+        """
+        进度说明文字
+        """
+        parts = [self.stage] if self.stage else []
+        if self.rows_read or self.rows:
+            total = f" / {self.total_rows}" if self.total_rows else ""
+            if self.rows_read != self.rows:
+                parts.append(f"已读取 {self.rows_read}{total} 行，已写入 {self.rows} 行")
+            else:
+                parts.append(f"已处理 {self.rows}{total} 行")
+            parts.append(f"{self.rows_per_sec:,.0f} 行/秒")
+        if self.total_bytes:
+            parts.append(f"{self.bytes_done / 2 ** 20:,.1f} / {self.total_bytes / 2 ** 20:,.1f} MB")
+        if self.eta is not None:
+            parts.append(f"剩余约 {self.eta:.0f} 秒")
+        parts.append(f"耗时: {self.elapsed(now):.2f} 秒")
+        return "，".join(parts)
+
+
+class ProgressReporter:
+    """
+    进度报告器：工作线程调用 stage / update 报告进度，按最短间隔节流后调用回调（回调参数为 Progress 快照）
+    """
+
+    def __init__(self, on_update=None, min_interval=PROGRESS_INTERVAL):
+        """
+        :param on_update: 进度回调，参数为 Progress（在报告进度的线程中调用）
+        :param min_interval: 两次回调之间的最短间隔（秒）；阶段切换时总是立即回调
+        """
+        self.on_update = on_update
+        self.min_interval = min_interval
+        self.progress = Progress()
+        self._stage_started = self.progress.started
+        self._last_report = 0.0
+
+    def stage(self, name, total_rows=None, total_bytes=None):
+        """
+        开始新的阶段，清零行数和字节数
+        :param name: 阶段说明
+        :param total_rows: 该阶段的总行数（可选）
+        :param total_bytes: 该阶段的总字节数（可选）
+        """
+        self.progress = Progress(
+            stage=name, total_rows=total_rows, total_bytes=total_bytes, started=self.progress.started
+        )
+        self._stage_started = time.perf_counter()
+        self._report(force=True)
+
+    def update(self, rows=None, rows_read=None, bytes_done=None, total_rows=None, total_bytes=None):
+        """
+        更新当前阶段的进度（参数均为累计值，为 None 的保持不变）
+        :param rows: 已写入的行数；未提供 rows_read 时同时作为已读取的行数
+        :param rows_read: 已读取的行数
+        :param bytes_done: 已处理的字节数
+        :param total_rows: 总行数
+        :param total_bytes: 总字节数
+        """
+        progress = self.progress
+        if rows is not None:
+            progress.rows = rows
+            progress.rows_read = max(progress.rows_read, rows) if rows_read is None else rows_read
+        elif rows_read is not None:
+            progress.rows_read = rows_read
+        if bytes_done is not None:
+            progress.bytes_done = bytes_done
+        if total_rows is not None:
+            progress.total_rows = total_rows
+        if total_bytes is not None:
+            progress.total_bytes = total_bytes
+        self._report()
+
+    def _report(self, force=False):
+        now = time.perf_counter()
+        self.progress.stage_seconds = now - self._stage_started
+        if self.on_update is None or (not force and now - self._last_report < self.min_interval):
+            return
+        self._last_report = now
+        # 回调可能在其他线程中使用快照，传入副本
+        self.on_update(Progress(**vars(self.progress)))
+
+
+def report(progress, **values):
+    """
+    向可选的进度报告器报告进度（progress 为 None 时忽略）
+    """
+    if progress is not None:
+        progress.update(**values)
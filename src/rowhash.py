@@ -0,0 +1,145 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Audit-Inspector-Toolkit
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+序时账行哈希：按块（向量化）计算每行内容的 64 位哈希，保存在有索引的行哈希列中，追加导入时据此跳过已导入的行。
+同一文件中内容完全相同的行（如同一凭证中金额、摘要相同的两条分录）按出现次序区分，
+因此重复导入同一文件或有重叠的文件不会产生重复行，而文件中本来就重复的行也不会被误删
+"""
+
+import math
+
+import numpy as np
+import pandas as pd
+
+from indexes import build_indexes, column_names
+from progress import report
+from schema import HIDDEN_COLUMNS, JOURNAL_SELECT, ROW_HASH_COLUMN, numeric_columns, table_columns
+
+# 补算行哈希时每批处理的行数
+BACKFILL_BATCH_ROWS = 100_000
+
+
+def has_row_hash(table_name):
+    """
+    数据表是否保存行哈希
+    """
+    return any(col == ROW_HASH_COLUMN for col, _ in HIDDEN_COLUMNS.get(table_name, []))
+
+
+def text_value(value):
+    """
+    将文本列中的值转换为文本（与 ingest.coerce_chunk 一致）：旧版本以 to_sql 导入的数据库中，
+    科目编码等列可能保存为整数（1122）或浮点数（1122.0），转换后与从文件读取的 "1122" 相同
+    """
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, float):
+        if math.isnan(value):
+            return None
+        if value.is_integer():
+            return str(int(value))
+    return str(value)
+
+
+def content_hashes(values, table_name):
+    """
+    计算每行内容的哈希（不含出现次序）
+    :param values: 按表结构顺序排列的列值列表（由 ingest.coerce_chunk 转换，或从数据库读出）
+    :param table_name: 数据库表名
+    :return: uint64 数组
+    """
+    numeric = set(numeric_columns(table_name))
+    # 按表结构的类型转换：数值列统一为 float64、文本列统一为文本，使文件中读取的值与数据库中读出的值哈希一致
+    frame = pd.DataFrame({
+        col: (
+            pd.to_numeric(pd.Series(column, dtype=object), errors="coerce").astype("float64")
+            if col in numeric else pd.Series([text_value(value) for value in column], dtype=object)
+        )
+        for col, column in zip(table_columns(table_name), values)
+    })
+    return pd.util.hash_pandas_object(frame, index=False).to_numpy()
+
+
+class RowHasher:
+    """
+    计算一个文件（或一张已有的表）中各行的行哈希：内容哈希与该内容在文件中的出现次序合并
+    各块须按文件中的顺序依次传入
+    """
+
+    def __init__(self, table_name):
+        """
+        :param table_name: 数据库表名
+        """
+        self.table_name = table_name
+        self.counts = pd.Series(dtype=np.int64)  # 内容哈希 -> 之前各块中的出现次数
+
+    def __call__(self, values):
+        """
+        :param values: 按表结构顺序排列的列值列表
+        :return: 行哈希列表（SQLite 的 INTEGER 为有符号 64 位整数）
+        """
+        hashes = pd.Series(content_hashes(values, self.table_name))
+        occurrence = hashes.groupby(hashes).cumcount().to_numpy(dtype=np.int64)
+        if len(self.counts):
+            occurrence = occurrence + hashes.map(self.counts).fillna(0).to_numpy(dtype=np.int64)
+        self.counts = self.counts.add(hashes.value_counts(), fill_value=0).astype(np.int64)
+
+        combined = pd.util.hash_pandas_object(
+            pd.DataFrame({"hash": hashes.to_numpy(), "occurrence": occurrence}), index=False
+        )
+        return combined.to_numpy().view(np.int64).tolist()
+
+
+def ensure_row_hashes(conn, token=None, progress=None, batch_rows=BACKFILL_BATCH_ROWS):
+    """
+    追加导入前确保已有的序时账都有行哈希：旧版本的数据库先补充行哈希列，再按 rowid 顺序补算缺失的行哈希，
+    最后建立行哈希索引
+    :param conn: sqlite3 连接（需可写）
+    :param token: 取消令牌（可选），每批之间检查
+    :param progress: 进度报告器（ProgressReporter，可选），报告已补算的行数
+    :param batch_rows: 每批行数
+    :return: 补算的行数
+    """
+    if ROW_HASH_COLUMN not in column_names(conn, "journal"):
+        conn.execute(f"ALTER TABLE journal ADD COLUMN {ROW_HASH_COLUMN} INTEGER")
+        conn.commit()
+
+    hasher = RowHasher("journal")
+    last_rowid = 0
+    filled = 0
+    missing = conn.execute(f"SELECT COUNT(*) FROM journal WHERE {ROW_HASH_COLUMN} IS NULL").fetchone()[0]
+    report(progress, rows=0, total_rows=missing)
+    while True:
+        if token is not None:
+            token.raise_if_cancelled()
+        rows = conn.execute(
+            f"SELECT rowid, {JOURNAL_SELECT} FROM journal "
+            f"WHERE rowid > ? AND {ROW_HASH_COLUMN} IS NULL ORDER BY rowid LIMIT ?",
+            (last_rowid, batch_rows),
+        ).fetchall()
+        if not rows:
+            break
+        rowids, *values = (list(column) for column in zip(*rows))
+        conn.executemany(
+            f"UPDATE journal SET {ROW_HASH_COLUMN} = ? WHERE rowid = ?", zip(hasher(values), rowids)
+        )
+        conn.commit()
+        last_rowid = rowids[-1]
+        filled += len(rows)
+        report(progress, rows=filled)
+
+    build_indexes(conn, "journal")
+    return filled
@@ -0,0 +1,97 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Audit-Inspector-Toolkit
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+数据库表结构定义（序时账、科目余额表）
+"""
+
+# 各数据表的列名及 SQLite 类型，顺序即文件标题行的顺序
+TABLE_SCHEMAS = {
+    "journal": [
+        ("日期", "TEXT"),
+        ("凭证字号", "TEXT"),
+        ("科目编码", "TEXT"),
+        ("科目名称", "TEXT"),
+        ("辅助核算", "TEXT"),
+        ("摘要", "TEXT"),
+        ("借方", "REAL"),
+        ("贷方", "REAL"),
+        ("数量", "REAL"),
+        ("外币", "REAL"),
+    ],
+    "balance": [
+        ("科目编码", "TEXT"),
+        ("科目名称", "TEXT"),
+        ("期初借方余额", "REAL"),
+        ("期初贷方余额", "REAL"),
+        ("本期借方发生额", "REAL"),
+        ("本期贷方发生额", "REAL"),
+        ("期末借方余额", "REAL"),
+        ("期末贷方余额", "REAL"),
+    ],
+}
+
+# 行哈希：序时账每行内容的哈希值，追加导入时据此跳过已导入的行
+ROW_HASH_COLUMN = "行哈希"
+# 不在文件标题行中、由软件维护的列（查询序时账时按 JOURNAL_COLUMNS 显式列出列名，不会读到这些列）
+HIDDEN_COLUMNS = {
+    "journal": [(ROW_HASH_COLUMN, "INTEGER")],
+}
+
+# 日期列：导入时统一保存为 年-月-日 开头的文本（带时间时为 年-月-日 时:分:秒），可按文本比较和截取年月
+DATE_COLUMNS = {"日期"}
+
+JOURNAL_COLUMNS = [col for col, _ in TABLE_SCHEMAS["journal"]]
+BALANCE_COLUMNS = [col for col, _ in TABLE_SCHEMAS["balance"]]
+# 查询序时账时的列清单
+JOURNAL_SELECT = ", ".join(JOURNAL_COLUMNS)
+
+
+def table_columns(table_name):
+    """
+    获取数据表的列名列表
+    :param table_name: 数据库表名（如 "journal"）
+    :return: 列名列表
+    """
+    return [col for col, _ in TABLE_SCHEMAS[table_name]]
+
+
+def stored_columns(table_name):
+    """
+    获取数据表实际保存的列名列表（文件中的列 + 由软件维护的列）
+    :param table_name: 数据库表名
+    :return: 列名列表
+    """
+    return table_columns(table_name) + [col for col, _ in HIDDEN_COLUMNS.get(table_name, [])]
+
+
+def numeric_columns(table_name):
+    """
+    获取数据表中的数值（REAL）列
+    :param table_name: 数据库表名
+    :return: 列名列表
+    """
+    return [col for col, col_type in TABLE_SCHEMAS[table_name] if col_type == "REAL"]
+
+
+def create_table_sql(table_name):
+    """
+    生成建表语句
+    :param table_name: 数据库表名
+    :return: CREATE TABLE 语句
+    """
+    definitions = TABLE_SCHEMAS[table_name] + HIDDEN_COLUMNS.get(table_name, [])
+    columns = ",\n    ".join(f"{col} {col_type}" for col, col_type in definitions)
+    return f"CREATE TABLE IF NOT EXISTS {table_name} (\n    {columns}\n)"
@@ -0,0 +1,152 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Audit-Inspector-Toolkit
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+科目 × 月份汇总表：导入序时账时建立，追加数据时只汇总新增的行并累加；
+数据校验、科目层级汇总和月度汇总均读取该表，序时账本身只在查询明细时扫描
+"""
+
+import pandas as pd
+
+from indexes import table_exists
+
+PERIOD_SUMMARY_TABLE = "journal_period_summary"
+PERIOD_SUMMARY_COLUMNS = ["科目编码", "科目名称", "年月", "借方合计", "贷方合计", "分录数", "凭证数"]
+
+CREATE_PERIOD_SUMMARY_SQL = f"""
+    CREATE TABLE IF NOT EXISTS {PERIOD_SUMMARY_TABLE} (
+        科目编码 TEXT,
+        科目名称 TEXT,
+        年月 TEXT,
+        借方合计 REAL,
+        贷方合计 REAL,
+        分录数 INTEGER,
+        凭证数 INTEGER,
+        PRIMARY KEY (科目编码, 年月)
+    )
+"""
+
+# 汇总 rowid 大于指定值的分录（日期格式为 YYYY-MM-DD HH:MM:SS，前 7 位即年月），凭证以（凭证字号, 日期）区分
+AGGREGATE_SQL = """
+    SELECT
+        科目编码,
+        MAX(科目名称),
+        substr(日期, 1, 7) AS 年月,
+        TOTAL(借方),
+        TOTAL(贷方),
+        COUNT(*),
+        {voucher_count}
+    FROM journal AS new
+    WHERE rowid > :after_rowid
+    GROUP BY 科目编码, 年月
+"""
+# 全量汇总时的凭证数
+FULL_VOUCHER_COUNT = "COUNT(DISTINCT 凭证字号 || '|' || 日期)"
+# 增量汇总时的凭证数：该科目在之前的分录中已出现过的凭证不再重复计数（使用凭证字号、日期组合索引）
+APPEND_VOUCHER_COUNT = """COUNT(DISTINCT CASE WHEN NOT EXISTS (
+            SELECT 1 FROM journal AS earlier
+            WHERE earlier.凭证字号 = new.凭证字号 AND earlier.日期 = new.日期
+              AND earlier.科目编码 IS new.科目编码 AND earlier.rowid <= :after_rowid
+        ) THEN 凭证字号 || '|' || 日期 END)"""
+
+UPSERT_SQL = f"""
+    INSERT INTO {PERIOD_SUMMARY_TABLE} ({", ".join(PERIOD_SUMMARY_COLUMNS)})
+    {{aggregate}}
+    ON CONFLICT (科目编码, 年月) DO UPDATE SET
+        科目名称 = COALESCE(excluded.科目名称, 科目名称),
+        借方合计 = 借方合计 + excluded.借方合计,
+        贷方合计 = 贷方合计 + excluded.贷方合计,
+        分录数 = 分录数 + excluded.分录数,
+        凭证数 = 凭证数 + excluded.凭证数
+"""
+
+# 按科目汇总（各月合计）
+ACCOUNT_TOTALS_SQL = f"""
+    SELECT 科目编码, MAX(科目名称), TOTAL(借方合计), TOTAL(贷方合计), SUM(分录数)
+    FROM {PERIOD_SUMMARY_TABLE}
+    GROUP BY 科目编码
+"""
+
+# 某科目及其全部下级科目的月度汇总（主键上的范围扫描），参数为 accounts.prefix_range 计算的编码范围
+MONTHLY_SQL = f"""
+    SELECT 年月, TOTAL(借方合计) AS 借方合计, TOTAL(贷方合计) AS 贷方合计,
+           SUM(分录数) AS 分录数, SUM(凭证数) AS 凭证数
+    FROM {PERIOD_SUMMARY_TABLE}
+    WHERE 科目编码 >= ? AND 科目编码 < ?
+    GROUP BY 年月
+    ORDER BY 年月
+"""
+# 全部科目的月度汇总
+ALL_MONTHLY_SQL = f"""
+    SELECT 年月, TOTAL(借方合计) AS 借方合计, TOTAL(贷方合计) AS 贷方合计,
+           SUM(分录数) AS 分录数, SUM(凭证数) AS 凭证数
+    FROM {PERIOD_SUMMARY_TABLE}
+    GROUP BY 年月
+    ORDER BY 年月
+"""
+
+
+def period_summary_ready(conn):
+    """
+    汇总表是否已建立
+    """
+    return table_exists(conn, PERIOD_SUMMARY_TABLE)
+
+
+def build_period_summary(conn):
+    """
+    重建汇总表（导入序时账或数据库后调用）
+    :param conn: sqlite3 连接（需可写）
+    :return: 汇总行数
+    """
+    conn.execute(f"DROP TABLE IF EXISTS {PERIOD_SUMMARY_TABLE}")
+    conn.execute(CREATE_PERIOD_SUMMARY_SQL)
+    if table_exists(conn, "journal"):
+        aggregate = AGGREGATE_SQL.format(voucher_count=FULL_VOUCHER_COUNT)
+        conn.execute(UPSERT_SQL.format(aggregate=aggregate), {"after_rowid": 0})
+    conn.commit()
+    return conn.execute(f"SELECT COUNT(*) FROM {PERIOD_SUMMARY_TABLE}").fetchone()[0]
+
+
+def update_period_summary(conn, after_rowid):
+    """
+    追加序时账后增量更新汇总表：只汇总 rowid 大于 after_rowid 的新行，并累加到已有的汇总行
+    :param conn: sqlite3 连接（需可写，由调用方提交）
+    :param after_rowid: 追加前序时账的最大 rowid
+    """
+    conn.execute(CREATE_PERIOD_SUMMARY_SQL)
+    aggregate = AGGREGATE_SQL.format(voucher_count=APPEND_VOUCHER_COUNT)
+    conn.execute(UPSERT_SQL.format(aggregate=aggregate), {"after_rowid": after_rowid})
+
+
+def account_totals(conn):
+    """
+    按科目汇总借方、贷方及分录数
+    :param conn: sqlite3 连接
+    :return: [(科目编码, 科目名称, 借方合计, 贷方合计, 分录数), ...]
+    """
+    return conn.execute(ACCOUNT_TOTALS_SQL).fetchall()
+
+
+def monthly_summary(conn, code_range=None):
+    """
+    月度汇总
+    :param conn: sqlite3 连接
+    :param code_range: 科目编码范围 (下界, 上界)，为 None 时汇总全部科目
+    :return: DataFrame（年月、借方合计、贷方合计、分录数、凭证数）
+    """
+    if code_range is None:
+        return pd.read_sql(ALL_MONTHLY_SQL, conn)
+    return pd.read_sql(MONTHLY_SQL, conn, params=code_range)
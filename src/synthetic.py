@@ -0,0 +1,368 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Audit-Inspector-Toolkit
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+模拟账套生成器：按固定的随机种子生成科目表、借贷平衡的凭证（序时账）及与之核对一致的科目余额表，
+用于性能测试（10 万、100 万、1000 万行）。序时账按块生成并写入文件，内存占用不随行数增长；
+同一种子、同一行数生成的文件完全相同
+
+    python src/synthetic.py --rows 1m --out bench_data --format parquet
+"""
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from schema import BALANCE_COLUMNS, JOURNAL_COLUMNS
+
+DEFAULT_SEED = 20230101
+# 每块生成的行数（与随机数的消耗顺序有关，修改后生成的数据会变化）
+GENERATE_CHUNK_ROWS = 200_000
+# 会计年度
+FISCAL_YEAR = 2023
+# 客户、供应商数量（应收账款、应付账款的辅助核算）
+CUSTOMERS = 500
+SUPPLIERS = 300
+
+# 一级科目：(科目编码, 科目名称, 余额方向（1 借方 / -1 贷方）, 明细科目名称)
+CHART = [
+    ("1001", "库存现金", 1, []),
+    ("1002", "银行存款", 1, ["工商银行", "建设银行", "招商银行"]),
+    ("1122", "应收账款", 1, ["货款", "服务费"]),
+    ("1221", "其他应收款", 1, ["备用金", "押金"]),
+    ("1403", "原材料", 1, ["钢材", "塑料件", "包装物"]),
+    ("1405", "库存商品", 1, ["产品A", "产品B", "产品C"]),
+    ("1601", "固定资产", 1, ["机器设备", "运输工具", "电子设备"]),
+    ("1602", "累计折旧", -1, []),
+    ("2202", "应付账款", -1, ["材料款", "设备款"]),
+    ("2211", "应付职工薪酬", -1, ["工资", "社会保险费", "住房公积金"]),
+    ("2221", "应交税费", -1, ["应交增值税", "应交企业所得税", "应交个人所得税"]),
+    ("4001", "实收资本", -1, []),
+    ("6001", "主营业务收入", -1, ["产品A", "产品B", "产品C"]),
+    ("6401", "主营业务成本", 1, ["产品A", "产品B", "产品C"]),
+    ("6601", "销售费用", 1, ["广告费", "运输费", "差旅费"]),
+    ("6602", "管理费用", 1, ["办公费", "差旅费", "折旧费", "工资"]),
+    ("6603", "财务费用", 1, ["利息支出", "手续费"]),
+]
+
+# 凭证模板：(借方科目编码前缀, 贷方科目编码前缀, 摘要, 金额的对数均值, 权重)，
+# 分录科目从前缀下的末级科目中随机选取；收入、回款的金额较大，使资金科目的余额大体为正
+VOUCHER_TEMPLATES = [
+    (["1122"], ["6001", "222101"], ["销售商品", "确认销售收入", "开具增值税发票"], 10.8, 12),
+    (["1002"], ["1122"], ["收到货款", "收回应收账款", "客户回款"], 10.8, 12),
+    (["1403", "222101"], ["2202"], ["采购材料", "材料入库", "收到采购发票"], 10.0, 10),
+    (["2202"], ["1002"], ["支付货款", "支付材料款", "支付设备款"], 10.0, 10),
+    (["6401"], ["1405"], ["结转销售成本"], 10.0, 8),
+    (["1405"], ["1403"], ["领用材料", "产品完工入库"], 9.8, 8),
+    (["6601", "6602"], ["2211"], ["计提工资", "计提社会保险费", "计提住房公积金"], 9.5, 6),
+    (["2211"], ["1002"], ["发放工资", "缴纳社会保险费"], 9.5, 6),
+    (["1001"], ["1002"], ["提取备用金", "提取现金"], 8.5, 4),
+    (["1221"], ["1001"], ["借支备用金", "支付押金"], 8.0, 3),
+    (["660103", "660202"], ["1001", "1221"], ["报销差旅费", "报销交通费", "冲销备用金"], 7.5, 5),
+    (["6602"], ["1001", "1002"], ["支付办公费", "购买办公用品", "支付水电费"], 7.5, 5),
+    (["660203"], ["1602"], ["计提折旧"], 9.0, 1),
+    (["6603"], ["1002"], ["支付银行手续费", "支付借款利息"], 6.0, 3),
+    (["2221"], ["1002"], ["缴纳增值税", "缴纳企业所得税", "代缴个人所得税"], 9.5, 3),
+]
+# 有数量的科目（存货、收入、成本）
+QUANTITY_PREFIXES = ("1403", "1405", "6001", "6401")
+
+
+def parse_rows(text):
+    """
+    解析行数参数，支持 k / m 后缀（如 100k、1m、10m）
+    """
+    text = str(text).strip().lower()
+    scale = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    return int(float(text.rstrip("km")) * scale)
+
+
+def build_chart():
+    """
+    科目表
+    :return: DataFrame（科目编码、科目名称、余额方向、是否末级），按科目编码排序
+    """
+    records = []
+    for code, name, nature, children in CHART:
+        records.append((code, name, nature, not children))
+        for i, child in enumerate(children, start=1):
+            records.append((f"{code}{i:02d}", f"{name}-{child}", nature, True))
+    return pd.DataFrame(records, columns=["科目编码", "科目名称", "余额方向", "是否末级"]).sort_values(
+        "科目编码", ignore_index=True
+    )
+
+
+class LedgerGenerator:
+    """
+    按块生成序时账：凭证按日期顺序编号（每月从 记-00001 开始），每张凭证借方合计等于贷方合计，
+    同时累计各末级科目的发生额，用于生成科目余额表
+    """
+
+    def __init__(self, rows, seed=DEFAULT_SEED):
+        """
+        :param rows: 序时账行数（最后一张凭证不拆分，实际行数可能少 1~3 行）
+        :param seed: 随机种子
+        """
+        self.rows = rows
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+        self.chart = build_chart()
+        leaves = self.chart[self.chart["是否末级"]].reset_index(drop=True)
+        self.leaf_codes = leaves["科目编码"].to_numpy()
+        self.leaf_names = leaves["科目名称"].to_numpy()
+        self.leaf_nature = leaves["余额方向"].to_numpy()
+        self.debit_cents = np.zeros(len(leaves), dtype=np.int64)
+        self.credit_cents = np.zeros(len(leaves), dtype=np.int64)
+
+        # 各模板借方、贷方可选的末级科目（补齐为矩形数组，按长度随机取下标）
+        self.debit_pool, self.debit_count = self._pools([template[0] for template in VOUCHER_TEMPLATES])
+        self.credit_pool, self.credit_count = self._pools([template[1] for template in VOUCHER_TEMPLATES])
+        self.summaries = [template[2] for template in VOUCHER_TEMPLATES]
+        self.log_means = np.array([template[3] for template in VOUCHER_TEMPLATES])
+        weights = np.array([template[4] for template in VOUCHER_TEMPLATES], dtype=np.float64)
+        self.weights = weights / weights.sum()
+
+        self.aux_customer = np.array([code.startswith("1122") for code in self.leaf_codes])
+        self.aux_supplier = np.array([code.startswith("2202") for code in self.leaf_codes])
+        self.has_quantity = np.array([code.startswith(QUANTITY_PREFIXES) for code in self.leaf_codes])
+        self.customers = np.array([f"客户:客户{i:04d}" for i in range(1, CUSTOMERS + 1)], dtype=object)
+        self.suppliers = np.array([f"供应商:供应商{i:04d}" for i in range(1, SUPPLIERS + 1)], dtype=object)
+
+        self.rows_done = 0
+        self.vouchers = 0
+        self.month_counts = {}  # 月份 -> 已编号的凭证数
+
+    def _pools(self, prefix_lists):
+        pools = [
+            [i for i, code in enumerate(self.leaf_codes) if code.startswith(tuple(prefixes))]
+            for prefixes in prefix_lists
+        ]
+        counts = np.array([len(pool) for pool in pools])
+        matrix = np.zeros((len(pools), counts.max()), dtype=np.int64)
+        for i, pool in enumerate(pools):
+            matrix[i, :len(pool)] = pool
+        return matrix, counts
+
+    def chunks(self, chunk_rows=GENERATE_CHUNK_ROWS):
+        """
+        :param chunk_rows: 每块的行数（约数）
+        :return: 生成器，每次产出一块序时账（DataFrame，列同 JOURNAL_COLUMNS）
+        """
+        while self.rows - self.rows_done >= 2:
+            chunk = self._chunk(min(chunk_rows, self.rows - self.rows_done))
+            if chunk is None:
+                return
+            yield chunk
+
+    def _chunk(self, target_rows):
+        rng = self.rng
+        # 每张凭证 1~2 条借方分录、1~2 条贷方分录；只保留不超过目标行数的完整凭证
+        count = target_rows // 2 + 1
+        n_debit = rng.integers(1, 3, size=count)
+        n_credit = rng.integers(1, 3, size=count)
+        sizes = n_debit + n_credit
+        keep = np.cumsum(sizes) <= target_rows
+        if not keep.any():
+            return None
+        count = int(keep.sum())
+        n_debit, n_credit, sizes = n_debit[:count], n_credit[:count], sizes[:count]
+        template = rng.choice(len(VOUCHER_TEMPLATES), size=count, p=self.weights)
+
+        # 展开为分录：voucher 为分录所属凭证的下标，pos 为分录在凭证中的序号
+        voucher = np.repeat(np.arange(count), sizes)
+        starts = np.cumsum(sizes) - sizes
+        pos = np.arange(len(voucher)) - starts[voucher]
+        is_debit = pos < n_debit[voucher]
+        line_template = template[voucher]
+
+        pool_index = np.where(
+            is_debit,
+            rng.integers(0, self.debit_count[line_template]),
+            rng.integers(0, self.credit_count[line_template]),
+        )
+        account = np.where(
+            is_debit,
+            self.debit_pool[line_template, np.minimum(pool_index, self.debit_pool.shape[1] - 1)],
+            self.credit_pool[line_template, np.minimum(pool_index, self.credit_pool.shape[1] - 1)],
+        )
+
+        # 金额以分为单位计算：借方金额随机，贷方按随机比例分摊借方合计，最后一条贷方分录承担尾差
+        debit = np.where(is_debit, np.round(rng.lognormal(self.log_means[line_template], 1.0) * 100), 0).astype(np.int64)
+        total = np.bincount(voucher, weights=debit, minlength=count).astype(np.int64)
+        weight = np.where(is_debit, 0.0, rng.random(len(voucher)) + 0.1)
+        weight_sum = np.bincount(voucher, weights=weight, minlength=count)
+        credit = np.floor(total[voucher] * weight / weight_sum[voucher]).astype(np.int64)
+        last = pos == sizes[voucher] - 1
+        remainder = total - np.bincount(voucher, weights=credit, minlength=count).astype(np.int64)
+        credit[last] += remainder[voucher[last]]
+
+        # 日期按在全部行中的位置均匀分布在会计年度内（行号递增，日期不减）
+        row_start = self.rows_done + starts
+        days = row_start * 365 // max(self.rows, 1)
+        dates = pd.Timestamp(FISCAL_YEAR, 1, 1) + pd.to_timedelta(days, unit="D")
+        months = dates.month.to_numpy()
+        numbers = pd.Series(months).groupby(months).cumcount().to_numpy() + 1
+        numbers += np.array([self.month_counts.get(month, 0) for month in months])
+        for month, n in zip(*np.unique(months, return_counts=True)):
+            self.month_counts[month] = self.month_counts.get(month, 0) + int(n)
+
+        summary_choice = rng.integers(0, 3, size=count)
+        summaries = np.array(
+            [self.summaries[t][c % len(self.summaries[t])] for t, c in zip(template, summary_choice)], dtype=object
+        )
+        aux = np.full(len(voucher), "", dtype=object)
+        customer = self.aux_customer[account]
+        supplier = self.aux_supplier[account]
+        aux[customer] = self.customers[rng.integers(0, CUSTOMERS, size=int(customer.sum()))]
+        aux[supplier] = self.suppliers[rng.integers(0, SUPPLIERS, size=int(supplier.sum()))]
+        quantity = np.where(self.has_quantity[account], rng.integers(1, 500, size=len(voucher)), 0)
+
+        self.debit_cents += np.bincount(account, weights=debit, minlength=len(self.leaf_codes)).astype(np.int64)
+        self.credit_cents += np.bincount(account, weights=credit, minlength=len(self.leaf_codes)).astype(np.int64)
+        self.rows_done += len(voucher)
+        self.vouchers += count
+
+        return pd.DataFrame({
+            "日期": dates.strftime("%Y-%m-%d").to_numpy()[voucher],
+            "凭证字号": np.char.add("记-", np.char.zfill(numbers.astype(str), 5))[voucher].astype(object),
+            "科目编码": self.leaf_codes[account],
+            "科目名称": self.leaf_names[account],
+            "辅助核算": aux,
+            "摘要": summaries[voucher],
+            "借方": debit / 100,
+            "贷方": credit / 100,
+            "数量": quantity.astype(np.float64),
+            "外币": np.zeros(len(voucher)),
+        }, columns=JOURNAL_COLUMNS)
+
+    def balance(self):
+        """
+        科目余额表（须在序时账全部生成后调用）：末级科目的本期发生额等于序时账的发生额，
+        上级科目为下级科目的合计，期初余额随机，期末余额按余额方向推算
+        :return: DataFrame（列同 BALANCE_COLUMNS）
+        """
+        rng = np.random.default_rng(self.seed + 1)  # 与序时账行数无关
+        opening = np.round(rng.lognormal(12.0, 1.0, size=len(self.leaf_codes)) * 100).astype(np.int64)
+        leaves = pd.DataFrame({
+            "科目编码": self.leaf_codes,
+            "期初借方": np.where(self.leaf_nature > 0, opening, 0),
+            "期初贷方": np.where(self.leaf_nature < 0, opening, 0),
+            "本期借方": self.debit_cents,
+            "本期贷方": self.credit_cents,
+        })
+        # 上级科目为末级科目按编码前缀的合计
+        frames = [leaves]
+        for code, *_ in CHART:
+            children = leaves[leaves["科目编码"].str.startswith(code) & (leaves["科目编码"] != code)]
+            if len(children):
+                total = children.drop(columns="科目编码").sum()
+                frames.append(pd.DataFrame([{"科目编码": code, **total.to_dict()}]))
+        cents = pd.concat(frames, ignore_index=True)
+        net = cents["期初借方"] - cents["期初贷方"] + cents["本期借方"] - cents["本期贷方"]
+        balance = pd.DataFrame({
+            "科目编码": cents["科目编码"],
+            "期初借方余额": cents["期初借方"] / 100,
+            "期初贷方余额": cents["期初贷方"] / 100,
+            "本期借方发生额": cents["本期借方"] / 100,
+            "本期贷方发生额": cents["本期贷方"] / 100,
+            "期末借方余额": net.clip(lower=0) / 100,
+            "期末贷方余额": (-net).clip(lower=0) / 100,
+        })
+        balance = balance.merge(self.chart[["科目编码", "科目名称"]], on="科目编码")
+        return balance[BALANCE_COLUMNS].sort_values("科目编码", ignore_index=True)
+
+
+def _write_frames(path, frames, table_name):
+    """
+    将数据块依次写入文件（.csv 或 .parquet）
+    :return: 写入的行数
+    """
+    rows = 0
+    if path.endswith(".parquet"):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        from columnar import arrow_schema
+
+        schema = arrow_schema(table_name)
+        with pq.ParquetWriter(path, schema) as writer:
+            for frame in frames:
+                writer.write_table(pa.Table.from_pandas(frame, schema=schema, preserve_index=False))
+                rows += len(frame)
+        return rows
+    for i, frame in enumerate(frames):
+        frame.to_csv(path, mode="w" if i == 0 else "a", header=i == 0, index=False, encoding="utf-8")
+        rows += len(frame)
+    return rows
+
+
+def generate_ledger(out_dir, rows, seed=DEFAULT_SEED, file_format="csv", progress=None):
+    """
+    生成模拟账套文件：序时账和科目余额表
+    :param out_dir: 输出目录
+    :param rows: 序时账行数
+    :param seed: 随机种子
+    :param file_format: "csv" 或 "parquet"
+    :param progress: 进度报告器（ProgressReporter，可选），报告已生成的行数
+    :return: {"journal": 序时账路径, "balance": 科目余额表路径, "rows": 实际行数, "vouchers": 凭证数, "accounts": 科目数}
+    """
+    if file_format not in ("csv", "parquet"):
+        raise ValueError(f"不支持的文件格式：{file_format}")
+    os.makedirs(out_dir, exist_ok=True)
+    journal_path = os.path.join(out_dir, f"journal_{rows}_{seed}.{file_format}")
+    balance_path = os.path.join(out_dir, f"balance_{rows}_{seed}.{file_format}")
+    generator = LedgerGenerator(rows, seed)
+    if progress is not None:
+        progress.stage("生成模拟序时账", total_rows=rows)
+
+    def frames():
+        for chunk in generator.chunks():
+            yield chunk
+            if progress is not None:
+                progress.update(rows=generator.rows_done)
+
+    # 先写临时文件，生成中断时不会留下不完整的文件（已生成的文件可直接复用）
+    for path, table_name, data in (
+        (journal_path, "journal", frames()),
+        (balance_path, "balance", None),  # 序时账全部生成后才能汇总
+    ):
+        temp_path = f"{path}.tmp.{file_format}"
+        _write_frames(temp_path, data if data is not None else [generator.balance()], table_name)
+        os.replace(temp_path, path)
+    return {
+        "journal": journal_path, "balance": balance_path, "rows": generator.rows_done,
+        "vouchers": generator.vouchers, "accounts": len(generator.chart),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="生成模拟账套（序时账、科目余额表）")
+    parser.add_argument("--rows", default="100k", help="序时账行数，如 100k、1m、10m")
+    parser.add_argument("--out", default="bench_data", help="输出目录")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv", dest="file_format")
+    args = parser.parse_args(argv)
+
+    from progress import ProgressReporter
+
+    reporter = ProgressReporter(lambda p: print(p.describe(), flush=True), min_interval=1.0)
+    result = generate_ledger(args.out, parse_rows(args.rows), args.seed, args.file_format, reporter)
+    print(result)
+
+
+if __name__ == "__main__":
+    main()
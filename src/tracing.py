@@ -0,0 +1,420 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Audit-Inspector-Toolkit
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+操作追踪：加载、筛选、明细账、凭证、校验、导入、导出等操作各记录为一个跨度（span），
+分别累计 SQL、DataFrame 构建、表格渲染等阶段的耗时，以及行数、内存变化和执行的 SQL。
+完成的跨度写入滚动日志文件（每行一条 JSON），并保留最近的若干条供界面中的性能面板查看。
+
+跨度在工作线程中通过 Tracer.activate 设为当前跨度后，引擎中的 fetch_all / run / phase 会自动记录；
+没有当前跨度时这些函数只执行 SQL，不做记录
+"""
+
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from logging.handlers import RotatingFileHandler
+
+# 追踪日志文件（位于 saved_data 目录），超过大小后滚动
+TRACE_LOG_FILE = "trace.log"
+TRACE_LOG_BYTES = 5 * 1024 * 1024
+TRACE_LOG_BACKUPS = 3
+# 内存中保留的最近跨度数
+RECENT_SPANS = 500
+# 每个跨度最多记录的 SQL 语句数（同一语句只记录一次，累计次数和耗时）
+MAX_STATEMENTS = 20
+
+# CREATE TABLE ... AS SELECT 只解释其中的查询（表已存在时整条语句无法解释）
+CREATE_AS_PATTERN = re.compile(r"^\s*CREATE\s+(TEMP\w*\s+)?TABLE\s+\S+\s+AS\s+", re.IGNORECASE)
+
+_local = threading.local()
+
+
+def _windows_rss_reader():
+    """
+    Windows 下读取当前进程工作集（常驻内存）的函数（GetProcessMemoryInfo，无需安装 psutil）
+    :return: 无参数的函数，返回字节数；无法加载时为 None
+    """
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [
+                ("cb", wintypes.DWORD),
+                ("PageFaultCount", wintypes.DWORD),
+                ("PeakWorkingSetSize", ctypes.c_size_t),
+                ("WorkingSetSize", ctypes.c_size_t),
+                ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                ("PagefileUsage", ctypes.c_size_t),
+                ("PeakPagefileUsage", ctypes.c_size_t),
+            ]
+
+        get_current_process = ctypes.windll.kernel32.GetCurrentProcess
+        get_current_process.restype = wintypes.HANDLE
+        get_memory_info = ctypes.windll.psapi.GetProcessMemoryInfo
+        get_memory_info.argtypes = [wintypes.HANDLE, ctypes.POINTER(ProcessMemoryCounters), wintypes.DWORD]
+        get_memory_info.restype = wintypes.BOOL
+    except (ImportError, OSError, AttributeError):
+        return None
+
+    def read():
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        if not get_memory_info(get_current_process(), ctypes.byref(counters), counters.cb):
+            return None
+        return counters.WorkingSetSize
+
+    return read
+
+
+_windows_rss = _windows_rss_reader() if sys.platform == "win32" else None
+
+
+def current_rss():
+    """
+    当前进程的常驻内存（字节），无法获取时为 None
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    if _windows_rss is not None:
+        return _windows_rss()
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss
+
+
+@dataclass
+class Statement:
+    """
+    跨度中执行的一条 SQL（相同的语句合并）
+    """
+    sql: str
+    params: tuple  # 第一次执行时的参数，用于 EXPLAIN QUERY PLAN
+    seconds: float = 0.0
+    calls: int = 0
+
+
+@dataclass
+class Span:
+    """
+    一次操作的追踪记录
+    """
+    name: str  # 操作名称（如 "first_filter"）
+    detail: dict = field(default_factory=dict)  # 操作参数（如表名、列名、筛选条件）
+    started: float = field(default_factory=time.time)  # 开始时间（时间戳）
+    seconds: float = 0.0  # 总耗时
+    phases: dict = field(default_factory=dict)  # 阶段 -> 耗时（sql、frame、render、write 等）
+    rows: int = None
+    rss_start: int = None
+    rss_delta: int = None  # 结束时与开始时的常驻内存之差（字节；并发的操作也会计入）
+    statements: list = field(default_factory=list)
+    status: str = "running"  # running / ok / error / cancelled
+    error: str = None
+
+    def __post_init__(self):
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        if self.rss_start is None:
+            self.rss_start = current_rss()
+
+    def add_time(self, phase_name, seconds):
+        with self._lock:
+            self.phases[phase_name] = self.phases.get(phase_name, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, phase_name):
+        """
+        累计 with 块的耗时到指定阶段
+        """
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(phase_name, time.perf_counter() - start_time)
+
+    def add_statement(self, sql, params, seconds):
+        """
+        记录一条 SQL 的耗时（同时计入 sql 阶段）
+        """
+        self.add_time("sql", seconds)
+        sql = " ".join(sql.split())
+        with self._lock:
+            for statement in self.statements:
+                if statement.sql == sql:
+                    break
+            else:
+                if len(self.statements) >= MAX_STATEMENTS:
+                    return
+                statement = Statement(sql, tuple(params or ()))
+                self.statements.append(statement)
+            statement.seconds += seconds
+            statement.calls += 1
+
+    def finish(self, status="ok", error=None, rows=None):
+        self.seconds = time.perf_counter() - self._start
+        self.status = status
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        if rows is not None:
+            self.rows = rows
+        rss = current_rss()
+        if rss is not None and self.rss_start is not None:
+            self.rss_delta = rss - self.rss_start
+
+    def to_dict(self):
+        """
+        日志记录（可 JSON 序列化）
+        """
+        return {
+            "time": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.started)),
+            "operation": self.name,
+            "status": self.status,
+            "seconds": round(self.seconds, 4),
+            **{f"{name}_seconds": round(seconds, 4) for name, seconds in self.phases.items()},
+            "rows": self.rows,
+            "rss_delta_mb": None if self.rss_delta is None else round(self.rss_delta / 2 ** 20, 1),
+            "detail": self.detail,
+            "error": self.error,
+            "sql": [
+                {"sql": s.sql, "calls": s.calls, "seconds": round(s.seconds, 4)} for s in self.statements
+            ],
+        }
+
+
+class Tracer:
+    """
+    跨度的收集器：写入滚动日志文件，并保留最近的跨度
+    """
+
+    def __init__(self, log_path=None, capacity=RECENT_SPANS):
+        """
+        :param log_path: 日志文件路径；为 None 时不写文件
+        :param capacity: 内存中保留的最近跨度数
+        """
+        self._recent = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._logger = None
+        if log_path is not None:
+            self._logger = logging.getLogger(f"{__name__}.{os.path.abspath(log_path)}")
+            self._logger.setLevel(logging.INFO)
+            self._logger.propagate = False
+            if not self._logger.handlers:
+                handler = RotatingFileHandler(
+                    log_path, maxBytes=TRACE_LOG_BYTES, backupCount=TRACE_LOG_BACKUPS, encoding="utf-8", delay=True
+                )
+                handler.setFormatter(logging.Formatter("%(message)s"))
+                self._logger.addHandler(handler)
+
+    def start(self, name, **detail):
+        """
+        开始一个跨度（可在主线程中开始，在工作线程中记录，回到主线程后结束）
+        """
+        return Span(name, detail)
+
+    @contextmanager
+    def activate(self, span):
+        """
+        在 with 块内将跨度设为当前线程的当前跨度
+        """
+        previous = getattr(_local, "span", None)
+        _local.span = span
+        try:
+            yield span
+        finally:
+            _local.span = previous
+
+    def finish(self, span, status="ok", error=None, rows=None):
+        """
+        结束跨度，写入日志并加入最近跨度
+        """
+        span.finish(status, error, rows)
+        with self._lock:
+            self._recent.append(span)
+        if self._logger is not None:
+            try:
+                self._logger.info(json.dumps(span.to_dict(), ensure_ascii=False, default=str))
+            except Exception:
+                pass  # 日志写入失败不影响操作
+
+    @contextmanager
+    def span(self, name, **detail):
+        """
+        在当前线程中同步执行的操作：with 块即一个跨度，出错时记录错误后继续抛出
+        """
+        span = self.start(name, **detail)
+        try:
+            with self.activate(span):
+                yield span
+        except BaseException as e:
+            self.finish(span, "error", e)
+            raise
+        self.finish(span)
+
+    def recent(self):
+        """
+        最近结束的跨度（按结束顺序）
+        """
+        with self._lock:
+            return list(self._recent)
+
+    def slowest(self, limit=50):
+        """
+        最近结束的跨度中耗时最长的若干个
+        """
+        return sorted(self.recent(), key=lambda span: span.seconds, reverse=True)[:limit]
+
+
+def current_span():
+    """
+    当前线程的当前跨度，没有时为 None
+    """
+    return getattr(_local, "span", None)
+
+
+@contextmanager
+def phase(phase_name):
+    """
+    累计 with 块的耗时到当前跨度的指定阶段（没有当前跨度时不记录）
+    """
+    span = current_span()
+    if span is None:
+        yield
+        return
+    with span.phase(phase_name):
+        yield
+
+
+def timed_iter(iterable, phase_name):
+    """
+    逐项迭代，并将取下一项的耗时累计到当前跨度的指定阶段（如按块读取文件）
+    """
+    iterator = iter(iterable)
+    while True:
+        with phase(phase_name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+def fetch_all(conn, sql, params=(), first_rows=None, on_first=None):
+    """
+    执行查询并读取全部结果，耗时和语句记录到当前跨度
+    :param first_rows: 提供 on_first 时先读取的行数
+    :param on_first: 读取前 first_rows 行后立即调用 on_first(这些行)，再继续读取其余的行（用于先显示部分结果）；
+                     到此为止的耗时记入 first 阶段
+    :return: 元组列表
+    """
+    span = current_span()
+    if span is None and on_first is None:
+        return conn.execute(sql, params).fetchall()
+    start_time = time.perf_counter()
+    callback_seconds = 0.0
+    cursor = conn.execute(sql, params)
+    if on_first is None:
+        rows = cursor.fetchall()
+    else:
+        rows = cursor.fetchmany(first_rows)
+        callback_start = time.perf_counter()
+        if span is not None:
+            span.add_time("first", callback_start - start_time)
+        on_first(rows)
+        callback_seconds = time.perf_counter() - callback_start
+        if len(rows) == first_rows:
+            rows += cursor.fetchall()
+    if span is not None:
+        span.add_statement(sql, params, time.perf_counter() - start_time - callback_seconds)
+    return rows
+
+
+def run(conn, sql, params=()):
+    """
+    执行不返回结果的语句（如 CREATE TABLE ... AS SELECT），耗时和语句记录到当前跨度
+    :return: 游标
+    """
+    span = current_span()
+    if span is None:
+        return conn.execute(sql, params)
+    start_time = time.perf_counter()
+    cursor = conn.execute(sql, params)
+    span.add_statement(sql, params, time.perf_counter() - start_time)
+    return cursor
+
+
+def record_statement(sql, params, seconds):
+    """
+    记录由调用方自行计时的 SQL（如 executemany、分批 fetchmany），参数为其中一组
+    """
+    span = current_span()
+    if span is not None:
+        span.add_statement(sql, params, seconds)
+
+
+def count_rows(value):
+    """
+    操作结果的行数：导入 / 导出统计信息取 rows，DataFrame 等取长度，无法确定时为 None
+    """
+    rows = getattr(value, "rows", None)
+    if isinstance(rows, int):
+        return rows
+    if value is None or isinstance(value, (tuple, str)):
+        return None
+    try:
+        return len(value)
+    except TypeError:
+        return None
+
+
+def set_rows(rows):
+    """
+    记录当前跨度的行数
+    """
+    span = current_span()
+    if span is not None:
+        span.rows = rows
+
+
+def explain(conn, sql, params=()):
+    """
+    查询计划（EXPLAIN QUERY PLAN）
+    :return: 每行一个计划步骤的文本，按层级缩进；无法解释的语句返回错误说明
+    """
+    try:
+        plan = conn.execute(f"EXPLAIN QUERY PLAN {CREATE_AS_PATTERN.sub('', sql)}", params).fetchall()
+    except Exception as e:
+        return [f"（无法获取查询计划：{e}）"]
+    depth = {0: 0}
+    lines = []
+    for node_id, parent_id, _, text in plan:
+        depth[node_id] = depth.get(parent_id, 0) + 1
+        lines.append("  " * (depth[node_id] - 1) + text)
+    return lines
@@ -0,0 +1,150 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Audit-Inspector-Toolkit
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+数据校验：以一条集合运算 SQL 核对科目余额表与序时账的本期发生额
+"""
+
+import pandas as pd
+
+from indexes import table_exists
+from summary import PERIOD_SUMMARY_TABLE, period_summary_ready
+from tracing import fetch_all, phase, run
+
+RESULT_TABLE = "validation_result"
+RESULT_COLUMNS = [
+    "科目编码", "科目名称", "余额表借方发生额", "序时账借方金额", "借方差异",
+    "余额表贷方发生额", "序时账贷方金额", "贷方差异", "差异类型",
+]
+# 校验阈值：差异不超过 0.001 元视为一致（浮点数精度问题）
+TOLERANCE = 1e-3
+
+# 序时账各科目自身（不含下级科目）的发生额，写入临时表后按科目编码前缀汇总
+CODE_TOTALS_TABLE = "temp_code_totals"
+CREATE_CODE_TOTALS_SQL = f"""
+    CREATE TEMP TABLE {CODE_TOTALS_TABLE} (
+        科目编码 TEXT PRIMARY KEY,
+        科目名称 TEXT,
+        借方金额 REAL,
+        贷方金额 REAL
+    )
+"""
+# 各科目自身的发生额：直接汇总序时账
+JOURNAL_SUMMARY_SQL = """
+    SELECT 科目编码, MAX(科目名称) AS 科目名称,
+           TOTAL(借方) AS 借方金额, TOTAL(贷方) AS 贷方金额
+    FROM journal
+    GROUP BY 科目编码
+"""
+# 各科目自身的发生额：读取导入时建立的科目 × 月份汇总表
+PERIOD_SUMMARY_SQL = f"""
+    SELECT 科目编码, MAX(科目名称) AS 科目名称,
+           TOTAL(借方合计) AS 借方金额, TOTAL(贷方合计) AS 贷方金额
+    FROM {PERIOD_SUMMARY_TABLE}
+    GROUP BY 科目编码
+"""
+# 序时账按科目汇总：上级科目含全部下级科目的分录（科目编码在 [编码, 编码末位字符加一) 范围内，
+# 与 accounts.prefix_range 相同），余额表中的上级科目可以直接与序时账核对；
+# 两表中的全部科目都参与汇总，没有分录的科目不出现在结果中。科目编码为空的分录单独成行
+ROLLUP_SUMMARY_SQL = f"""
+    SELECT c.科目编码 AS 科目编码,
+           MAX(CASE WHEN t.科目编码 = c.科目编码 THEN t.科目名称 END) AS 科目名称,
+           TOTAL(t.借方金额) AS 借方金额, TOTAL(t.贷方金额) AS 贷方金额
+    FROM (SELECT 科目编码 FROM {CODE_TOTALS_TABLE} UNION SELECT 科目编码 FROM balance) AS c
+    JOIN {CODE_TOTALS_TABLE} AS t
+        ON t.科目编码 >= c.科目编码
+        AND t.科目编码 < substr(c.科目编码, 1, length(c.科目编码) - 1) || char(unicode(substr(c.科目编码, -1)) + 1)
+    GROUP BY c.科目编码
+    UNION ALL
+    SELECT 科目编码, 科目名称, 借方金额, 贷方金额
+    FROM {CODE_TOTALS_TABLE}
+    WHERE COALESCE(科目编码, '') = ''
+"""
+
+# 以两表科目编码的并集为键分别左连接，等价于 FULL OUTER JOIN（兼容 3.39 以前的 SQLite），
+# 仅在序时账或仅在余额表中出现的科目也会参与核对；借方、贷方差异分别计算，不会相互抵消
+RECONCILE_SQL = f"""
+    CREATE TABLE {RESULT_TABLE} AS
+    WITH journal_summary AS ({{journal_summary}}),
+    balance_summary AS (
+        SELECT 科目编码, MAX(科目名称) AS 科目名称,
+               TOTAL(本期借方发生额) AS 借方发生额, TOTAL(本期贷方发生额) AS 贷方发生额
+        FROM balance
+        GROUP BY 科目编码
+    ),
+    all_codes AS (
+        SELECT 科目编码 FROM journal_summary
+        UNION
+        SELECT 科目编码 FROM balance_summary
+    ),
+    reconciled AS (
+        SELECT
+            c.科目编码 AS 科目编码,
+            COALESCE(b.科目名称, j.科目名称) AS 科目名称,
+            COALESCE(b.借方发生额, 0) AS 余额表借方发生额,
+            COALESCE(j.借方金额, 0) AS 序时账借方金额,
+            ROUND(COALESCE(b.借方发生额, 0) - COALESCE(j.借方金额, 0), 2) AS 借方差异,
+            COALESCE(b.贷方发生额, 0) AS 余额表贷方发生额,
+            COALESCE(j.贷方金额, 0) AS 序时账贷方金额,
+            ROUND(COALESCE(b.贷方发生额, 0) - COALESCE(j.贷方金额, 0), 2) AS 贷方差异,
+            CASE
+                WHEN b.科目编码 IS NULL THEN '仅序时账'
+                WHEN j.科目编码 IS NULL THEN '仅余额表'
+                ELSE '金额不一致'
+            END AS 差异类型
+        FROM all_codes AS c
+        LEFT JOIN journal_summary AS j ON j.科目编码 IS c.科目编码
+        LEFT JOIN balance_summary AS b ON b.科目编码 IS c.科目编码
+    )
+    SELECT {", ".join(RESULT_COLUMNS)}
+    FROM reconciled
+    WHERE ABS(借方差异) > {TOLERANCE} OR ABS(贷方差异) > {TOLERANCE}
+    ORDER BY 科目编码
+"""
+
+
+def reconcile(conn):
+    """
+    核对科目余额表与序时账，差异写入 validation_result 表
+    :param conn: sqlite3 连接（需可写）
+    :return: 差异明细（DataFrame）；数据库中缺少序时账或科目余额表时返回 None
+    """
+    if not (table_exists(conn, "journal") and table_exists(conn, "balance")):
+        return None
+
+    conn.execute(f"DROP TABLE IF EXISTS {RESULT_TABLE}")
+    conn.execute(f"DROP TABLE IF EXISTS temp.{CODE_TOTALS_TABLE}")
+    conn.execute(CREATE_CODE_TOTALS_SQL)
+    # 各科目自身的发生额优先读取科目 × 月份汇总表，不存在时（如旧版本的数据库）才汇总序时账；
+    # 两种来源按同一方式汇总到上级科目，核对结果相同
+    summary_sql = PERIOD_SUMMARY_SQL if period_summary_ready(conn) else JOURNAL_SUMMARY_SQL
+    run(conn, f"INSERT INTO {CODE_TOTALS_TABLE} {summary_sql}")
+    run(conn, RECONCILE_SQL.format(journal_summary=ROLLUP_SUMMARY_SQL))
+    conn.execute(f"DROP TABLE temp.{CODE_TOTALS_TABLE}")
+    conn.commit()
+    return load_result(conn)
+
+
+def load_result(conn):
+    """
+    读取上一次的校验结果
+    :param conn: sqlite3 连接
+    :return: 差异明细（DataFrame）
+    """
+    if not table_exists(conn, RESULT_TABLE):
+        return pd.DataFrame(columns=RESULT_COLUMNS)
+    rows = fetch_all(conn, f"SELECT {', '.join(RESULT_COLUMNS)} FROM {RESULT_TABLE}")
+    with phase("frame"):
+        return pd.DataFrame(rows, columns=RESULT_COLUMNS)
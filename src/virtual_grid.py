@@ -0,0 +1,349 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Audit-Inspector-Toolkit
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+虚拟表格：Treeview 只保留可见行数量的条目，滚动时替换条目内容，
+显示开销只与可见行数有关，而与结果集大小无关
+"""
+
+import tkinter as tk
+from tkinter import ttk
+
+import pandas as pd
+
+# 可见行数的初始估计值（第一次显示数据后按实际行高重新计算）
+DEFAULT_VISIBLE_ROWS = 25
+# 在可见窗口前后额外读取的行数
+DEFAULT_OVERSCAN = 50
+# 鼠标滚轮每次滚动的行数
+WHEEL_ROWS = 3
+
+
+class DataFrameSource:
+    """
+    以 DataFrame 为后端的数据源
+    数据源只需实现 __len__ 和 rows(start, stop)，即可交给 VirtualGrid 显示
+    """
+
+    def __init__(self, df):
+        """
+        :param df: 要显示的数据（Pandas DataFrame）
+        """
+        self.df = df
+
+    def __len__(self):
+        return len(self.df)
+
+    def rows(self, start, stop):
+        """
+        获取 [start, stop) 范围内的行
+        :return: 元组列表
+        """
+        return list(self.df.iloc[start:stop].itertuples(index=False, name=None))
+
+    def append_rows(self, rows):
+        """
+        在末尾追加行（用于粘贴）
+        :param rows: 值列表的列表
+        """
+        width = len(self.df.columns)
+        rows = [tuple(row[:width]) + ("",) * (width - len(row[:width])) for row in rows]
+        self.df = pd.concat([self.df, pd.DataFrame(rows, columns=self.df.columns)], ignore_index=True)
+
+
+class VirtualGrid:
+    """
+    虚拟化的 Treeview 表格
+    选择状态以数据源中的行号保存，滚动后仍能正确复制和右键查询
+    """
+
+    def __init__(self, master, columns, overscan=DEFAULT_OVERSCAN, column_width=100):
+        """
+        :param master: 父容器
+        :param columns: 列名列表
+        :param overscan: 在可见窗口前后额外缓存的行数
+        :param column_width: 默认列宽
+        """
+        self.master = master
+        self.columns = list(columns)
+        self.overscan = overscan
+
+        # Treeview 的滚动由本类接管，条目数量始终等于可见行数
+        self.tree = ttk.Treeview(master, columns=self.columns, show="headings", selectmode="none")
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.scrollbar = ttk.Scrollbar(master, orient=tk.VERTICAL, command=self._on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        for col in self.columns:
+            self.tree.heading(col, text=col)
+            self.tree.column(col, width=column_width)
+
+        self.source = DataFrameSource(pd.DataFrame(columns=self.columns))
+        self.top = 0  # 可见窗口第一行在数据源中的行号
+        self.visible_rows = DEFAULT_VISIBLE_ROWS
+        self._measured = False  # 可见行数是否已按实际行高计算
+        self._measure_pending = False
+        self.selected = set()  # 选中行在数据源中的行号
+        self.anchor = None  # Shift 多选的起点
+        self.on_scroll_end = None  # 滚动到最后一行时的回调
+
+        # 可见窗口附近的行缓存
+        self._cache_start = 0
+        self._cache_rows = []
+
+        self.tree.bind("<Configure>", self._on_configure)
+        self.tree.bind("<MouseWheel>", self._on_mousewheel)  # Windows 和 macOS
+        self.tree.bind("<Button-4>", lambda event: self.scroll(-WHEEL_ROWS))  # Linux（向上滚动）
+        self.tree.bind("<Button-5>", lambda event: self.scroll(WHEEL_ROWS))  # Linux（向下滚动）
+        self.tree.bind("<Button-1>", lambda event: self._on_click(event, "single"))
+        self.tree.bind("<Shift-Button-1>", lambda event: self._on_click(event, "range"))
+        self.tree.bind("<Control-Button-1>", lambda event: self._on_click(event, "toggle"))
+        self.tree.bind("<Up>", lambda event: self._move_focus(-1))
+        self.tree.bind("<Down>", lambda event: self._move_focus(1))
+        self.tree.bind("<Prior>", lambda event: self._move_focus(-self.visible_rows))
+        self.tree.bind("<Next>", lambda event: self._move_focus(self.visible_rows))
+        self.tree.bind("<Control-Home>", lambda event: self._move_focus(-len(self.source)))
+        self.tree.bind("<Control-End>", lambda event: self._move_focus(len(self.source)))
+
+    def bind(self, sequence, func):
+        """
+        为表格绑定事件
+        """
+        return self.tree.bind(sequence, func)
+
+    def set_source(self, source, keep_position=False):
+        """
+        设置数据源
+        :param source: 数据源（实现 __len__ 和 rows）
+        :param keep_position: 是否保留滚动位置和选中行（数据源只是追加了行时使用）
+        """
+        self.source = source
+        if not keep_position:
+            self.top = 0
+            self.selected = set()
+            self.anchor = None
+        self.invalidate()
+
+    def set_dataframe(self, df, keep_position=False):
+        """
+        显示 DataFrame
+        :param df: 要显示的数据（Pandas DataFrame）
+        :param keep_position: 是否保留滚动位置和选中行
+        """
+        self.set_source(DataFrameSource(df), keep_position)
+
+    def clear(self):
+        """
+        清空表格
+        """
+        self.set_dataframe(pd.DataFrame(columns=self.columns))
+
+    def invalidate(self):
+        """
+        数据源内容变化后丢弃行缓存并重新显示
+        """
+        self._cache_start = 0
+        self._cache_rows = []
+        self.refresh()
+
+    def append_rows(self, rows):
+        """
+        在末尾追加行（用于粘贴）
+        :param rows: 值列表的列表
+        """
+        self.source.append_rows(rows)
+        self.invalidate()
+
+    def scroll(self, delta):
+        """
+        滚动指定行数
+        :param delta: 行数，负数为向上
+        """
+        self.top += delta
+        self._scrolled()
+        return "break"
+
+    def see(self, position):
+        """
+        滚动到使指定行可见
+        :param position: 数据源中的行号
+        """
+        if position < self.top:
+            self.top = position
+        elif position >= self.top + self.visible_rows:
+            self.top = position - self.visible_rows + 1
+        self._scrolled()
+
+    def refresh(self):
+        """
+        按当前可见窗口重新填充 Treeview 条目
+        """
+        total = len(self.source)
+        self.top = min(max(self.top, 0), max(total - self.visible_rows, 0))
+        stop = min(self.top + self.visible_rows, total)
+        rows = self._window(self.top, stop)
+
+        # 条目数量与可见行数保持一致，滚动时只替换条目的值
+        items = self.tree.get_children()
+        if len(items) > len(rows):
+            self.tree.delete(*items[len(rows):])
+        for i in range(len(items), len(rows)):
+            self.tree.insert("", "end", iid=str(i))
+        for i, values in enumerate(rows):
+            self.tree.item(str(i), values=values)
+
+        self.tree.selection_set([str(i) for i in range(len(rows)) if self.top + i in self.selected])
+
+        if total:
+            self.scrollbar.set(self.top / total, stop / total)
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+        # 第一次 <Configure> 通常发生在加载数据之前，此时没有条目可以测量行高；
+        # 第一次填充条目后在空闲时测量，避免可见行数停留在初始估计值
+        if rows and not self._measured and not self._measure_pending:
+            self._measure_pending = True
+            self.tree.after_idle(self._measure)
+
+    def selected_rows(self):
+        """
+        获取选中行在数据源中的行号（升序）
+        """
+        return sorted(self.selected)
+
+    def selected_values(self):
+        """
+        获取选中行的值，连续的行按块读取
+        :return: 元组列表
+        """
+        values = []
+        positions = self.selected_rows()
+        i = 0
+        while i < len(positions):
+            j = i
+            while j + 1 < len(positions) and positions[j + 1] == positions[j] + 1:
+                j += 1
+            values.extend(self.source.rows(positions[i], positions[j] + 1))
+            i = j + 1
+        return values
+
+    def row_values(self, position):
+        """
+        获取指定行的值
+        :param position: 数据源中的行号
+        """
+        rows = self.source.rows(position, position + 1)
+        return rows[0] if rows else None
+
+    def _window(self, start, stop):
+        """
+        读取 [start, stop) 的行，缓存未命中时连同前后 overscan 行一起读取
+        """
+        cache_stop = self._cache_start + len(self._cache_rows)
+        if not (self._cache_start <= start and stop <= cache_stop):
+            self._cache_start = max(start - self.overscan, 0)
+            self._cache_rows = self.source.rows(self._cache_start, stop + self.overscan)
+        return self._cache_rows[start - self._cache_start:stop - self._cache_start]
+
+    def _on_configure(self, event):
+        """
+        窗口大小变化时重新计算可见行数
+        """
+        self._measure(event.height)
+
+    def _measure(self, height=None):
+        """
+        按第一个条目的实际行高计算可见行数，变化时重新填充（没有已显示的条目时不计算，留待下次）
+        :param height: Treeview 的高度，默认取当前高度
+        """
+        self._measure_pending = False
+        items = self.tree.get_children()
+        bbox = self.tree.bbox(items[0]) if items else None
+        if not bbox:
+            return
+        if height is None:
+            height = self.tree.winfo_height()
+        _, header_height, _, row_height = bbox
+        visible_rows = max((height - header_height) // max(row_height, 1), 1)
+        self._measured = True
+        if visible_rows != self.visible_rows:
+            self.visible_rows = visible_rows
+            self.refresh()
+
+    def _on_scrollbar(self, *args):
+        """
+        处理滚动条拖动和点击
+        """
+        total = len(self.source)
+        if args[0] == "moveto":
+            self.top = int(float(args[1]) * total)
+        elif args[0] == "scroll":
+            step = self.visible_rows if args[2] == "pages" else 1
+            self.top += int(args[1]) * step
+        self._scrolled()
+
+    def _scrolled(self):
+        """
+        用户滚动后刷新显示；滚动到最后一行时通知 on_scroll_end（如加载下一页）
+        """
+        self.refresh()
+        total = len(self.source)
+        if self.on_scroll_end is not None and total and self.top + self.visible_rows >= total:
+            self.on_scroll_end()
+
+    def _on_mousewheel(self, event):
+        """
+        处理鼠标滚轮（Windows 为 120 的倍数，macOS 为较小的整数）
+        """
+        return self.scroll(-WHEEL_ROWS if event.delta > 0 else WHEEL_ROWS)
+
+    def _on_click(self, event, mode):
+        """
+        处理单击、Shift 单击和 Ctrl 单击，将选中的条目换算为数据源中的行号
+        """
+        if self.tree.identify_region(event.x, event.y) != "cell":
+            return None  # 保留表头的默认行为（如调整列宽）
+        item = self.tree.identify_row(event.y)
+        if not item:
+            return "break"
+
+        position = self.top + self.tree.index(item)
+        if mode == "toggle":
+            self.selected ^= {position}
+            self.anchor = position
+        elif mode == "range" and self.anchor is not None:
+            low, high = sorted((self.anchor, position))
+            self.selected = set(range(low, high + 1))
+        else:
+            self.selected = {position}
+            self.anchor = position
+
+        self.tree.focus_set()
+        self.refresh()
+        return "break"
+
+    def _move_focus(self, delta):
+        """
+        使用键盘移动选中行
+        """
+        total = len(self.source)
+        if not total:
+            return "break"
+        current = self.anchor if self.anchor is not None else self.top
+        position = min(max(current + delta, 0), total - 1)
+        self.selected = {position}
+        self.anchor = position
+        self.see(position)
+        return "break"
@@ -0,0 +1,135 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Audit-Inspector-Toolkit
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+凭证：按列（向量化）组装凭证表，并以 LRU 缓存已组装的凭证，翻阅凭证时相邻凭证在后台预取
+"""
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from schema import JOURNAL_COLUMNS
+
+VOUCHER_COLUMNS = ["日期", "凭证字号", "摘要", "科目名称", "借方", "贷方", "数量", "外币"]
+# 缓存的凭证数量
+VOUCHER_CACHE_SIZE = 256
+
+
+@dataclass
+class Voucher:
+    """
+    已组装的凭证
+    """
+    key: tuple  # (凭证字号, 日期)
+    table: pd.DataFrame  # 凭证表（含合计行）
+    total_debit: float
+    total_credit: float
+    prev_key: tuple = None  # 上一张凭证，不存在时为 None
+    next_key: tuple = None  # 下一张凭证，不存在时为 None
+
+    @property
+    def balanced(self):
+        return abs(self.total_debit - self.total_credit) <= 1e-6  # 浮点数精度问题
+
+
+def assemble_voucher(lines):
+    """
+    将凭证分录组装为凭证表（按列处理，不逐行循环）
+    :param lines: 凭证分录（元组列表，列顺序同 JOURNAL_COLUMNS）
+    :return: (凭证表, 借方合计, 贷方合计)
+    """
+    df = pd.DataFrame(lines, columns=JOURNAL_COLUMNS)
+
+    # 科目名称后附加【科目名称】
+    names = df["科目名称"].fillna("").astype(str)
+    stripped = names.str.strip()
+    suffix = np.where(stripped != "", "【" + stripped + "】", "")
+
+    debit = pd.to_numeric(df["借方"], errors="coerce").astype(float)
+    credit = pd.to_numeric(df["贷方"], errors="coerce").astype(float)
+    voucher_df = pd.DataFrame({
+        "日期": pd.to_datetime(df["日期"]),  # 统一为 datetime 类型
+        "凭证字号": df["凭证字号"].astype(str),  # 统一为字符串类型
+        "摘要": df["摘要"].astype(str),
+        "科目名称": names + suffix,
+        "借方": debit,
+        "贷方": credit,
+        "数量": df["数量"].where(df["数量"] != 0, ""),  # 为 0 时显示为空
+        "外币": df["外币"].where(df["外币"] != 0, ""),
+    })
+
+    # 计算借方和贷方的合计，并添加合计行
+    total_debit = debit.sum()
+    total_credit = credit.sum()
+    total_row = pd.DataFrame([{"摘要": "合     计", "借方": total_debit, "贷方": total_credit}])
+    voucher_df = pd.concat([voucher_df, total_row], ignore_index=True)
+    return voucher_df, total_debit, total_credit
+
+
+class VoucherCache:
+    """
+    凭证 LRU 缓存，键为 (凭证字号, 日期)；数据库变化时清空
+    主线程和后台预取线程都会访问，操作由锁保护
+    """
+
+    def __init__(self, capacity=VOUCHER_CACHE_SIZE):
+        """
+        :param capacity: 缓存的凭证数量
+        """
+        self.capacity = capacity
+        self.generation = 0  # 每次清空时加一，清空前开始的加载结果不再写入
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        获取缓存的凭证，命中时标记为最近使用
+        :return: Voucher，未命中时为 None
+        """
+        with self._lock:
+            voucher = self._items.get(key)
+            if voucher is not None:
+                self._items.move_to_end(key)
+            return voucher
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._items
+
+    def put(self, voucher, generation):
+        """
+        缓存凭证，超出容量时淘汰最久未使用的凭证
+        :param voucher: Voucher
+        :param generation: 开始加载时的 generation；缓存已被清空时丢弃
+        """
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._items[voucher.key] = voucher
+            self._items.move_to_end(voucher.key)
+            while len(self._items) > self.capacity:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        """
+        清空缓存（上传序时账、数据库或切换查询引擎后调用）
+        """
+        with self._lock:
+            self.generation += 1
+            self._items.clear()
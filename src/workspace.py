@@ -0,0 +1,148 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Audit-Inspector-Toolkit
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+持久化工作区：启动时重新打开上次使用的数据库（不再删除 data.db），检查表结构，
+缺失的索引、汇总表、科目层级和全文索引在后台补齐；启动耗时记录在 saved_data 目录的指标文件中
+"""
+
+import json
+import os
+import time
+
+from accounts import account_tree_ready, build_account_tree
+from fulltext import build_fts, fts_ready
+from indexes import INDEX_PLAN, build_indexes, column_names, table_exists
+from schema import table_columns
+from summary import PERIOD_SUMMARY_TABLE, build_period_summary, period_summary_ready
+
+# 记录上次使用的数据库路径的文件（位于 saved_data 目录）
+WORKSPACE_FILE = "workspace.json"
+# 性能指标文件（每行一条 JSON 记录）
+METRICS_FILE = "metrics.jsonl"
+
+
+class WorkspaceError(Exception):
+    """
+    上次使用的数据库无法作为工作区打开（如表结构与当前版本不兼容）
+    """
+
+
+def load_last_db(data_dir, default_path):
+    """
+    读取上次使用的数据库路径
+    :param data_dir: saved_data 目录
+    :param default_path: 默认数据库路径（data.db）
+    :return: 数据库路径；记录不存在或该文件已被删除时返回默认路径
+    """
+    try:
+        with open(os.path.join(data_dir, WORKSPACE_FILE), encoding="utf-8") as f:
+            db_path = json.load(f).get("db_path")
+    except (OSError, ValueError):
+        return default_path
+    return db_path if db_path and os.path.exists(db_path) else default_path
+
+
+def save_last_db(data_dir, db_path):
+    """
+    记录当前使用的数据库路径，下次启动时重新打开
+    :param data_dir: saved_data 目录
+    :param db_path: 数据库路径
+    """
+    with open(os.path.join(data_dir, WORKSPACE_FILE), "w", encoding="utf-8") as f:
+        json.dump({"db_path": os.path.abspath(db_path)}, f, ensure_ascii=False)
+
+
+def check_schema(conn):
+    """
+    检查序时账、科目余额表的表结构是否与当前版本兼容（缺少的行哈希列在追加导入时补充，不视为不兼容）
+    :param conn: sqlite3 连接
+    :raises WorkspaceError: 缺少文件标题行中的列
+    """
+    for table_name in ("journal", "balance"):
+        if not table_exists(conn, table_name):
+            continue
+        missing = [col for col in table_columns(table_name) if col not in column_names(conn, table_name)]
+        if missing:
+            raise WorkspaceError(f"数据表 {table_name} 缺少列：{', '.join(missing)}")
+
+
+def missing_indexes(conn):
+    """
+    索引计划中尚未建立的索引
+    :param conn: sqlite3 连接
+    :return: 索引名列表
+    """
+    existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+    return [
+        index_name
+        for table_name, indexes in INDEX_PLAN.items()
+        if table_exists(conn, table_name)
+        for index_name, columns in indexes
+        if index_name not in existing and set(columns) <= column_names(conn, table_name)
+    ]
+
+
+def repair(conn, token=None, fulltext=True):
+    """
+    补齐工作区中缺失的索引和派生表（在工作线程中调用；已完整的工作区只做几次元数据查询）
+    :param conn: sqlite3 连接（需可写）
+    :param token: 取消令牌（可选），每步之间检查
+    :param fulltext: 是否建立序时账全文索引
+    :return: 已执行的修复步骤（说明文字列表）
+    """
+    actions = []
+
+    def check():
+        if token is not None:
+            token.raise_if_cancelled()
+
+    indexes = missing_indexes(conn)
+    if indexes:
+        for table_name in INDEX_PLAN:
+            build_indexes(conn, table_name)
+        actions.append(f"建立索引：{', '.join(indexes)}")
+
+    has_journal = table_exists(conn, "journal") and conn.execute("SELECT 1 FROM journal LIMIT 1").fetchone()
+    if not has_journal:
+        return actions
+
+    check()
+    summary_filled = period_summary_ready(conn) and conn.execute(
+        f"SELECT 1 FROM {PERIOD_SUMMARY_TABLE} LIMIT 1"
+    ).fetchone() is not None
+    if not summary_filled:
+        build_period_summary(conn)
+        actions.append("重建科目 × 月份汇总表")
+    check()
+    if not account_tree_ready(conn) and table_exists(conn, "balance"):
+        build_account_tree(conn)
+        actions.append("重建科目层级")
+    check()
+    if fulltext and not fts_ready(conn) and build_fts(conn):
+        actions.append("建立全文索引")
+    return actions
+
+
+def record_metric(data_dir, name, **values):
+    """
+    追加一条性能指标记录
+    :param data_dir: saved_data 目录
+    :param name: 指标名称（如 "cold_start"）
+    :param values: 指标值
+    """
+    record = {"metric": name, "time": time.strftime("%Y-%m-%d %H:%M:%S"), **values}
+    with open(os.path.join(data_dir, METRICS_FILE), "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
@@ -0,0 +1,47 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Audit-Inspector-Toolkit
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+明细账：按科目编码范围直接查询序时账，不依赖可能已过期的科目层级表
+"""
+
+from accounts import build_account_tree
+from db import connect
+from engine import account_lines
+from schema import BALANCE_COLUMNS, JOURNAL_COLUMNS, create_table_sql
+
+
+def insert_journal(conn, codes):
+    placeholders = ", ".join("?" * len(JOURNAL_COLUMNS))
+    conn.executemany(
+        f"INSERT INTO journal ({', '.join(JOURNAL_COLUMNS)}) VALUES ({placeholders})",
+        [("2023-01-01", f"记-{i}", code, None, None, "", 1.0, 0.0, None, None) for i, code in enumerate(codes)],
+    )
+    conn.commit()
+
+
+def test_account_lines_ignores_stale_tree(tmp_path):
+    conn = connect(str(tmp_path / "data.db"))
+    conn.execute(create_table_sql("journal"))
+    conn.execute(create_table_sql("balance"))
+    conn.execute(
+        f"INSERT INTO balance ({', '.join(BALANCE_COLUMNS)}) VALUES ({', '.join('?' * len(BALANCE_COLUMNS))})",
+        ("1122", "应收账款", 0.0, 0.0, 0.0, 0.0, 0.0, 0.0),
+    )
+    insert_journal(conn, ["6602"])
+    build_account_tree(conn)  # 此时 1122 没有分录
+
+    insert_journal(conn, ["112201", "1123", "1122"])  # 科目层级表未重建
+    assert account_lines(conn, "1122")["科目编码"].tolist() == ["112201", "1122"]
@@ -0,0 +1,129 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Audit-Inspector-Toolkit
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+命令行：JSON 输出和退出码
+"""
+
+import csv
+import json
+
+import pytest
+
+import cli
+from schema import BALANCE_COLUMNS, JOURNAL_COLUMNS
+
+JOURNAL = [
+    ("2023-01-05", "记-1", "6602", "管理费用", "", "报销差旅费", 100.0, 0.0, 0, 0),
+    ("2023-01-05", "记-1", "1002", "银行存款", "", "报销差旅费", 0.0, 100.0, 0, 0),
+    ("2023-02-10", "记-2", "6602", "管理费用", "", "支付办公费", 50.0, 0.0, 0, 0),
+    ("2023-02-10", "记-2", "1002", "银行存款", "", "支付办公费", 0.0, 50.0, 0, 0),
+]
+BALANCE = [
+    ("6602", "管理费用", 0.0, 0.0, 150.0, 0.0, 150.0, 0.0),
+    ("1002", "银行存款", 500.0, 0.0, 0.0, 150.0, 350.0, 0.0),
+]
+
+
+def run_cli(capsys, *argv):
+    code = cli.main([str(arg) for arg in argv])
+    return code, json.loads(capsys.readouterr().out)
+
+
+def write_csv(path, columns, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        writer.writerows(rows)
+    return path
+
+
+@pytest.fixture
+def db(tmp_path, capsys):
+    db = tmp_path / "data.db"
+    journal = write_csv(tmp_path / "journal.csv", JOURNAL_COLUMNS, JOURNAL)
+    balance = write_csv(tmp_path / "balance.csv", BALANCE_COLUMNS, BALANCE)
+    code, result = run_cli(capsys, "import", db, journal)
+    assert code == cli.EXIT_OK
+    assert (result["ok"], result["command"], result["table"], result["rows"]) == (True, "import", "journal", 4)
+    code, result = run_cli(capsys, "import", db, balance, "--table", "科目余额表")
+    assert (code, result["table"], result["rows"]) == (cli.EXIT_OK, "balance", 2)
+    return db
+
+
+@pytest.mark.parametrize("command", [
+    ["validate"],
+    ["export", "journal", "out.csv"],
+    ["account", "1122"],
+])
+def test_missing_database_is_an_error(tmp_path, capsys, command):
+    path = tmp_path / "missing.db"
+    code, result = run_cli(capsys, command[0], path, *command[1:])
+    assert code == cli.EXIT_ERROR
+    assert result["ok"] is False
+    assert result["error"].startswith("FileNotFoundError")
+    assert not path.exists()
+
+
+def test_validate_exit_codes(tmp_path, capsys, db):
+    code, result = run_cli(capsys, "validate", db)
+    assert code == cli.EXIT_OK
+    assert result["ok"] is True and result["balanced"] is True
+    assert result["discrepancies"]["total_rows"] == 0
+
+    # 余额表少记 50：差异不是运行错误，ok 仍为 true，退出码为 2
+    rows = [BALANCE[0][:4] + (100.0,) + BALANCE[0][5:], BALANCE[1]]
+    balance = write_csv(tmp_path / "balance2.csv", BALANCE_COLUMNS, rows)
+    run_cli(capsys, "import", db, balance, "--table", "balance")
+    code, result = run_cli(capsys, "validate", db)
+    assert code == cli.EXIT_DISCREPANCY
+    assert result["ok"] is True and result["balanced"] is False
+    discrepancies = result["discrepancies"]
+    row = dict(zip(discrepancies["columns"], discrepancies["rows"][0]))
+    assert discrepancies["total_rows"] == 1
+    assert (row["科目编码"], row["借方差异"], row["差异类型"]) == ("6602", -50.0, "金额不一致")
+
+
+def test_query_and_filter_output_frames(capsys, db):
+    code, result = run_cli(capsys, "query", db, "journal", "科目编码=6602", "--limit", "1")
+    assert code == cli.EXIT_OK
+    assert result["columns"] == JOURNAL_COLUMNS
+    assert result["total_rows"] == 2 and len(result["rows"]) == 1  # total_rows 为实际行数
+    assert result["rows"][0][:3] == ["2023-01-05", "记-1", "6602"]
+
+    code, result = run_cli(capsys, "filter", db, "序时账", "摘要", "办公费")
+    assert code == cli.EXIT_OK
+    assert result["total_rows"] == 2
+    assert {row[1] for row in result["rows"]} == {"记-2"}
+
+
+def test_voucher_output_and_not_found(capsys, db):
+    code, result = run_cli(capsys, "voucher", db, "记-1", "2023-01-05")
+    assert code == cli.EXIT_OK
+    assert result["key"] == ["记-1", "2023-01-05"]
+    assert (result["total_debit"], result["total_credit"], result["balanced"]) == (100.0, 100.0, True)
+    assert (result["prev_key"], result["next_key"]) == (None, ["记-2", "2023-02-10"])
+    assert result["lines"]["total_rows"] == 3  # 两条分录和合计行
+
+    code, result = run_cli(capsys, "voucher", db, "记-9", "2023-01-05")
+    assert code == cli.EXIT_ERROR
+    assert result["ok"] is False and result["error"].startswith("LookupError")
+
+
+def test_query_errors_are_reported_as_json(capsys, db):
+    code, result = run_cli(capsys, "query", db, "journal", "不存在的列=1")
+    assert code == cli.EXIT_ERROR
+    assert result["ok"] is False and result["command"] == "query"
+    assert result["error"].startswith("ValueError")
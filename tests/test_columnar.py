@@ -0,0 +1,83 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Audit-Inspector-Toolkit
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+列式序时账：写入新版本时不替换仍被映射的文件
+"""
+
+import os
+
+import pytest
+
+pytest.importorskip("pyarrow")
+
+import columnar
+from columnar import ColumnarJournal
+from db import connect
+from schema import JOURNAL_COLUMNS, create_table_sql
+
+
+def journal_db(tmp_path, rows):
+    conn = connect(str(tmp_path / "data.db"))
+    conn.execute(create_table_sql("journal"))
+    insert_rows(conn, rows)
+    return conn
+
+
+def insert_rows(conn, rows):
+    placeholders = ", ".join("?" * len(JOURNAL_COLUMNS))
+    conn.executemany(f"INSERT INTO journal ({', '.join(JOURNAL_COLUMNS)}) VALUES ({placeholders})", rows)
+    conn.commit()
+
+
+def journal_row(index, summary="报销差旅费"):
+    return ("2023-01-01", f"记-{index}", "6602", "管理费用", None, summary, float(index), 0.0, None, None)
+
+
+def journal_files(directory):
+    return sorted(name for name in os.listdir(directory) if name.startswith("journal."))
+
+
+def test_append_keeps_mapped_version_readable(tmp_path, monkeypatch):
+    conn = journal_db(tmp_path, [journal_row(i) for i in range(3)])
+    journal = ColumnarJournal(str(tmp_path / "journal.arrow"))
+    assert not journal.ready()
+    journal.export(conn)
+    old_table = journal.open()  # 相当于筛选结果和表格仍引用旧版本
+    old_path = journal.current_path()
+
+    # 模拟 Windows：仍被映射的文件无法删除
+    def refuse_remove(path):
+        raise PermissionError(path)
+
+    monkeypatch.setattr(columnar.os, "remove", refuse_remove)
+    insert_rows(conn, [journal_row(3)])
+    assert journal.append(conn, after_rowid=3) == 4
+
+    assert journal.current_path() != old_path
+    assert journal.open().num_rows == 4
+    assert old_table.column("凭证字号").to_pylist() == ["记-0", "记-1", "记-2"]
+    assert os.path.exists(old_path)
+
+    # 旧版本不再被映射后，下次写入时清理
+    monkeypatch.undo()
+    del old_table
+    journal.export(conn)
+    assert journal_files(tmp_path) == ["journal.3.arrow", "journal.current"]
+    assert journal.open().num_rows == 4
+
+    journal.remove()
+    assert not journal.ready()
+    assert journal_files(tmp_path) == []
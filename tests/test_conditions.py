@@ -0,0 +1,135 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Audit-Inspector-Toolkit
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+组合筛选：条件的解析和编译，在小型序时账上核对命中的行（有无全文索引结果相同）
+"""
+
+import pytest
+
+from accounts import prefix_range
+from conditions import Condition, compile_where, parse_condition, parse_criteria
+from db import connect
+from engine import compound_filter
+from fulltext import build_fts, fts_ready
+from schema import JOURNAL_COLUMNS, create_table_sql
+
+# 日期、科目编码、摘要、借方；凭证字号为 记-<行号>
+ROWS = [
+    ("2023-03-31", "1122", "销售收款", 100.0),
+    ("2023-04-01 08:00:00", "112201", "报销差旅费", 200.0),
+    ("2023-12-31 23:59:59", "6602", "报销差旅费ABC", 0.0),
+    ("2024-01-01", "1123", "差旅", None),
+    ("2023-12-15", None, "abc差旅费", 50.5),
+]
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = connect(str(tmp_path / "data.db"))
+    conn.execute(create_table_sql("journal"))
+    placeholders = ", ".join("?" * len(JOURNAL_COLUMNS))
+    conn.executemany(
+        f"INSERT INTO journal ({', '.join(JOURNAL_COLUMNS)}) VALUES ({placeholders})",
+        [(date, f"记-{i}", code, None, None, summary, debit, 0.0, None, None)
+         for i, (date, code, summary, debit) in enumerate(ROWS)],
+    )
+    conn.commit()
+    return conn
+
+
+def matched(conn, criteria):
+    return [int(voucher.split("-")[1]) for voucher in compound_filter(conn, "journal", criteria)["凭证字号"]]
+
+
+@pytest.mark.parametrize("col, text, expected", [
+    ("日期", "=2023-12", Condition("日期", "range", low="2023-12-01", high="2024-01-01", high_inclusive=False)),
+    ("日期", ">2023-03", Condition("日期", "range", low="2023-04-01", high_inclusive=False)),
+    ("日期", "<=2023-03-31", Condition("日期", "range", high="2023-04-01", high_inclusive=False)),
+    ("日期", "2023..", Condition("日期", "range", low="2023-01-01", high_inclusive=False)),
+    ("借方", "1,000..", Condition("借方", "range", low=1000.0)),
+    ("借方", "<100", Condition("借方", "range", high=100.0, high_inclusive=False)),
+    ("借方", "=0", Condition("借方", "equals", 0.0)),
+    ("科目编码", "!6602*", Condition("科目编码", "prefix", "6602", negate=True)),
+    ("科目编码", "=6602", Condition("科目编码", "equals", "6602")),
+    ("摘要", " 差旅 ", Condition("摘要", "contains", "差旅")),
+])
+def test_parse_condition(col, text, expected):
+    assert parse_condition("journal", col, text) == expected
+
+
+@pytest.mark.parametrize("col, text", [
+    ("借方", "6602*"),
+    ("借方", ">abc"),
+    ("日期", "=2023-13"),
+    ("日期", ".."),
+    ("摘要", "!"),
+])
+def test_parse_condition_rejects(col, text):
+    with pytest.raises(ValueError):
+        parse_condition("journal", col, text)
+
+
+@pytest.mark.parametrize("code, included", [
+    ("1122", True),
+    ("112201", True),
+    ("1122zz", True),
+    ("1123", False),
+    ("112", False),
+    ("1121999", False),
+])
+def test_prefix_range(code, included):
+    low, high = prefix_range("1122")
+    assert (low <= code < high) is included
+
+
+def test_compile_where_prefix_uses_range(conn):
+    where, params = compile_where(conn, "journal", parse_criteria("journal", {"科目编码": "!1122*"}))
+    assert where == "((科目编码 >= ? AND 科目编码 < ?) IS NOT 1)"
+    assert params == ("1122", "1123")
+
+
+CASES = [
+    ({"日期": "=2023-12"}, [2, 4]),  # 跨年的整月
+    ({"日期": ">2023-03"}, [1, 2, 3, 4]),
+    ({"日期": ">=2023-03"}, [0, 1, 2, 3, 4]),
+    ({"日期": "<2023-04"}, [0]),
+    ({"日期": "2023-04..2023-12"}, [1, 2, 4]),
+    ({"科目编码": "1122*"}, [0, 1]),
+    ({"科目编码": "!1122*"}, [2, 3, 4]),  # 科目编码为空的行保留
+    ({"科目编码": "=1122"}, [0]),
+    ({"借方": ">=100"}, [0, 1]),
+    ({"借方": "!=0"}, [0, 1, 3, 4]),
+    ({"摘要": "差旅费"}, [1, 2, 4]),
+    ({"摘要": "ABC"}, [2, 4]),
+    ({"摘要": "!差旅"}, [0]),
+    ({"摘要": "差旅费", "日期": "=2023-12"}, [2, 4]),
+    ({"摘要": "差旅费", "科目名称": "", "科目编码": "!6602*"}, [1, 4]),
+]
+
+
+@pytest.mark.parametrize("criteria, expected", CASES)
+def test_compound_filter(conn, criteria, expected):
+    assert matched(conn, criteria) == expected
+
+
+def test_fulltext_matches_like(conn):
+    without_index = [matched(conn, criteria) for criteria, _ in CASES]
+    if not build_fts(conn):
+        pytest.skip("当前 SQLite 不支持 FTS5 trigram")
+    assert fts_ready(conn)
+    where, _ = compile_where(conn, "journal", parse_criteria("journal", {"摘要": "差旅费"}))
+    assert "journal_fts" in where
+    assert [matched(conn, criteria) for criteria, _ in CASES] == without_index
@@ -0,0 +1,73 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Audit-Inspector-Toolkit
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+数据库连接：只有工作区数据库切换为 WAL 模式，用户的数据库保持原来的日志模式或只读打开
+"""
+
+import sqlite3
+from contextlib import closing
+
+import pytest
+
+from db import ConnectionManager, connect
+
+
+def journal_mode(path):
+    with closing(sqlite3.connect(path)) as conn:
+        return conn.execute("PRAGMA journal_mode").fetchone()[0]
+
+
+def create_user_db(path):
+    with closing(sqlite3.connect(path)) as conn:
+        conn.execute("CREATE TABLE t (x)")
+        conn.execute("INSERT INTO t VALUES (1)")
+        conn.commit()
+
+
+def test_user_database_keeps_journal_mode(tmp_path):
+    path = str(tmp_path / "user.db")
+    create_user_db(path)
+    db = ConnectionManager(path)
+    with db.writer() as conn:
+        conn.execute("INSERT INTO t VALUES (2)")
+        conn.commit()
+    assert db.reader().execute("SELECT COUNT(*) FROM t").fetchone()[0] == 2
+    db.close_all()
+    assert journal_mode(path) == "delete"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["user.db"]
+
+
+def test_workspace_database_uses_wal(tmp_path):
+    path = str(tmp_path / "data.db")
+    db = ConnectionManager(path, wal=True)
+    with db.writer() as conn:
+        conn.execute("CREATE TABLE t (x)")
+    db.set_path(str(tmp_path / "other.db"))
+    db.close_all()
+    assert journal_mode(path) == "wal"
+    assert journal_mode(str(tmp_path / "other.db")) == "delete"
+
+
+def test_read_only_connection(tmp_path):
+    path = tmp_path / "用户 #1.db"
+    create_user_db(str(path))
+    with closing(connect(str(path), read_only=True)) as conn:
+        assert conn.execute("SELECT x FROM t").fetchall() == [(1,)]
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("INSERT INTO t VALUES (2)")
+    with pytest.raises(sqlite3.OperationalError):
+        connect(str(tmp_path / "missing.db"), read_only=True)
+    assert not (tmp_path / "missing.db").exists()
@@ -0,0 +1,80 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Audit-Inspector-Toolkit
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+流式导出：Excel 超过单个工作表的行数上限时续写到新的工作表，取消时不破坏已有的目标文件
+"""
+
+import pytest
+
+from db import connect
+from export import export_table
+from jobs import CancelToken, JobCancelled
+from schema import BALANCE_COLUMNS, create_table_sql
+
+openpyxl = pytest.importorskip("openpyxl")
+
+
+def make_db(tmp_path, rows):
+    conn = connect(str(tmp_path / "data.db"))
+    conn.execute(create_table_sql("balance"))
+    conn.executemany(
+        f"INSERT INTO balance ({', '.join(BALANCE_COLUMNS)}) VALUES ({', '.join('?' * len(BALANCE_COLUMNS))})",
+        [(f"{1000 + i}", f"科目{i}", 0.0, 0.0, float(i), 0.0, 0.0, 0.0) for i in range(rows)],
+    )
+    conn.commit()
+    return conn
+
+
+def read_sheets(path):
+    workbook = openpyxl.load_workbook(path, read_only=True)
+    sheets = {sheet.title: [row for row in sheet.iter_rows(values_only=True)] for sheet in workbook.worksheets}
+    workbook.close()
+    return sheets
+
+
+@pytest.mark.parametrize("rows, sizes", [
+    (7, [3, 3, 1]),
+    (6, [3, 3]),  # 恰好写满最后一个工作表时不再新建空工作表
+    (0, [0]),  # 空表也写出标题行
+])
+def test_xlsx_rolls_over_to_new_sheets(tmp_path, rows, sizes):
+    conn = make_db(tmp_path, rows)
+    path = str(tmp_path / "balance.xlsx")
+    # 上限含标题行：每个工作表 3 行数据
+    stats = export_table(conn, "balance", path, batch_rows=2, sheet_name="科目余额表", max_rows=4)
+    assert (stats.rows, stats.total_rows, stats.sheets) == (rows, rows, len(sizes))
+
+    sheets = read_sheets(path)
+    assert list(sheets) == ["科目余额表"] + [f"科目余额表_{i}" for i in range(2, len(sizes) + 1)]
+    assert [len(sheet) - 1 for sheet in sheets.values()] == sizes
+    assert all(sheet[0] == tuple(BALANCE_COLUMNS) for sheet in sheets.values())
+    codes = [row[0] for sheet in sheets.values() for row in sheet[1:]]
+    assert codes == [f"{1000 + i}" for i in range(rows)]  # 按 rowid 顺序续写，不丢行、不重复
+    conn.close()
+
+
+def test_cancelled_export_keeps_existing_file(tmp_path):
+    conn = make_db(tmp_path, 10)
+    path = tmp_path / "balance.xlsx"
+    path.write_bytes(b"old")
+    token = CancelToken()
+    token.cancel()
+    with pytest.raises(JobCancelled):
+        export_table(conn, "balance", str(path), token=token)
+    assert path.read_bytes() == b"old"
+    assert [p.name for p in tmp_path.iterdir() if ".tmp" in p.name] == []
+    conn.close()
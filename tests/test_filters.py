@@ -0,0 +1,67 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Audit-Inspector-Toolkit
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+“包含”筛选：数据库（LIKE 及全文索引）、pandas 和列式引擎对同一筛选文本命中相同的行
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from db import connect
+from engine import filter_rows
+from filters import contains_mask
+from fulltext import build_fts, drop_fts
+from schema import JOURNAL_COLUMNS, create_table_sql
+
+SUMMARIES = ["100%完成", "100a完成", "a_b_c", "axbxc", "报销差旅费ABC", "abc", "a.c", "a\\c", None]
+
+
+@pytest.fixture
+def journal(tmp_path):
+    conn = connect(str(tmp_path / "data.db"))
+    conn.execute(create_table_sql("journal"))
+    placeholders = ", ".join("?" * len(JOURNAL_COLUMNS))
+    conn.executemany(
+        f"INSERT INTO journal ({', '.join(JOURNAL_COLUMNS)}) VALUES ({placeholders})",
+        [("2023-01-01", f"记-{i}", "6602", "管理费用", None, summary, 1.0, 0.0, None, None)
+         for i, summary in enumerate(SUMMARIES)],
+    )
+    conn.commit()
+    return conn
+
+
+def sql_positions(conn, text):
+    summaries = filter_rows(conn, "journal", "摘要", text)["凭证字号"]
+    return [int(voucher.split("-")[1]) for voucher in summaries]
+
+
+@pytest.mark.parametrize("text", ["%", "0%完", "a_b", "_", "abc", "ABC", "a.c", ".", "a\\c", "差旅", "none"])
+def test_contains_matches_across_engines(journal, text):
+    expected = [i for i, summary in enumerate(SUMMARIES) if summary is not None and text.lower() in summary.lower()]
+    assert sql_positions(journal, text) == expected
+    if build_fts(journal):
+        assert sql_positions(journal, text) == expected
+        drop_fts(journal)
+
+    values = pd.Series(SUMMARIES, dtype=object)
+    assert np.flatnonzero(contains_mask(values, text)).tolist() == expected
+    assert np.flatnonzero(contains_mask(values.astype("category"), text)).tolist() == expected
+
+    pa = pytest.importorskip("pyarrow")
+    from columnar import contains_positions
+    table = pa.table({"摘要": pa.array(SUMMARIES, type=pa.string())})
+    assert contains_positions(table, "摘要", text).tolist() == expected
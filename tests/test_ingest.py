@@ -0,0 +1,196 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Audit-Inspector-Toolkit
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Excel 文件读取：python-calamine 与 openpyxl 读取同一工作簿，写入数据库的值和行哈希须相同
+"""
+
+import datetime
+import os
+import tempfile
+
+import pandas as pd
+import pytest
+
+import ingest
+from db import connect
+from engine import compound_filter, import_ledger
+from fulltext import FTS_TABLE
+from ingest import ChunkReader, bulk_load, import_files, prepare_chunk
+from rowhash import RowHasher
+from schema import JOURNAL_COLUMNS
+from summary import PERIOD_SUMMARY_TABLE
+
+
+ROWS = [
+    [datetime.datetime(2023, 1, 1), "记-1", 1122, "应收账款", None, "销售", 100.5, 0, None, None],
+    [datetime.datetime(2023, 1, 1), "记-1", 112201, "应收账款-甲公司", "客户:甲", "销售", 0, 100.5, 2, None],
+    [datetime.datetime(2023, 1, 31, 8, 30), 15, 6602, "管理费用", None, "报销差旅费", 200.0, 0, None, 1.25],
+]
+
+
+def read_all(path, table_name="journal"):
+    hasher = RowHasher(table_name)
+    columns = []
+    for chunk in ChunkReader(path, chunksize=2):
+        values = prepare_chunk(chunk, table_name, hasher)
+        if not columns:
+            columns = [[] for _ in values]
+        for target, column in zip(columns, values):
+            target.extend(column)
+    return columns
+
+
+def test_calamine_and_openpyxl_read_identical_rows(tmp_path, monkeypatch):
+    openpyxl = pytest.importorskip("openpyxl")
+    pytest.importorskip("python_calamine")
+    path = tmp_path / "journal.xlsx"
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(JOURNAL_COLUMNS)
+    for row in ROWS:
+        sheet.append(row)
+    workbook.save(path)
+
+    calamine = read_all(str(path))
+    monkeypatch.setattr(ingest, "_open_calamine", lambda file_path: None)
+    openpyxl_values = read_all(str(path))
+
+    assert calamine == openpyxl_values  # 包括最后一列行哈希
+    codes = calamine[JOURNAL_COLUMNS.index("科目编码")]
+    assert codes == ["1122", "112201", "6602"]
+    assert calamine[JOURNAL_COLUMNS.index("凭证字号")] == ["记-1", "记-1", "15"]
+    assert calamine[JOURNAL_COLUMNS.index("日期")][0] == "2023-01-01 00:00:00"
+
+
+@pytest.mark.parametrize("value, expected", [
+    (1122.0, 1122),
+    (100.5, 100.5),
+    (datetime.date(2023, 3, 5), datetime.datetime(2023, 3, 5)),
+    (datetime.datetime(2023, 3, 5, 8), datetime.datetime(2023, 3, 5, 8)),
+    ("1122.0", "1122.0"),
+    ("", None),
+    (None, None),
+])
+def test_convert_calamine_cell(value, expected):
+    converted = ingest.convert_calamine_cell(value)
+    assert converted == expected
+    assert type(converted) is type(expected)
+
+
+def write_months(tmp_path, months=3, rows=250):
+    paths = []
+    for month in range(1, months + 1):
+        df = pd.DataFrame({
+            "日期": [f"2023-{month:02d}-{day % 28 + 1:02d}" for day in range(rows)],
+            "凭证字号": [f"记-{i // 2}" for i in range(rows)],
+            "科目编码": ["6602" if i % 2 else "1002" for i in range(rows)],
+            "科目名称": ["管理费用" if i % 2 else "银行存款" for i in range(rows)],
+            "辅助核算": [None] * rows,
+            "摘要": [f"报销{month}月差旅费"] * rows,
+            "借方": [float(i % 2 * i) for i in range(rows)],
+            "贷方": [float((i + 1) % 2 * (i + 1)) for i in range(rows)],
+            "数量": [None] * rows,
+            "外币": [None] * rows,
+        })
+        df.loc[rows // 2] = df.loc[0]  # 文件内的重复行按出现次序区分，不会被跳过
+        path = tmp_path / f"journal_{month:02d}.csv"
+        df.to_csv(path, index=False)
+        paths.append(str(path))
+    return paths
+
+
+def table_rows(conn):
+    return conn.execute("SELECT * FROM journal ORDER BY rowid").fetchall()
+
+
+def test_import_files_matches_sequential_import(tmp_path, monkeypatch):
+    paths = write_months(tmp_path)
+    spill_root = tmp_path / "spill"
+    spill_root.mkdir()
+    monkeypatch.setattr(tempfile, "tempdir", str(spill_root))
+
+    parallel = connect(str(tmp_path / "parallel.db"))
+    stats = import_files(parallel, "journal", paths, max_workers=2)
+    sequential = connect(str(tmp_path / "sequential.db"))
+    for index, path in enumerate(paths):
+        bulk_load(sequential, "journal", ChunkReader(path, chunksize=100), replace=index == 0)
+
+    assert stats.rows == 750
+    assert table_rows(parallel) == table_rows(sequential)
+    assert os.listdir(spill_root) == []  # 临时文件已删除
+
+
+def derived_tables(conn):
+    fts = conn.execute(f"SELECT rowid FROM {FTS_TABLE} WHERE 摘要 LIKE '%2月差旅%' ORDER BY rowid").fetchall()
+    conn.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES('integrity-check')")
+    return (
+        conn.execute(f"SELECT * FROM {PERIOD_SUMMARY_TABLE} ORDER BY 1, 2").fetchall(),
+        fts,
+    )
+
+
+def test_append_skips_overlapping_rows(tmp_path):
+    january, february, march = write_months(tmp_path)
+    overlap = tmp_path / "journal_02_03.csv"
+    pd.concat([pd.read_csv(february), pd.read_csv(march)]).to_csv(overlap, index=False)
+
+    appended = connect(str(tmp_path / "appended.db"))
+    import_ledger(appended, "journal", [january, february])
+    stats = import_ledger(appended, "journal", [str(overlap)], append=True)
+    fresh = connect(str(tmp_path / "fresh.db"))
+    import_ledger(fresh, "journal", [january, february, march])
+
+    assert (stats.rows, stats.skipped) == (250, 250)  # 2 月的行（包括文件内的重复行）全部跳过
+    assert table_rows(appended) == table_rows(fresh)
+    assert derived_tables(appended) == derived_tables(fresh)
+
+
+def test_non_iso_csv_dates_are_normalised(tmp_path):
+    dates = ["2023/3/5", "2023/3/31 8:30", "20230401", "2023年4月2日", "2023-03-10", "2023/2/30"]
+    df = pd.DataFrame({col: [None] * len(dates) for col in JOURNAL_COLUMNS})
+    df["日期"] = dates
+    df["凭证字号"] = [f"记-{i}" for i in range(len(dates))]
+    df["科目编码"] = "6602"
+    df["借方"] = 1.0
+    path = tmp_path / "journal.csv"
+    df.to_csv(path, index=False)
+
+    conn = connect(str(tmp_path / "data.db"))
+    import_ledger(conn, "journal", [str(path)])
+
+    stored = [row[0] for row in conn.execute("SELECT 日期 FROM journal ORDER BY rowid")]
+    assert stored == ["2023-03-05", "2023-03-31 08:30:00", "2023-04-01", "2023-04-02", "2023-03-10", "2023/2/30"]
+    march = compound_filter(conn, "journal", {"日期": "=2023-03"})
+    assert march["凭证字号"].tolist() == ["记-0", "记-1", "记-4"]
+    months = conn.execute(f"SELECT 年月, 分录数 FROM {PERIOD_SUMMARY_TABLE} ORDER BY 年月").fetchall()
+    assert months == [("2023-03", 3), ("2023-04", 2), ("2023/2/", 1)]  # 无法识别的日期原样保存
+
+
+def test_append_into_legacy_database_skips_existing_rows(tmp_path):
+    path = write_months(tmp_path, months=1)[0]
+    df = pd.read_csv(path)
+    df["科目编码"] = df["科目编码"].astype("Int64")
+    df.loc[1, "科目编码"] = None  # 文件中为 6602 和空值，pandas 读为浮点数
+    df.to_csv(path, index=False)
+    conn = connect(str(tmp_path / "legacy.db"))
+    # 旧版本以 to_sql 导入：科目编码保存为 REAL（6602.0），没有行哈希列
+    pd.read_csv(path).to_sql("journal", conn, index=False)
+    assert conn.execute("SELECT typeof(科目编码) FROM journal LIMIT 1").fetchone()[0] == "real"
+
+    stats = import_ledger(conn, "journal", [path], append=True)
+
+    assert (stats.rows, stats.skipped) == (0, 250)
+    assert conn.execute("SELECT COUNT(*) FROM journal").fetchone()[0] == 250
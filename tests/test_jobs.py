@@ -0,0 +1,194 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Audit-Inspector-Toolkit
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+后台任务：取消令牌中断正在执行的查询，同组的新任务取消旧任务，已取消的任务不回调；
+即时筛选显示前几行后被新的输入取代时，尚未读完的查询被中断
+"""
+
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from db import ConnectionManager
+from engine import compound_filter
+from jobs import CancelToken, JobCancelled, JobExecutor
+from schema import JOURNAL_COLUMNS, create_table_sql
+
+# 不中断时要执行很久的查询
+SLOW_SQL = """
+    WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c)
+    SELECT COUNT(*) FROM (SELECT x FROM c LIMIT 10000000000)
+"""
+
+
+class FakeRoot:
+    """
+    代替 Tk 根窗口：after() 登记的回调由 pump 在测试线程（相当于主线程）中执行
+    """
+
+    def __init__(self):
+        self.pending = []
+
+    def after(self, ms, callback, *args):
+        self.pending.append((callback, args))
+
+    def report_callback_exception(self, exc_type, exc, tb):
+        raise exc
+
+
+def pump(root, until, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not until():
+        assert time.monotonic() < deadline, "等待任务结束超时"
+        callbacks, root.pending = root.pending, []
+        for callback, args in callbacks:
+            callback(*args)
+        time.sleep(0.005)
+
+
+def slow_query(conn, started):
+    """
+    执行慢查询，开始执行后设置 started
+    """
+    conn.set_progress_handler(lambda: started.set() and 0, 1000)
+    return conn.execute(SLOW_SQL).fetchone()[0]
+
+
+def test_cancel_interrupts_running_query():
+    conn = sqlite3.connect(":memory:", check_same_thread=False)
+    token = CancelToken()
+    started = threading.Event()
+    errors = []
+
+    def worker():
+        with token.bind(conn):
+            try:
+                slow_query(conn, started)
+            except sqlite3.OperationalError as e:
+                errors.append(e)
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    assert started.wait(5)
+    token.cancel()
+    thread.join(5)
+    assert not thread.is_alive()
+    assert "interrupted" in str(errors[0])
+
+    with pytest.raises(JobCancelled):
+        token.raise_if_cancelled()
+    with pytest.raises(JobCancelled):
+        with token.bind(conn):
+            pass
+
+
+def test_new_job_in_group_cancels_previous():
+    root = FakeRoot()
+    executor = JobExecutor(root, max_workers=2)
+    started = threading.Event()
+    callbacks = []
+
+    def slow_job(token):
+        conn = sqlite3.connect(":memory:", check_same_thread=False)
+        with token.bind(conn):
+            return slow_query(conn, started)
+
+    first = executor.submit(
+        slow_job, on_done=lambda r: callbacks.append(("first", r)), on_error=lambda e: callbacks.append(("first", e)),
+        group="filter:序时账",
+    )
+    assert started.wait(5)
+    second = executor.submit(lambda token: "ok", on_done=lambda r: callbacks.append(("second", r)), group="filter:序时账")
+
+    pump(root, lambda: not executor._tokens)
+    assert first.cancelled and not second.cancelled
+    assert callbacks == [("second", "ok")]  # 被取消的任务不回调
+    executor.shutdown()
+
+
+def test_errors_are_reported_on_main_thread():
+    root = FakeRoot()
+    executor = JobExecutor(root)
+    main_thread = threading.get_ident()
+    seen = []
+
+    def failing(token):
+        raise ValueError("列名 'x' 不存在！")
+
+    executor.submit(failing, on_error=lambda e: seen.append((threading.get_ident(), e)))
+    pump(root, lambda: seen)
+    assert seen[0][0] == main_thread
+    assert isinstance(seen[0][1], ValueError)
+
+    token = executor.submit(lambda token: time.sleep(0.05), on_done=lambda r: seen.append("done"))
+    executor.cancel_all()
+    pump(root, lambda: not executor._tokens)
+    assert token.cancelled and "done" not in seen
+    executor.shutdown()
+
+
+def test_live_filter_cancelled_after_first_rows(tmp_path):
+    db = ConnectionManager(str(tmp_path / "data.db"))
+    with db.writer() as conn:
+        conn.execute(create_table_sql("journal"))
+        conn.executemany(
+            f"INSERT INTO journal ({', '.join(JOURNAL_COLUMNS)}) VALUES ({', '.join('?' * len(JOURNAL_COLUMNS))})",
+            [("2023-01-05", f"记-{i}", "6602", "管理费用", None, "报销差旅费", 1.0, 0.0, None, None)
+             for i in range(5000)],
+        )
+        conn.commit()
+    root = FakeRoot()
+    executor = JobExecutor(root, max_workers=2)
+    first_shown = threading.Event()
+    superseded = threading.Event()
+    shown, callbacks, errors = [], [], []
+
+    def filter_job(token, criteria, on_first):
+        with token.bind(db.reader()) as conn:
+            try:
+                return compound_filter(conn, "journal", criteria, 200, on_first)
+            except sqlite3.OperationalError as e:
+                errors.append(e)
+                raise
+
+    def show_first_then_wait(df):
+        # 前 200 行已读到，其余的行尚未读取时用户继续输入
+        executor.post(shown.append, ("first", len(df)))
+        first_shown.set()
+        superseded.wait(5)
+
+    first = executor.submit(
+        filter_job, {"摘要": "差旅"}, show_first_then_wait,
+        on_done=lambda df: callbacks.append(("first", len(df))), on_error=lambda e: callbacks.append(("first", e)),
+        group="filter:序时账",
+    )
+    assert first_shown.wait(5)
+    second = executor.submit(
+        filter_job, {"摘要": "差旅", "凭证字号": "记-42"}, lambda df: executor.post(shown.append, ("second", len(df))),
+        on_done=lambda df: callbacks.append(("second", len(df))), group="filter:序时账",
+    )
+    assert first.cancelled
+    superseded.set()
+
+    pump(root, lambda: not executor._tokens)
+    assert "interrupted" in str(errors[0])  # 旧查询读取其余的行时被中断
+    assert callbacks == [("second", 111)]  # 记-42、记-420～429、记-4200～4299
+    assert shown == [("first", 200), ("second", 111)]
+    assert not second.cancelled
+    executor.shutdown()
+    db.close_all()
@@ -0,0 +1,119 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Audit-Inspector-Toolkit
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+键集分页：页边界、表尾、rowid 不连续时的下一页以及后台预取
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from db import ConnectionManager
+from pager import KeysetPager
+
+COLUMNS = ["凭证字号", "借方"]
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = ConnectionManager(str(tmp_path / "data.db"))
+    with db.writer() as conn:
+        conn.execute("CREATE TABLE journal (凭证字号 TEXT, 借方 REAL)")
+        conn.executemany("INSERT INTO journal VALUES (?, ?)", [(f"记-{i}", float(i)) for i in range(25)])
+        conn.commit()
+    yield db
+    db.close_all()
+
+
+class BackgroundExecutor:
+    """
+    只提供 submit_background 的执行器（预取不需要回调主线程）
+    """
+
+    def __init__(self):
+        self.pool = ThreadPoolExecutor(max_workers=1)
+        self.submitted = 0
+
+    def submit_background(self, func, *args):
+        self.submitted += 1
+        return self.pool.submit(func, *args)
+
+
+def vouchers(rows):
+    return [row[0] for row in rows]
+
+
+def test_pages_until_end_of_table(db):
+    pager = KeysetPager(db, "journal", COLUMNS, page_size=10)
+    assert len(pager) == 0
+    assert len(pager.load_next_page()) == 10
+    assert not pager.exhausted
+    pager.load_next_page()
+    # 跨页读取
+    assert vouchers(pager.rows(8, 13)) == ["记-8", "记-9", "记-10", "记-11", "记-12"]
+    assert pager.load_next_page()["凭证字号"].tolist() == [f"记-{i}" for i in range(20, 25)]
+    assert pager.exhausted and len(pager) == 25
+    assert pager.load_next_page().empty
+    assert vouchers(pager.rows(20, 100)) == [f"记-{i}" for i in range(20, 25)]
+
+
+def test_page_boundary_at_table_end(db):
+    with db.writer() as conn:
+        conn.execute("DELETE FROM journal WHERE rowid > 20")
+        conn.commit()
+    pager = KeysetPager(db, "journal", COLUMNS, page_size=10)
+    pager.load_next_page()
+    pager.load_next_page()
+    assert not pager.exhausted  # 恰好读满一页时还不知道是否到达表尾
+    assert pager.load_next_page().empty
+    assert pager.exhausted and len(pager.pages) == 2
+
+
+def test_keyset_skips_rowid_gaps(db):
+    with db.writer() as conn:
+        conn.execute("DELETE FROM journal WHERE rowid IN (3, 4, 5, 11, 12)")
+        conn.commit()
+    pager = KeysetPager(db, "journal", COLUMNS, page_size=4)
+    while not pager.exhausted:
+        pager.load_next_page()
+    expected = [f"记-{i}" for i in range(25) if i + 1 not in (3, 4, 5, 11, 12)]
+    assert vouchers(pager.rows(0, len(pager))) == expected
+
+
+def test_prefetch_near_end(db):
+    executor = BackgroundExecutor()
+    pager = KeysetPager(db, "journal", COLUMNS, page_size=5, prefetch_pages=2, executor=executor)
+    pager.load_next_page()
+    pager.rows(0, 5)  # 接近已加载的末尾，后台预取 2 页
+    pager._prefetch_future.result()
+    assert executor.submitted == 1 and len(pager) == 15
+
+    # 再次触发预取后立即同步加载下一页：等待（或取消尚未开始的）预取，返回的是紧接着的行，不会重复读取
+    pager.rows(10, 15)
+    assert pager.load_next_page()["凭证字号"].iloc[0] == "记-15"
+    while not pager.exhausted:
+        pager.load_next_page()
+    assert vouchers(pager.rows(0, len(pager))) == [f"记-{i}" for i in range(25)]
+    assert pager.error is None
+
+
+def test_prefetch_stops_when_exhausted(db):
+    executor = BackgroundExecutor()
+    pager = KeysetPager(db, "journal", COLUMNS, page_size=100, executor=executor)
+    pager.load_next_page()
+    assert pager.exhausted
+    pager.rows(0, 25)
+    assert executor.submitted == 0
@@ -0,0 +1,43 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Audit-Inspector-Toolkit
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+操作追踪：常驻内存的读取
+"""
+
+import builtins
+import sys
+
+import pytest
+
+import tracing
+
+
+def test_current_rss_without_proc_uses_windows_reader(monkeypatch):
+    real_open = builtins.open
+
+    def no_proc(path, *args, **kwargs):
+        if str(path).startswith("/proc/"):
+            raise FileNotFoundError(path)
+        return real_open(path, *args, **kwargs)
+
+    monkeypatch.setattr(builtins, "open", no_proc)
+    monkeypatch.setattr(tracing, "_windows_rss", lambda: 123)
+    assert tracing.current_rss() == 123
+
+
+@pytest.mark.skipif(sys.platform != "win32", reason="仅 Windows")
+def test_windows_rss_reader():
+    assert tracing._windows_rss() > 0
@@ -0,0 +1,124 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Audit-Inspector-Toolkit
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+数据校验：仅序时账、仅余额表的科目与借贷方分别核对；核对结果不取决于汇总表、科目层级表是否已建立
+"""
+
+import pytest
+
+from accounts import build_account_tree
+from db import connect
+from schema import BALANCE_COLUMNS, JOURNAL_COLUMNS, create_table_sql
+from summary import build_period_summary
+from validation import RESULT_TABLE, reconcile
+
+# 科目编码、借方、贷方
+JOURNAL = [
+    ("112201", 100.0, 0.0),
+    ("112202", 0.0, 30.0),
+    ("1122", 5.0, 0.0),  # 直接记在上级科目的分录
+    ("6602", 200.0, 0.0),
+    ("9999", 1.0, 0.0),
+    (None, 7.0, 0.0),
+]
+# 科目编码、本期借方发生额、本期贷方发生额
+BALANCE = [
+    ("1122", 105.0, 30.0),  # 上级科目与其全部下级科目的分录合计核对
+    ("112201", 100.0, 0.0),
+    ("112202", 0.0, 30.0),
+    ("6602", 150.0, 0.0),
+    ("1002", 10.0, 0.0),
+]
+EXPECTED = [
+    (None, 0.0, 7.0, "仅序时账"),
+    ("1002", 10.0, 0.0, "仅余额表"),
+    ("6602", 150.0, 200.0, "金额不一致"),
+    ("9999", 0.0, 1.0, "仅序时账"),
+]
+
+
+def make_db(tmp_path, journal, balance):
+    conn = connect(str(tmp_path / "data.db"))
+    conn.execute(create_table_sql("journal"))
+    conn.execute(create_table_sql("balance"))
+    conn.executemany(
+        f"INSERT INTO journal ({', '.join(JOURNAL_COLUMNS)}) VALUES ({', '.join('?' * len(JOURNAL_COLUMNS))})",
+        [("2023-01-01", f"记-{i}", code, f"科目{code}", None, "", debit, credit, None, None)
+         for i, (code, debit, credit) in enumerate(journal)],
+    )
+    conn.executemany(
+        f"INSERT INTO balance ({', '.join(BALANCE_COLUMNS)}) VALUES ({', '.join('?' * len(BALANCE_COLUMNS))})",
+        [(code, f"科目{code}", 0.0, 0.0, debit, credit, 0.0, 0.0) for code, debit, credit in balance],
+    )
+    conn.commit()
+    return conn
+
+
+@pytest.fixture
+def conn(tmp_path):
+    return make_db(tmp_path, JOURNAL, BALANCE)
+
+
+def discrepancies(conn):
+    result = reconcile(conn)
+    assert len(result) == conn.execute(f"SELECT COUNT(*) FROM {RESULT_TABLE}").fetchone()[0]
+    return conn.execute(
+        f"SELECT 科目编码, 余额表借方发生额, 序时账借方金额, 差异类型 FROM {RESULT_TABLE} ORDER BY rowid"
+    ).fetchall()
+
+
+def test_reconcile_same_with_and_without_derived_tables(conn):
+    assert discrepancies(conn) == EXPECTED  # 直接汇总序时账
+    build_period_summary(conn)
+    assert discrepancies(conn) == EXPECTED  # 读取科目 × 月份汇总表
+    build_account_tree(conn)
+    assert discrepancies(conn) == EXPECTED  # 科目层级表已建立时结果不变
+
+
+def test_journal_only_and_balance_only_codes_keep_both_sides(tmp_path):
+    conn = make_db(tmp_path, [("2241", 0.0, 12.5)], [("2202", 3.0, 4.0)])
+    reconcile(conn)
+    rows = conn.execute(
+        f"SELECT 科目编码, 余额表借方发生额, 余额表贷方发生额, 序时账借方金额, 序时账贷方金额, 差异类型 "
+        f"FROM {RESULT_TABLE} ORDER BY 科目编码"
+    ).fetchall()
+    assert rows == [
+        ("2202", 3.0, 4.0, 0.0, 0.0, "仅余额表"),
+        ("2241", 0.0, 0.0, 0.0, 12.5, "仅序时账"),
+    ]
+
+
+def test_debit_and_credit_differences_do_not_cancel_out(tmp_path):
+    # 借方多 10、贷方也多 10，按净额核对会相互抵消
+    conn = make_db(tmp_path, [("1002", 90.0, 40.0)], [("1002", 100.0, 50.0)])
+    reconcile(conn)
+    rows = conn.execute(f"SELECT 科目编码, 借方差异, 贷方差异, 差异类型 FROM {RESULT_TABLE}").fetchall()
+    assert rows == [("1002", 10.0, 10.0, "金额不一致")]
+
+
+def test_differences_within_tolerance_are_ignored(tmp_path):
+    conn = make_db(
+        tmp_path,
+        [("1001", 0.1, 0.0), ("1001", 0.2, 0.0), ("1002", 0.0, 99.99)],
+        [("1001", 0.3, 0.0), ("1002", 0.0, 100.0)],
+    )
+    assert list(reconcile(conn)["科目编码"]) == ["1002"]  # 0.1 + 0.2 的浮点误差不计为差异
+
+
+def test_reconcile_without_balance_table_returns_none(tmp_path):
+    conn = connect(str(tmp_path / "data.db"))
+    conn.execute(create_table_sql("journal"))
+    assert reconcile(conn) is None
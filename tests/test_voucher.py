@@ -0,0 +1,113 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Audit-Inspector-Toolkit
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+凭证：组装凭证表与合计行、相邻凭证，以及 LRU 缓存的淘汰顺序和清空后丢弃过期的加载结果
+"""
+
+import pandas as pd
+import pytest
+
+from db import connect
+from engine import find_voucher
+from schema import JOURNAL_COLUMNS, create_table_sql
+from voucher import VOUCHER_COLUMNS, Voucher, VoucherCache, assemble_voucher
+
+# 日期、凭证字号、科目编码、科目名称、借方、贷方
+LINES = [
+    ("2023-01-05", "记-1", "6602", "管理费用", 120.5, 0.0),
+    ("2023-01-05", "记-1", "1002", " 银行存款 ", 0.0, 120.5),
+    ("2023-01-06", "记-2", "1001", None, 30.0, 0.0),
+    ("2023-01-06", "记-2", "2241", "其他应付款", 0.0, 20.0),
+]
+
+
+def journal_line(date, voucher, code, name, debit, credit, quantity=0, currency=0):
+    return (date, voucher, code, name, "摘要", "", debit, credit, quantity, currency)
+
+
+def make_voucher_stub(key):
+    return Voucher(key, pd.DataFrame(), 0.0, 0.0)
+
+
+def test_assemble_voucher_adds_total_row():
+    voucher_df, total_debit, total_credit = assemble_voucher(
+        [journal_line(*line, quantity=2 if i == 0 else 0) for i, line in enumerate(LINES[:2])]
+    )
+    assert list(voucher_df.columns) == VOUCHER_COLUMNS
+    assert (total_debit, total_credit) == (120.5, 120.5)
+    assert len(voucher_df) == 3
+    assert list(voucher_df["科目名称"][:2]) == ["管理费用【管理费用】", " 银行存款 【银行存款】"]
+    assert list(voucher_df["数量"][:2]) == [2, ""]  # 为 0 时显示为空
+    total = voucher_df.iloc[-1]
+    assert (total["摘要"], total["借方"], total["贷方"]) == ("合     计", 120.5, 120.5)
+    assert pd.api.types.is_datetime64_any_dtype(voucher_df["日期"])
+
+
+def test_assemble_voucher_unbalanced_and_missing_name():
+    voucher_df, total_debit, total_credit = assemble_voucher([journal_line(*line) for line in LINES[2:]])
+    assert voucher_df["科目名称"][0] == ""  # 科目名称为空时不附加【】
+    voucher = Voucher(("记-2", "2023-01-06"), voucher_df, total_debit, total_credit)
+    assert not voucher.balanced
+
+
+def test_find_voucher_reads_lines_and_neighbours(tmp_path):
+    conn = connect(str(tmp_path / "data.db"))
+    conn.execute(create_table_sql("journal"))
+    conn.executemany(
+        f"INSERT INTO journal ({', '.join(JOURNAL_COLUMNS)}) VALUES ({', '.join('?' * len(JOURNAL_COLUMNS))})",
+        [journal_line(*line) for line in LINES],
+    )
+    first = find_voucher(conn, ("记-1", "2023-01-05"))
+    assert first.balanced and len(first.table) == 3
+    assert (first.prev_key, first.next_key) == (None, ("记-2", "2023-01-06"))
+    second = find_voucher(conn, ("记-2", "2023-01-06"))
+    assert (second.prev_key, second.next_key) == (("记-1", "2023-01-05"), None)
+    assert find_voucher(conn, ("记-1", "2023-01-06")) is None  # 凭证字号与日期须同时匹配
+    conn.close()
+
+
+def test_cache_evicts_least_recently_used():
+    cache = VoucherCache(capacity=2)
+    a, b, c = ("记-1", "2023-01-01"), ("记-2", "2023-01-01"), ("记-3", "2023-01-01")
+    cache.put(make_voucher_stub(a), cache.generation)
+    cache.put(make_voucher_stub(b), cache.generation)
+    assert cache.get(a).key == a  # 命中后 a 成为最近使用
+    cache.put(make_voucher_stub(c), cache.generation)
+    assert a in cache and c in cache
+    assert b not in cache and cache.get(b) is None
+
+
+@pytest.mark.parametrize("capacity", [1, 3])
+def test_cache_never_exceeds_capacity(capacity):
+    cache = VoucherCache(capacity=capacity)
+    keys = [(f"记-{i}", "2023-01-01") for i in range(5)]
+    for key in keys:
+        cache.put(make_voucher_stub(key), cache.generation)
+    assert [key in cache for key in keys] == [False] * (5 - capacity) + [True] * capacity
+
+
+def test_clear_discards_loads_started_before_it():
+    cache = VoucherCache()
+    key = ("记-1", "2023-01-01")
+    generation = cache.generation  # 后台预取开始
+    cache.put(make_voucher_stub(("记-0", "2023-01-01")), generation)
+    cache.clear()  # 加载期间上传了新的序时账
+    assert ("记-0", "2023-01-01") not in cache
+    cache.put(make_voucher_stub(key), generation)
+    assert key not in cache  # 过期的加载结果不写入
+    cache.put(make_voucher_stub(key), cache.generation)
+    assert cache.get(key).key == key
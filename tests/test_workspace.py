@@ -0,0 +1,106 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Audit-Inspector-Toolkit
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+持久化工作区：表结构检查、补齐缺失的索引和派生表，以及记录上次使用的数据库
+"""
+
+import pytest
+
+from accounts import account_tree_ready
+from db import connect
+from fulltext import fts_supported
+from jobs import CancelToken, JobCancelled
+from schema import BALANCE_COLUMNS, JOURNAL_COLUMNS, create_table_sql
+from summary import period_summary_ready
+from workspace import WorkspaceError, check_schema, load_last_db, missing_indexes, repair, save_last_db
+
+
+def insert_rows(conn):
+    conn.executemany(
+        f"INSERT INTO journal ({', '.join(JOURNAL_COLUMNS)}) VALUES ({', '.join('?' * len(JOURNAL_COLUMNS))})",
+        [("2023-01-05", "记-1", "6602", "管理费用", None, "差旅费", 100.0, 0.0, None, None),
+         ("2023-01-05", "记-1", "1002", "银行存款", None, "差旅费", 0.0, 100.0, None, None)],
+    )
+    conn.executemany(
+        f"INSERT INTO balance ({', '.join(BALANCE_COLUMNS)}) VALUES ({', '.join('?' * len(BALANCE_COLUMNS))})",
+        [("6602", "管理费用", 0.0, 0.0, 100.0, 0.0, 100.0, 0.0)],
+    )
+    conn.commit()
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = connect(str(tmp_path / "data.db"))
+    conn.execute(create_table_sql("journal"))
+    conn.execute(create_table_sql("balance"))
+    yield conn
+    conn.close()
+
+
+def test_check_schema_accepts_current_and_legacy_tables(tmp_path, conn):
+    check_schema(conn)
+    # 旧版本的序时账没有行哈希列，追加导入时补充
+    legacy = connect(str(tmp_path / "legacy.db"))
+    legacy.execute(f"CREATE TABLE journal ({', '.join(JOURNAL_COLUMNS)})")
+    check_schema(legacy)  # 没有科目余额表也可以打开
+    legacy.close()
+
+
+def test_check_schema_rejects_missing_columns(tmp_path):
+    conn = connect(str(tmp_path / "other.db"))
+    conn.execute(f"CREATE TABLE balance ({', '.join(BALANCE_COLUMNS[:-1])})")
+    with pytest.raises(WorkspaceError, match="期末贷方余额"):
+        check_schema(conn)
+    conn.close()
+
+
+def test_repair_empty_journal_only_builds_indexes(conn):
+    assert missing_indexes(conn)
+    actions = repair(conn)
+    assert len(actions) == 1 and actions[0].startswith("建立索引")
+    assert missing_indexes(conn) == []
+    assert not period_summary_ready(conn)
+
+
+def test_repair_rebuilds_derived_tables_once(conn):
+    insert_rows(conn)
+    actions = repair(conn)
+    expected = ["重建科目 × 月份汇总表", "重建科目层级"] + (["建立全文索引"] if fts_supported(conn) else [])
+    assert actions[0].startswith("建立索引") and actions[1:] == expected
+    assert period_summary_ready(conn) and account_tree_ready(conn)
+    assert repair(conn) == []  # 已完整的工作区不再重复修复
+
+
+def test_repair_stops_when_cancelled(conn):
+    insert_rows(conn)
+    token = CancelToken()
+    token.cancel()
+    with pytest.raises(JobCancelled):
+        repair(conn, token)
+    assert missing_indexes(conn) == []  # 取消前已完成的步骤保留
+    assert not period_summary_ready(conn)
+
+
+def test_last_db_round_trip(tmp_path):
+    default_path = str(tmp_path / "data.db")
+    assert load_last_db(str(tmp_path), default_path) == default_path  # 尚无记录
+    db_path = tmp_path / "2023年.db"
+    db_path.write_bytes(b"")
+    save_last_db(str(tmp_path), str(db_path))
+    assert load_last_db(str(tmp_path), default_path) == str(db_path)
+    db_path.unlink()
+    assert load_last_db(str(tmp_path), default_path) == default_path  # 文件已被删除